@@ -45,18 +45,30 @@ JSON格式(兼容你提供的示例):
 }
 
 Tiles 支持的 type: olid(实心)、oneway(单向平台)、water(水面/水域)、hazard(伤害，例如尖刺)、ice(低摩擦)、conveyor_left/right(传送带)。
-Entities 支持: player, enemy(variant: patroller/jumper/wanderer), boss, door(target), sign(text), item(kind: double_jump/speed/fireball/key/health)、block(静态碰撞块)。
+Entities 支持: player, enemy(variant: patroller/jumper/wanderer), boss, door(target), sign(text), item(kind: double_jump/speed/fireball/key/health)、block(静态碰撞块)、checkpoint(检查点，死亡后从此处恢复)。
 
+动画：图片旁放同名的 .anim.json（帧尺寸 + 各段帧号）即按帧动画表播放，tile 取第一段，实体按 idle/walk/jump/hurt 取段（见 AssetLoader.sheet_info）。
 你可以自由扩展映射(见 LevelFactory)
 """
 from __future__ import annotations
+import time
+_IMPORT_T0 = time.perf_counter()  # 启动分析的起点
+
 import os
 import sys
 import json
 import math
+import mmap
+import zlib
 import random
+import hashlib
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional, Any, Callable
 
+import numpy as np
 import pygame
 
 # ------------------------------------------------------------
@@ -92,6 +104,57 @@ GRAY = (150, 150, 150)
 TILE_SIZE = 32
 ENTITY_SIZE = 32
 PROJECTILE_SIZE = 10
+PARTICLE_BUDGET = 1500   # 同时存在的粒子上限
+PARTICLE_EMITTERS = 64   # 持续发射源（如火球尾迹）的上限
+PARTICLE_SIZE = 4
+PARTICLE_FADES = 4       # 每种颜色预渲染的透明度档位
+WATER_FRAMES = 8         # 没有帧动画表的水面：由单张图横向流动生成的帧数
+WATER_FPS = 6
+HURT_ANIM_TIME = 0.3     # 受伤动画持续时间（秒）
+
+# 射线检测的碰撞类别（位标志），占用格中每格记录覆盖它的 tile 类别之或
+RAY_SOLID = 1
+RAY_ONEWAY = 2
+RAY_WATER = 4
+RAY_HAZARD = 8
+TILE_RAY_CLASS = {
+    "solid": RAY_SOLID, "ice": RAY_SOLID, "collide_image": RAY_SOLID,
+    "conveyor_left": RAY_SOLID, "conveyor_right": RAY_SOLID, "breakable": RAY_SOLID,
+    "oneway": RAY_ONEWAY, "water": RAY_WATER, "hazard": RAY_HAZARD,
+}
+PROJECTILE_MASK = RAY_SOLID | RAY_ONEWAY  # 挡住火球的 tile
+LOS_REFRESH_FRAMES = 12  # 视线检测结果的缓存帧数
+
+# 可破坏 tile（type 为 "breakable"）：逐格计算耐久，受损的格子换成裂纹贴图，耐久归零即碎掉
+BREAKABLE_HP = 24.0      # 每格耐久（玩家火球 12 点、Boss 火球 10 点）
+BREAKABLE_IMAGE = "assets/tile/breakable.png"    # 完好时的贴图，记录里的 "path" 优先
+BREAKABLE_CRACKED = "assets/tile/02-broken.png"  # 裂纹贴图，记录里可用 "cracked" 另外指定
+BOSS_SMASH_DPS = 60.0    # Boss 顶着可破坏 tile 时每秒造成的伤害
+
+# 每帧输入编码成一个字节：按住类（左/右/蹲）+ 按下类（跳/射击/交互，对应 KEYDOWN 事件）
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 4
+ACTION_SHOOT = 8
+ACTION_CROUCH = 16
+ACTION_INTERACT = 32
+HELD_KEYS = {pygame.K_a: ACTION_LEFT, pygame.K_d: ACTION_RIGHT, pygame.K_s: ACTION_CROUCH}
+PRESS_KEYS = {pygame.K_SPACE: ACTION_JUMP, pygame.K_k: ACTION_SHOOT, pygame.K_e: ACTION_INTERACT}
+
+# 帧预算调节：每帧的更新+绘制耗时（滑动平均）与 1/FPS 比较
+GOVERNOR_DOWN = 0.9         # 超过预算的 90% 持续 GOVERNOR_DOWN_FRAMES 帧则降一档
+GOVERNOR_UP = 0.6           # 低于预算的 60% 持续 GOVERNOR_UP_FRAMES 帧则升一档
+GOVERNOR_DOWN_FRAMES = 30
+GOVERNOR_UP_FRAMES = 180
+FAR_MARGIN = 320            # 视野外扩这么多像素以外的实体算"远处"
+FAR_MAX_STEP = 1 / 30       # 远处实体补帧时单步时长上限，超过时分成多步结算，避免穿墙
+# 画质档位（从低到高）：粒子预算比例、远处实体每几帧更新一次、背景最多画几层
+QUALITY_LEVELS = [
+    {"particles": 0.1, "far_tick": 4, "parallax": 1},
+    {"particles": 0.25, "far_tick": 4, "parallax": 1},
+    {"particles": 0.5, "far_tick": 2, "parallax": None},
+    {"particles": 1.0, "far_tick": 1, "parallax": None},
+]
 
 #图像路径
 PLAYER_IMAGE_PATH = 'assets/magician.png' 
@@ -106,6 +169,52 @@ SPIKES_IMAGE_PATH = 'assets/spikes.png'
 
 #地图编辑器提供的关卡json           根目录              相对目录
 LEVEL_ROOT = os.path.join(os.path.dirname(__file__), "../levels")
+# scripts/build_assets.py 预先缩放好的图像（原始 RGBA 像素 + 索引），启动时内存映射读取
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(__file__), "../assets/.cache")
+# 录制的输入（python main.py --record 文件），scripts/replay.py 无窗口回放
+REPLAY_DIR = os.path.join(os.path.dirname(__file__), "../replays")
+REPLAY_MAGIC = b"PXRP1\n"
+HOT_RELOAD_INTERVAL = 0.5  # 检查关卡文件是否被编辑器修改的间隔（秒）
+FONT_NAME = "SimHei"
+# 帧追踪：保留最近 TRACE_FRAMES 帧的耗时区段，F9 导出 Chrome trace，F10 开关记录
+TRACE_DIR = os.path.join(os.path.dirname(__file__), "../traces")
+TRACE_FRAMES = 300
+TRACE_SPIKE_MS = float(os.environ.get("PIXEL_TRACE_SPIKE_MS", 50))  # 超过此耗时的帧自动导出
+TRACE_SPIKE_COOLDOWN = 5.0  # 两次自动导出的最小间隔（秒）
+
+
+# 启动分析
+# ------------------------------------------------------------
+class StartupTrace:
+    """设置环境变量 PIXEL_TRACE_STARTUP=1（或 python main.py --trace-startup）后，打印启动各阶段耗时"""
+    enabled = bool(os.environ.get("PIXEL_TRACE_STARTUP"))
+    last = _IMPORT_T0
+    phases: List[Tuple[str, float]] = []
+
+    @staticmethod
+    def mark(name: str):
+        """记录主线程上自上一个标记以来的耗时"""
+        if not StartupTrace.enabled:
+            return
+        now = time.perf_counter()
+        StartupTrace.phases.append((name, now - StartupTrace.last))
+        StartupTrace.last = now
+
+    @staticmethod
+    def record(name: str, seconds: float):
+        """记录后台线程中某一阶段的耗时（不计入主线程的时间线）"""
+        if StartupTrace.enabled:
+            StartupTrace.phases.append((f"[后台] {name}", seconds))
+
+    @staticmethod
+    def report():
+        if not StartupTrace.enabled or not StartupTrace.phases:
+            return
+        print("启动耗时:")
+        for name, sec in StartupTrace.phases:
+            print(f"  {name:<24} {sec*1000:8.1f} ms")
+        print(f"  {'合计':<24} {(time.perf_counter() - _IMPORT_T0)*1000:8.1f} ms")
+        StartupTrace.phases = []
 
 
 # 通用工具
@@ -123,6 +232,10 @@ class AABB:
     def top(self): return self.y
     @property
     def bottom(self): return self.y + self.h
+    @property
+    def centerx(self): return self.x + self.w / 2
+    @property
+    def centery(self): return self.y + self.h / 2
     def copy(self):
         return AABB(self.x, self.y, self.w, self.h)
     def move(self, dx: float, dy: float):
@@ -161,19 +274,213 @@ class Timer:
                 finally:
                     self.events.remove(e)
 
+class FrameTracer:
+    """逐帧记录嵌套的耗时区段，环形缓冲保留最近若干帧，导出为 Chrome trace / Perfetto 可读的 JSON。
+
+    设置环境变量 PIXEL_TRACE=1 启动即记录，或游戏中按 F10 开关；关闭时每个埋点只多一次属性判断。
+    """
+    def __init__(self):
+        self.enabled = bool(os.environ.get("PIXEL_TRACE"))
+        self.frames: deque = deque(maxlen=TRACE_FRAMES)
+        self.events: List[Tuple[str, float, float]] = []  # 当前帧的 (名称, 开始, 结束)
+        self.frame_start = 0.0
+        self.last_auto_dump = -TRACE_SPIKE_COOLDOWN
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        self.events = []
+        return self.enabled
+
+    def add(self, name: str, start: float, end: Optional[float] = None):
+        self.events.append((name, start, time.perf_counter() if end is None else end))
+
+    def begin_frame(self):
+        if self.enabled:
+            self.events = []
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self) -> Optional[str]:
+        """收尾一帧；该帧超过 TRACE_SPIKE_MS 时自动导出，返回文件路径"""
+        if not self.enabled or not self.frame_start:
+            return None
+        end = time.perf_counter()
+        self.add("frame", self.frame_start, end)
+        self.frames.append(self.events)
+        self.events = []
+        if (end - self.frame_start) * 1000 > TRACE_SPIKE_MS and end - self.last_auto_dump > TRACE_SPIKE_COOLDOWN:
+            self.last_auto_dump = end
+            return self.dump("spike")
+        return None
+
+    def dump(self, reason: str = "manual") -> Optional[str]:
+        frames = list(self.frames) + ([self.events] if self.events else [])
+        if not frames:
+            return None
+        events = [{"name": name, "ph": "X", "ts": round(t0 * 1e6, 1), "dur": round((t1 - t0) * 1e6, 1), "pid": 0, "tid": 0}
+                  for frame in frames for name, t0, t1 in frame]
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.normpath(os.path.join(TRACE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{reason}.json"))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+TRACER = FrameTracer()
+
+def traced(name: str):
+    """把函数调用记录为一个区段（追踪关闭时直接调用原函数）"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                TRACER.add(name, start)
+        return wrapper
+    return deco
+
+
+# 动画：同一段动画的所有实例（所有水面、所有同尺寸的怪物）共用一个全局时钟，
+# 每帧由时钟为每段动画选一次当前帧，绘制时直接取 anim.image
+class Animation:
+    def __init__(self, frames: List[pygame.Surface], fps: float):
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+        self.image = frames[0]
+
+    def advance(self, t: float):
+        i = int(t * self.fps) % len(self.frames)
+        if i != self.index:
+            self.index = i
+            self.image = self.frames[i]
+
+class AnimationClock:
+    def __init__(self):
+        self.time = 0.0
+        self.animations: List[Animation] = []
+
+    def register(self, anim: Animation) -> Animation:
+        if len(anim.frames) > 1:
+            anim.advance(self.time)
+            self.animations.append(anim)
+        return anim
+
+    def tick(self, dt: float):
+        self.time += dt
+        for anim in self.animations:
+            anim.advance(self.time)
+
+ANIM_CLOCK = AnimationClock()
+
+
 # 资源加载（允许 path=="none" 或空）
 class AssetLoader:
     _cache: Dict[str, pygame.Surface] = {}
+    _baked: Optional[Dict[str, Dict[str, int]]] = None  # 预处理缓存的索引，None 表示尚未打开
+    _baked_buf: Optional[mmap.mmap] = None
+    used: set = set()  # 实际从文件解码过的 (path, size)，供 build_assets 收集
+
+    @staticmethod
+    def baked_key(path: str, size: Tuple[int, int]) -> str:
+        return f"{path}|{size[0]}x{size[1]}"
+
+    @staticmethod
+    def _open_baked():
+        AssetLoader._baked = {}
+        try:
+            with open(os.path.join(ASSET_CACHE_DIR, "sprites.json"), "r", encoding="utf-8") as f:
+                index = json.load(f)
+            with open(os.path.join(ASSET_CACHE_DIR, "sprites.bin"), "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        AssetLoader._baked = index.get("sprites", {})
+        AssetLoader._baked_buf = buf
+
+    @staticmethod
+    def _baked_entry(path: str, size: Tuple[int, int]) -> Optional[Dict[str, int]]:
+        """预处理缓存中的条目：源文件的 mtime/大小与构建时一致才算有效"""
+        if AssetLoader._baked is None:
+            AssetLoader._open_baked()
+        entry = AssetLoader._baked.get(AssetLoader.baked_key(path, size))
+        if not entry:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_mtime_ns != entry["mtime_ns"] or st.st_size != entry["bytes"]:
+            return None
+        return entry
+
+    @staticmethod
+    def load_baked(path: str, size: Tuple[int, int]) -> Optional[pygame.Surface]:
+        """从预处理缓存取图，没有有效条目时返回 None 走正常解码"""
+        entry = AssetLoader._baked_entry(path, size)
+        if entry is None:
+            return None
+        off = entry["offset"]
+        pixels = memoryview(AssetLoader._baked_buf)[off:off + size[0] * size[1] * 4]
+        return pygame.image.frombuffer(pixels, size, "RGBA").convert_alpha()
+
+    _decoded: Dict[Tuple[str, Tuple[int, int]], pygame.Surface] = {}  # prefetch 解码好、尚未被取用的图像
+    _pool: Optional[ThreadPoolExecutor] = None
+
     @staticmethod
+    def _decode(path: str, size: Tuple[int, int]) -> Optional[bytes]:
+        """工作线程中执行：解码并缩放，返回 RGBA 原始像素（不碰显示相关的接口）"""
+        try:
+            img = pygame.image.load(path)
+            return pygame.image.tobytes(pygame.transform.smoothscale(img, size), "RGBA")
+        except Exception:
+            return None
+
+    @staticmethod
+    def prefetch(pairs) -> int:
+        """批量预解码 (path, size)：线程池里解码缩放，主线程一次性转换成显示格式。
+
+        已经加载过的、有预处理缓存的、文件不存在的都会跳过；之后的 load_image 直接取用结果。
+        返回实际解码的数量。
+        """
+        todo = []
+        for path, size in set(pairs):
+            size = (int(size[0]), int(size[1]))
+            if not path or path.lower() == "none" or (path, size) in AssetLoader.used or (path, size) in AssetLoader._decoded:
+                continue
+            if not os.path.isfile(path) or AssetLoader._baked_entry(path, size) is not None:
+                continue
+            todo.append((path, size))
+        if len(todo) < 2:
+            return 0  # 一两张图不值得走线程池
+        if AssetLoader._pool is None:
+            AssetLoader._pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="decode")
+        results = AssetLoader._pool.map(lambda ps: AssetLoader._decode(*ps), todo)
+        done = 0
+        for (path, size), pixels in zip(todo, results):
+            if pixels is not None:
+                AssetLoader._decoded[(path, size)] = pygame.image.frombuffer(pixels, size, "RGBA").convert_alpha()
+                done += 1
+        return done
+
+    @staticmethod
+    @traced("AssetLoader.load_image")
     def load_image(path: Optional[str], size: Tuple[int, int], color=(200, 200, 200)) -> pygame.Surface:
         key = f"{path}|{size}|{color}"
         if key in AssetLoader._cache:
             return AssetLoader._cache[key]
         surf = pygame.Surface(size, flags=pygame.SRCALPHA)
         if path and path.lower() != "none" and os.path.isfile(path):
+            AssetLoader.used.add((path, tuple(size)))
             try:
-                img = pygame.image.load(path).convert_alpha()
-                surf = pygame.transform.smoothscale(img, size)
+                baked = AssetLoader._decoded.pop((path, tuple(size)), None) or AssetLoader.load_baked(path, size)
+                if baked is not None:
+                    surf = baked
+                else:
+                    img = pygame.image.load(path).convert_alpha()
+                    surf = pygame.transform.smoothscale(img, size)
             except Exception:
                 surf.fill(color)
         else:
@@ -184,6 +491,190 @@ class AssetLoader:
         AssetLoader._cache[key] = surf
         return surf
 
+    @staticmethod
+    def load_tiled(path: Optional[str], cell: int, size: Tuple[int, int], color=(200, 200, 200)) -> pygame.Surface:
+        """把单格图像平铺成 size 大小（编辑器压缩存储的矩形区域）"""
+        key = f"{path}|{cell}|{size}|{color}|tiled"
+        if key in AssetLoader._cache:
+            return AssetLoader._cache[key]
+        img = AssetLoader.load_image(path, (cell, cell), color)
+        surf = pygame.Surface(size, flags=pygame.SRCALPHA)
+        for x in range(0, size[0], cell):
+            for y in range(0, size[1], cell):
+                surf.blit(img, (x, y))
+        AssetLoader._cache[key] = surf
+        return surf
+
+    @staticmethod
+    def load_background(path: Optional[str], index: int = 0) -> pygame.Surface:
+        """背景层：等比缩放到屏幕高度、宽度不足一屏时预先横向平铺，只做一次。
+
+        按分辨率缓存，切换关卡时不会重新解码；完全不透明的层用 convert() 加快 blit。
+        """
+        key = f"{path}|{index}|{SCREEN_W}x{SCREEN_H}|background"
+        if key in AssetLoader._cache:
+            return AssetLoader._cache[key]
+        surf = None
+        if path and path.lower() != "none":
+            try:
+                img = pygame.image.load(path).convert_alpha()
+                w = max(1, round(img.get_width() * SCREEN_H / img.get_height()))
+                img = pygame.transform.smoothscale(img, (w, SCREEN_H))
+                reps = -(-SCREEN_W // w)
+                surf = pygame.Surface((w * reps, SCREEN_H), flags=pygame.SRCALPHA)
+                for r in range(reps):
+                    surf.blit(img, (r * w, 0))
+                if pygame.mask.from_surface(surf, 254).count() == surf.get_width() * SCREEN_H:
+                    surf = surf.convert()
+            except Exception as e:
+                print(f"加载背景图像 {path} 失败: {e}")
+                surf = None
+        if surf is None:
+            # 没有指定路径或加载失败：每层使用略微不同的深色
+            surf = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+            surf.fill((10 + index*15, 15 + index*15, 30 + index*15))
+        AssetLoader._cache[key] = surf
+        return surf
+
+    _sheets: Dict[str, Optional[Dict[str, Any]]] = {}
+    @staticmethod
+    def sheet_info(path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """帧动画表的描述文件：与图片同名的 .anim.json，例如 assets/Magician.anim.json
+
+        {"frame": [宽, 高], "fps": 8, "clips": {"idle": [0], "walk": [1, 2, 3, 4], "hurt": {"frames": [5], "fps": 4}}}
+        帧号按从左到右、从上到下数。没有描述文件的图片当作静态图。
+        """
+        if not path or path.lower() == "none":
+            return None
+        if path not in AssetLoader._sheets:
+            info = None
+            try:
+                with open(os.path.splitext(path)[0] + ".anim.json", "r", encoding="utf-8") as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                pass
+            AssetLoader._sheets[path] = info
+        return AssetLoader._sheets[path]
+
+    @staticmethod
+    def load_clips(path: Optional[str], size: Tuple[int, int], cell: int = 0) -> Optional[Dict[str, Animation]]:
+        """按 size 缩放好的各段动画（cell 非 0 时每帧按格平铺成 size），图片没有动画表时返回 None"""
+        info = AssetLoader.sheet_info(path)
+        if not info:
+            return None
+        key = f"{path}|{cell}|{size}|clips"
+        if key in AssetLoader._cache:
+            return AssetLoader._cache[key]
+        clips = None
+        try:
+            sheet = pygame.image.load(path).convert_alpha()
+            fw, fh = info["frame"]
+            cols = max(1, sheet.get_width() // fw)
+            frame_size = (cell, cell) if cell else size
+            clips = {}
+            for name, spec in info["clips"].items():
+                if isinstance(spec, dict):
+                    indices, fps = spec["frames"], spec.get("fps", info.get("fps", 8))
+                else:
+                    indices, fps = spec, info.get("fps", 8)
+                frames = []
+                for i in indices:
+                    img = pygame.transform.smoothscale(sheet.subsurface(((i % cols) * fw, (i // cols) * fh, fw, fh)), frame_size)
+                    if cell:
+                        tiled = pygame.Surface(size, flags=pygame.SRCALPHA)
+                        for x in range(0, size[0], cell):
+                            for y in range(0, size[1], cell):
+                                tiled.blit(img, (x, y))
+                        img = tiled
+                    frames.append(img)
+                clips[name] = ANIM_CLOCK.register(Animation(frames, fps))
+        except Exception as e:
+            print(f"加载动画 {path} 失败: {e}")
+            clips = None
+        AssetLoader._cache[key] = clips
+        return clips
+
+    @staticmethod
+    def water(path: Optional[str], image: pygame.Surface, cell: int = 0) -> Animation:
+        """水面动画：帧动画表优先；否则把图像按一格（或整宽）的周期横向流动生成若干帧。
+
+        水面的蓝色边线直接画进每一帧，绘制时不再逐块 draw.rect。
+        """
+        size = image.get_size()
+        key = f"{path}|{cell}|{size}|water"
+        if key in AssetLoader._cache:
+            return AssetLoader._cache[key]
+        clips = AssetLoader.load_clips(path, size, cell)
+        if clips:
+            src = next(iter(clips.values())).frames
+        elif path and path.lower() != "none" and os.path.isfile(path):
+            period = cell or size[0]
+            src = []
+            for i in range(WATER_FRAMES):
+                dx = round(i * period / WATER_FRAMES)
+                frame = pygame.Surface(size, flags=pygame.SRCALPHA)
+                frame.blit(image, (-dx, 0))
+                frame.blit(image, (size[0] - dx, 0))
+                src.append(frame)
+        else:
+            src = [image]
+        frames = []
+        for img in src:
+            img = img.copy()
+            pygame.draw.rect(img, BLUE, (0, 0, size[0], 4))
+            frames.append(img)
+        anim = ANIM_CLOCK.register(Animation(frames, WATER_FPS))
+        AssetLoader._cache[key] = anim
+        return anim
+
+    _fonts: Dict[int, pygame.font.Font] = {}
+    _font_path: Optional[str] = ""  # "" 表示尚未查找；None 表示系统中没有，使用默认字体
+    @staticmethod
+    def font(size: int) -> pygame.font.Font:
+        """按字号缓存的字体。
+
+        SysFont 每次都要扫描系统字体，这里只在第一次查找字体文件，并把路径记在
+        assets/.cache/fonts.json 中，之后启动直接打开文件。
+        """
+        f = AssetLoader._fonts.get(size)
+        if f is not None:
+            return f
+        if AssetLoader._font_path == "":
+            AssetLoader._font_path = AssetLoader._find_font()
+        f = pygame.font.Font(AssetLoader._font_path, size)
+        AssetLoader._fonts[size] = f
+        return f
+
+    @staticmethod
+    def _find_font() -> Optional[str]:
+        record = os.path.join(ASSET_CACHE_DIR, "fonts.json")
+        try:
+            with open(record, "r", encoding="utf-8") as fp:
+                path = json.load(fp).get(FONT_NAME)
+            if path and os.path.isfile(path):
+                return path
+        except (OSError, ValueError):
+            pass
+        path = pygame.font.match_font(FONT_NAME)
+        if path:
+            try:
+                os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+                with open(record, "w", encoding="utf-8") as fp:
+                    json.dump({FONT_NAME: path}, fp, ensure_ascii=False)
+            except OSError:
+                pass
+        return path
+
+    _flipped: Dict[int, Tuple[pygame.Surface, pygame.Surface]] = {}
+    @staticmethod
+    def flipped(surf: pygame.Surface) -> pygame.Surface:
+        """水平翻转的图像（缓存，避免朝左的实体每帧都重新翻转）"""
+        entry = AssetLoader._flipped.get(id(surf))
+        if entry is None or entry[0] is not surf:
+            entry = (surf, pygame.transform.flip(surf, True, False))
+            AssetLoader._flipped[id(surf)] = entry
+        return entry[1]
+
 #游戏背景
 class Background:
     """游戏背景类，支持多层背景滚动效果"""
@@ -193,62 +684,216 @@ class Background:
         :param image_paths: 背景图像路径列表(从后到前)
         :param scroll_ratios: 各层滚动比例(与相机移动的比例),None则默认[0.1, 0.3, 0.6, 1.0]等
         """
-        self.layers = []
-        self.scroll_ratios = scroll_ratios or []
-        
-        # 加载背景图层
-        for i, path in enumerate(image_paths):
-            # 对于没有指定路径的图层，使用纯色背景
-            if not path or path.lower() == "none":
-                surf = pygame.Surface((SCREEN_W, SCREEN_H))
-                # 每层使用略微不同的深色作为默认
-                color = (10 + i*15, 15 + i*15, 30 + i*15)
-                surf.fill(color)
-                self.layers.append(surf)
-            else:
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    # 缩放图像以适应屏幕
-                    surf = pygame.transform.scale(img, (SCREEN_W, SCREEN_H))
-                    self.layers.append(surf)
-                except Exception as e:
-                    print(f"加载背景图像 {path} 失败: {e}")
-                    # 加载失败时使用备用颜色
-                    surf = pygame.Surface((SCREEN_W, SCREEN_H))
-                    surf.fill((30, 30, 50))
-                    self.layers.append(surf)
-        
+        self.layers = [AssetLoader.load_background(path, i) for i, path in enumerate(image_paths)]
+        self.scroll_ratios = list(scroll_ratios or [])
+
         # 初始化滚动比例（如果未指定）
-        if not self.scroll_ratios:
-            num_layers = len(self.layers)
-            self.scroll_ratios = [(i + 1) / (num_layers * 2) for i in range(num_layers)]
+        num_layers = len(self.layers)
+        if len(self.scroll_ratios) < num_layers:
+            defaults = [(i + 1) / (num_layers * 2) for i in range(num_layers)]
+            self.scroll_ratios += defaults[len(self.scroll_ratios):]
 
-    def draw(self, surf: pygame.Surface, camera: Camera):
-        """绘制背景，根据相机位置计算各层偏移"""
-        for i, layer in enumerate(self.layers):
-            # 计算该层的滚动偏移（与相机移动成比例）
-            ratio = self.scroll_ratios[i]
-            offset_x = camera.x * ratio
-            offset_y = camera.y * ratio
-            surf.blit(layer, (offset_x, offset_y))
-            # # 处理图像平铺（如果需要重复背景）
-            # # 计算需要绘制的次数以覆盖屏幕
-            # x = -offset_x % layer.get_width()
-            # while x < SCREEN_W:
-            #     y = -offset_y % layer.get_height()
-            #     while y < SCREEN_H:
-            #         surf.blit(layer, (x, y))
-            #         y += layer.get_height()
-            #     x += layer.get_width()
+    @staticmethod
+    def from_data(bg_data: Any) -> Optional["Background"]:
+        """解析关卡 JSON 的 background：单个 {"layers","scroll_ratios"} 或它们的列表（依次叠加）"""
+        if not bg_data:
+            return None
+        blocks = bg_data if isinstance(bg_data, list) else [bg_data]
+        paths: List[Optional[str]] = []
+        ratios: List[float] = []
+        for b in blocks:
+            layers = b.get("layers", [])
+            given = list(b.get("scroll_ratios") or [])
+            paths += layers
+            # 某一块没写满比例时，其余层按默认方式补齐
+            ratios += given[:len(layers)] + [(i + 1) / (len(layers) * 2) for i in range(len(given), len(layers))]
+        if not paths:
+            return None
+        return Background(paths, ratios)
+
+    def draw(self, surf: pygame.Surface, camera: Camera, max_layers: Optional[int] = None):
+        """绘制背景，各层按比例随相机水平滚动，首尾相接，每层最多两次 blit；max_layers 限制只画最远的几层"""
+        if self.layers[0].get_flags() & pygame.SRCALPHA:
+            surf.fill((20, 24, 28))  # 最底层有透明部分时先清屏
+        for i, layer in enumerate(self.layers[:max_layers]):
+            w = layer.get_width()
+            x = -int(camera.x * self.scroll_ratios[i]) % w
+            if x > 0:
+                surf.blit(layer, (x - w, 0))
+            if x < SCREEN_W:
+                surf.blit(layer, (x, 0))
 
 
 # 世界与关卡
 # ------------------------------------------------------------
 class Tile:
-    def __init__(self, kind: str, aabb: AABB, image: Optional[pygame.Surface]=None):
+    """TileStore 中一个 tile 的轻量视图：只记所在存储与下标，几何 (x, y, w, h) 直接读存储的数组，
+    读取接口与 AABB 相同（碰撞代码照旧用 t.aabb），图像按编号从享元表里取。
+    kind 是碰撞循环里读得最多的字段，直接引用共享的种类名（只是一个引用）。"""
+    __slots__ = ("store", "index", "kind")
+
+    def __init__(self, store: "TileStore", index: int, kind: str):
+        self.store = store
+        self.index = index
         self.kind = kind
-        self.aabb = aabb
-        self.image = image
+
+    @property
+    def x(self) -> float:
+        return self.store.flat[self.index * 4]
+
+    @property
+    def y(self) -> float:
+        return self.store.flat[self.index * 4 + 1]
+
+    @property
+    def w(self) -> float:
+        return self.store.flat[self.index * 4 + 2]
+
+    @property
+    def h(self) -> float:
+        return self.store.flat[self.index * 4 + 3]
+
+    left = x
+    top = y
+
+    @property
+    def right(self) -> float:
+        i = self.index * 4
+        flat = self.store.flat
+        return flat[i] + flat[i + 2]
+
+    @property
+    def bottom(self) -> float:
+        i = self.index * 4 + 1
+        flat = self.store.flat
+        return flat[i] + flat[i + 2]
+
+    @property
+    def centerx(self) -> float:
+        return self.x + self.w / 2
+
+    @property
+    def centery(self) -> float:
+        return self.y + self.h / 2
+
+    intersects = AABB.intersects
+    intersection = AABB.intersection
+
+    def copy(self) -> AABB:
+        return AABB(self.x, self.y, self.w, self.h)
+
+    @property
+    def aabb(self) -> "Tile":
+        return self
+
+    @property
+    def image(self) -> pygame.Surface:
+        return self.store.images[self.store.image_view[self.index]][0]
+
+    @property
+    def anim(self) -> Optional[Animation]:
+        """有动画时绘制 anim.image（全局时钟统一换帧）"""
+        return self.store.images[self.store.image_view[self.index]][1]
+
+class TileStore:
+    """关卡 tile 的紧凑存储：几何 (x, y, w, h)、种类编号、图像编号是并列的 numpy 数组，
+    种类名与 (图像, 动画) 各只存一份。需要对象接口的地方（空间哈希、碰撞）用 Tile 视图，
+    视图不复制几何，按下标读数组。
+
+    删除只做标记，死条目过半时按原顺序压缩，保持绘制顺序与关卡文件一致。
+    """
+    def __init__(self, capacity: int = 64):
+        self.count = 0
+        self.dead = 0
+        self.kinds: List[str] = []
+        self.images: List[Tuple[pygame.Surface, Optional[Animation]]] = []
+        self._kind_ids: Dict[str, int] = {}
+        self._image_ids: Dict[Tuple[int, int], int] = {}
+        self.views: List[Optional[Tile]] = []
+        self.geom = np.zeros((0, 4), dtype=np.float64)
+        self.kind_ids = np.zeros(0, dtype=np.uint8)
+        self.image_ids = np.zeros(0, dtype=np.uint32)
+        self.alive = np.zeros(0, dtype=bool)
+        self._resize(capacity)
+
+    def _resize(self, capacity: int):
+        n = self.count
+        for name in ("geom", "kind_ids", "image_ids", "alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+        # 视图逐个读取几何与编号时用 memoryview，比 numpy 标量下标快得多
+        self.flat = memoryview(self.geom).cast("B").cast("d")
+        self.image_view = memoryview(self.image_ids)
+
+    def add(self, kind: str, aabb: AABB, image: pygame.Surface, anim: Optional[Animation] = None) -> Tile:
+        if self.count == len(self.alive):
+            self._resize(len(self.alive) * 2)
+        kid = self._kind_ids.get(kind)
+        if kid is None:
+            if len(self.kinds) > np.iinfo(self.kind_ids.dtype).max:
+                raise OverflowError(f"tile 种类超过 {len(self.kinds)} 种")
+            kid = self._kind_ids[kind] = len(self.kinds)
+            self.kinds.append(kind)
+        iid = self._image_ids.get((id(image), id(anim)))
+        if iid is None:
+            if len(self.images) > np.iinfo(self.image_ids.dtype).max:
+                raise OverflowError(f"tile 图像超过 {len(self.images)} 种")
+            iid = self._image_ids[(id(image), id(anim))] = len(self.images)
+            self.images.append((image, anim))
+        i = self.count
+        self.geom[i] = (aabb.x, aabb.y, aabb.w, aabb.h)
+        self.kind_ids[i] = kid
+        self.image_ids[i] = iid
+        self.alive[i] = True
+        tile = Tile(self, i, self.kinds[kid])
+        self.views.append(tile)
+        self.count += 1
+        return tile
+
+    def remove(self, tile: Tile):
+        """删除后视图不再可用（压缩会挪动数组），需要几何的话先取 tile.copy()"""
+        if self.views[tile.index] is not tile:
+            return
+        self.alive[tile.index] = False
+        self.views[tile.index] = None
+        self.dead += 1
+        if self.dead > 32 and self.dead * 2 > self.count:
+            self.compact()
+
+    def compact(self):
+        keep = np.nonzero(self.alive[:self.count])[0]
+        n = len(keep)
+        for name in ("geom", "kind_ids", "image_ids", "alive"):
+            arr = getattr(self, name)
+            arr[:n] = arr[keep]
+            arr[n:self.count] = 0
+        self.views = [self.views[i] for i in keep.tolist()]
+        for i, tile in enumerate(self.views):
+            tile.index = i
+        self.count = n
+        self.dead = 0
+
+    def visible(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        """与矩形相交（含贴边）的 tile 下标，按存储顺序"""
+        g = self.geom[:self.count]
+        x, y = g[:, 0], g[:, 1]
+        mask = self.alive[:self.count] & (x + g[:, 2] >= left) & (x <= right) & (y + g[:, 3] >= top) & (y <= bottom)
+        return np.nonzero(mask)[0]
+
+    def nbytes(self) -> int:
+        """数组与享元表本身的字节数（不含视图对象和图像像素）"""
+        size = self.geom.nbytes + self.kind_ids.nbytes + self.image_ids.nbytes + self.alive.nbytes
+        for table in (self.kinds, self.images, self._kind_ids, self._image_ids, self.views):
+            size += sys.getsizeof(table)
+        return size
+
+    def __len__(self) -> int:
+        return self.count - self.dead
+
+    def __iter__(self):
+        return (t for t in self.views if t is not None)
 
 class SpatialHash:
     """简单空间哈希加速碰撞查询。"""
@@ -266,6 +911,17 @@ class SpatialHash:
             for gy in range(miny, maxy+1):
                 self.grid.setdefault((gx,gy), []).append(obj)
 
+    def remove(self, aabb: AABB, obj: Any):
+        minx, miny = self._key(aabb.left, aabb.top)
+        maxx, maxy = self._key(aabb.right, aabb.bottom)
+        for gx in range(minx, maxx+1):
+            for gy in range(miny, maxy+1):
+                cell = self.grid.get((gx,gy))
+                if cell and obj in cell:
+                    cell.remove(obj)
+                    if not cell:
+                        del self.grid[(gx,gy)]
+
     def query(self, aabb: AABB) -> List[Any]:
         res = []
         minx, miny = self._key(aabb.left, aabb.top)
@@ -278,58 +934,535 @@ class SpatialHash:
     def clear(self):
         self.grid.clear()
 
+class DynamicHash(SpatialHash):
+    """运动实体的空间哈希：记录每个对象占据的格子范围，移动时只在跨格时更新。"""
+    def __init__(self, cell: int = 128):
+        super().__init__(cell)
+        self.spans: Dict[int, Tuple[int,int,int,int]] = {}
+
+    def _span(self, aabb: AABB) -> Tuple[int,int,int,int]:
+        minx, miny = self._key(aabb.left, aabb.top)
+        maxx, maxy = self._key(aabb.right, aabb.bottom)
+        return (minx, miny, maxx, maxy)
+
+    def _unlink(self, obj: Any, span: Tuple[int,int,int,int]):
+        for gx in range(span[0], span[2]+1):
+            for gy in range(span[1], span[3]+1):
+                cell = self.grid.get((gx,gy))
+                if cell and obj in cell:
+                    cell.remove(obj)
+                    if not cell:
+                        del self.grid[(gx,gy)]
+
+    def update(self, obj: Any):
+        span = self._span(obj.aabb)
+        old = self.spans.get(id(obj))
+        if old == span:
+            return
+        if old is not None:
+            self._unlink(obj, old)
+        self.spans[id(obj)] = span
+        for gx in range(span[0], span[2]+1):
+            for gy in range(span[1], span[3]+1):
+                self.grid.setdefault((gx,gy), []).append(obj)
+
+    def discard(self, obj: Any):
+        old = self.spans.pop(id(obj), None)
+        if old is not None:
+            self._unlink(obj, old)
+
+    def query(self, aabb: AABB) -> List[Any]:
+        # 跨格的对象只返回一次
+        res, seen = [], set()
+        for obj in super().query(aabb):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                res.append(obj)
+        return res
+
+    def clear(self):
+        super().clear()
+        self.spans.clear()
+
+class OccupancyGrid:
+    """按 TILE_SIZE 划分的占用格（numpy uint8），每格是覆盖它的 tile 的 RAY_* 类别之或，供 DDA 射线遍历"""
+    def __init__(self, world_w: int, world_h: int, cell: int = TILE_SIZE):
+        self.cell = cell
+        self.cols = max(1, -(-int(world_w) // cell))
+        self.rows = max(1, -(-int(world_h) // cell))
+        self.bits = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        self.flat = memoryview(self.bits).cast("B")  # 逐格读取比 numpy 下标快
+
+    def span(self, aabb: AABB) -> Tuple[int, int, int, int]:
+        """aabb 覆盖的格子范围 (c0, r0, c1, r1)，右/下为开区间，已裁剪到网格内"""
+        c = self.cell
+        return (max(0, int(aabb.left // c)), max(0, int(aabb.top // c)),
+                min(self.cols, int(math.ceil(aabb.right / c))), min(self.rows, int(math.ceil(aabb.bottom / c))))
+
+    def add(self, tile: Tile):
+        c0, r0, c1, r1 = self.span(tile.aabb)
+        self.bits[r0:r1, c0:c1] |= TILE_RAY_CLASS.get(tile.kind, 0)
+
+    def refresh(self, aabb: AABB, spatial: SpatialHash):
+        """tile 删除后重算 aabb 覆盖的格子（其余 tile 从空间哈希取）"""
+        c0, r0, c1, r1 = self.span(aabb)
+        self.bits[r0:r1, c0:c1] = 0
+        for t in spatial.query(aabb):
+            if not isinstance(t, Tile):
+                continue
+            tc0, tr0, tc1, tr1 = self.span(t.aabb)
+            self.bits[max(r0, tr0):min(r1, tr1), max(c0, tc0):min(c1, tc1)] |= TILE_RAY_CLASS.get(t.kind, 0)
+
+    def get(self, cx: int, cy: int) -> int:
+        return self.flat[cy * self.cols + cx]
+
+def ray_aabb(x: float, y: float, dx: float, dy: float, box: AABB) -> Optional[Tuple[float, Tuple[int, int]]]:
+    """单位方向射线与 AABB 的相交（slab 法），返回 (距离, 法线)；起点在盒内时距离为 0、法线 (0, 0)"""
+    tmin, tmax = -math.inf, math.inf
+    normal = (0, 0)
+    for o, d, lo, hi, axis in ((x, dx, box.left, box.right, 0), (y, dy, box.top, box.bottom, 1)):
+        if d == 0.0:
+            if o < lo or o > hi:
+                return None
+            continue
+        t1, t2 = (lo - o) / d, (hi - o) / d
+        if t1 > t2:
+            t1, t2 = t2, t1
+        if t1 > tmin:
+            tmin = t1
+            n = -1 if d > 0 else 1
+            normal = (n, 0) if axis == 0 else (0, n)
+        tmax = min(tmax, t2)
+    if tmax < max(tmin, 0.0):
+        return None
+    if tmin < 0.0:
+        return 0.0, (0, 0)
+    return tmin, normal
+
+class Breakable:
+    """一条可破坏 tile 记录（编辑器可能已把相邻格合并成一个矩形）的逐格耐久。
+
+    碰撞与绘制用的 tile 由完好、有裂纹两种状态的格子各自合并成尽量少的矩形；
+    某格状态变化时只重建这一条记录的 tile，见 Level.damage_tiles。
+    """
+    __slots__ = ("record", "x", "y", "cw", "ch", "cols", "rows", "hp", "tiles")
+
+    def __init__(self, record: Dict[str, Any]):
+        self.record = record
+        self.x, self.y = float(record["x"]), float(record["y"])
+        w, h = float(record["w"]), float(record["h"])
+        cell = float(record.get("cell") or 0)
+        self.cw, self.ch = (cell, cell) if cell else (w, h)
+        self.cols = max(1, int(round(w / self.cw)))
+        self.rows = max(1, int(round(h / self.ch)))
+        self.hp = [BREAKABLE_HP] * (self.cols * self.rows)
+        self.tiles: List[Tile] = []
+
+    @property
+    def aabb(self) -> AABB:
+        return AABB(self.x, self.y, self.cols * self.cw, self.rows * self.ch)
+
+    def state(self, c: int, r: int) -> int:
+        """0 已碎，1 完好，2 有裂纹"""
+        hp = self.hp[r * self.cols + c]
+        return 0 if hp <= 0 else (1 if hp >= BREAKABLE_HP else 2)
+
+    def hit(self, area: AABB, amount: float) -> Tuple[bool, int]:
+        """与 area 相交的每个未碎的格子扣 amount 耐久，返回 (是否有格子改变了状态, 碎掉的格数)"""
+        c0 = max(0, int((area.left - self.x) // self.cw))
+        r0 = max(0, int((area.top - self.y) // self.ch))
+        c1 = min(self.cols, int(math.ceil((area.right - self.x) / self.cw)))
+        r1 = min(self.rows, int(math.ceil((area.bottom - self.y) / self.ch)))
+        changed = False
+        broken = 0
+        for r in range(r0, r1):
+            for c in range(c0, c1):
+                before = self.state(c, r)
+                if not before:
+                    continue
+                self.hp[r * self.cols + c] -= amount
+                after = self.state(c, r)
+                changed |= after != before
+                broken += not after
+        return changed, broken
+
+    def rects(self) -> List[Tuple[int, int, int, int, int]]:
+        """合并后的矩形 (状态, c0, r0, c1, r1)：每行取同状态的连续段，与上一行完全相同的段向下延伸"""
+        out = []
+        open_runs: Dict[Tuple[int, int, int], int] = {}
+        for r in range(self.rows + 1):
+            runs: Dict[Tuple[int, int, int], int] = {}
+            c = 0
+            while r < self.rows and c < self.cols:
+                s = self.state(c, r)
+                e = c + 1
+                while e < self.cols and self.state(e, r) == s:
+                    e += 1
+                if s:
+                    runs[(c, e, s)] = open_runs.pop((c, e, s), r)
+                c = e
+            out += [(s, c0, r0, c1, r) for (c0, c1, s), r0 in open_runs.items()]
+            open_runs = runs
+        return out
+
+def tile_key(t: Dict[str, Any]) -> Tuple:
+    """tile 记录的标识，用于去重与热更新时的差异比较"""
+    return (t.get("type", "solid"), t["x"], t["y"], t["w"], t["h"], t.get("path"), t.get("cell"))
+
+def entity_key(e: Dict[str, Any]) -> Tuple:
+    return (e.get("type"), e.get("x", 0), e.get("y", 0), json.dumps(e.get("args", {}), sort_keys=True))
+
 class Level:
     def __init__(self, data: Dict[str, Any]):
         self.name = data.get("name", "Unnamed")
         self.world_w = int(data.get("width", SCREEN_W))
         self.world_h = int(data.get("height", SCREEN_H))
-        self.tiles: List[Tile] = []
+        self.tiles = TileStore()
         self.entities: List[Entity] = []  # type: ignore  # forward
         self.spatial = SpatialHash(64)
+        self.dynamic = DynamicHash(128)  # 实体的宽相位，用于渲染裁剪
         self.player: Optional[Player] = None  # type: ignore
         self.boss: Optional[Boss] = None  # type: ignore
         self.doors: List[Door] = []  # type: ignore
+        self.grid = OccupancyGrid(self.world_w, self.world_h)  # 射线检测用，build_spatial 时填充
+        self._los: Dict[Tuple[int, int], Tuple[int, bool]] = {}  # (观察者, 目标) -> (有效至第几帧, 是否可见)
 
-        #-------------------------------------------------------
         #背景支持
-        self.background = None
-        # bg_data = data.get("background", {})
-        # if bg_data:
-        #     for b in bg_data:
+        self.bg_data = data.get("background")
+        self.background = Background.from_data(self.bg_data)
 
-        #         image_paths = b.get("layers", [])
-        #         scroll_ratios = b.get("scroll_ratios", None)
-        #         self.background = Background(image_paths, scroll_ratios)
-        #-------------------------------------------------------
+        # 记录每条 tile/实体数据生成的对象，热更新时据此只修改有变化的部分
+        self.tile_records: Dict[Tuple, Tile] = {}
+        self.entity_records: Dict[Tuple, List[Entity]] = {}  # type: ignore
+        # 可破坏 tile 按记录单独管理，tile 视图 -> 所属记录
+        self.breakables: Dict[Tuple, Breakable] = {}
+        self._breakable_of: Dict[int, Breakable] = {}
+
+        # 先收集本关用到的全部 (图片, 尺寸)，并行解码
+        AssetLoader.prefetch(Level.asset_requests(data))
 
         # 解析 tiles   如果是tile将载入相关路径
         for t in data.get("tiles", []):
-            aabb = AABB(float(t["x"]), float(t["y"]), float(t["w"]), float(t["h"]))
-            kind = t.get("type", "solid")
-            path = t.get("path")
-            img = AssetLoader.load_image(path if path else None, (int(aabb.w), int(aabb.h)), color=GRAY)
-            self.tiles.append(Tile(kind, aabb, img))
+            key = tile_key(t)
+            if key in self.tile_records or key in self.breakables:
+                continue  # 旧地图中重叠放置的重复 tile
+            if t.get("type") == "breakable":
+                self.breakables[key] = Breakable(t)
+                self._place_breakable(self.breakables[key])
+            else:
+                self.tile_records[key] = self._make_tile(t)
         # 解析 entities
         for e in data.get("entities", []):
-            ent = LevelFactory.create_entity(e["type"], float(e.get("x",0)), float(e.get("y",0)), e.get("args",{}))
-            if ent:
-                self.entities.append(ent)
-                if isinstance(ent, Player):
-                    self.player = ent
-                if isinstance(ent, Boss):
-                    self.boss = ent
-                if isinstance(ent, Door):
-                    self.doors.append(ent)
+            self._add_entity(e)
+
+    @staticmethod
+    def asset_requests(data: Dict[str, Any]) -> List[Tuple[str, Tuple[int, int]]]:
+        """关卡数据中 tile 与实体会用到的 (图片, 尺寸)"""
+        pairs = []
+        for t in data.get("tiles", []):
+            size = (int(t["cell"]), int(t["cell"])) if t.get("cell") else (int(t["w"]), int(t["h"]))
+            if t.get("type") == "breakable":
+                pairs.append((t.get("path") or BREAKABLE_IMAGE, size))
+                pairs.append((t.get("cracked", BREAKABLE_CRACKED), size))
+            else:
+                pairs.append((t.get("path"), size))
+        for e in data.get("entities", []):
+            spec = LevelFactory.sprite_spec(e.get("type"), e.get("args", {}))
+            if spec:
+                pairs.append(spec)
+        return pairs
+
+    def _make_tile(self, t: Dict[str, Any]) -> Tile:
+        # 带 cell 字段的是编辑器合并的矩形区域：碰撞用一个整体 AABB，图像按格平铺
+        aabb = AABB(float(t["x"]), float(t["y"]), float(t["w"]), float(t["h"]))
+        kind = t.get("type", "solid")
+        path = t.get("path")
+        cell = int(t.get("cell") or 0)
+        size = (int(aabb.w), int(aabb.h))
+        if cell:
+            img = AssetLoader.load_tiled(path if path else None, cell, size, color=GRAY)
+        else:
+            img = AssetLoader.load_image(path if path else None, size, color=GRAY)
+        if kind == "water":
+            anim = AssetLoader.water(path, img, cell)
+        else:
+            clips = AssetLoader.load_clips(path, size, cell)
+            anim = next(iter(clips.values())) if clips else None
+        if anim is not None:
+            img = anim.frames[0]
+            if len(anim.frames) == 1:
+                anim = None
+        return self.tiles.add(kind, aabb, img, anim)
+
+    def _place_breakable(self, b: Breakable):
+        """按各格当前状态重新生成 b 的 tile，只改动它覆盖范围内的空间哈希与占用格"""
+        self._unplace_breakable(b)
+        cell = int(b.record.get("cell") or 0)
+        for state, c0, r0, c1, r1 in b.rects():
+            aabb = AABB(b.x + c0 * b.cw, b.y + r0 * b.ch, (c1 - c0) * b.cw, (r1 - r0) * b.ch)
+            path = (b.record.get("path") or BREAKABLE_IMAGE) if state == 1 else b.record.get("cracked", BREAKABLE_CRACKED)
+            size = (int(aabb.w), int(aabb.h))
+            if cell:
+                img = AssetLoader.load_tiled(path, cell, size, color=GRAY)
+            else:
+                img = AssetLoader.load_image(path, size, color=GRAY)
+            tile = self.tiles.add("breakable", aabb, img)
+            self.spatial.insert(tile.aabb, tile)
+            self._breakable_of[id(tile)] = b
+            b.tiles.append(tile)
+        self.grid.refresh(b.aabb, self.spatial)
+        self._los.clear()
+
+    def _unplace_breakable(self, b: Breakable):
+        for tile in b.tiles:
+            self.spatial.remove(tile.aabb, tile)
+            self.tiles.remove(tile)
+            self._breakable_of.pop(id(tile), None)
+        b.tiles = []
+
+    def damage_tiles(self, area: AABB, amount: float) -> int:
+        """对与 area 相交的可破坏格造成 amount 点伤害，返回碎掉的格数"""
+        if not self.breakables:
+            return 0
+        hit: List[Breakable] = []
+        for t in self.spatial.query(area):
+            b = self._breakable_of.get(id(t)) if isinstance(t, Tile) else None
+            if b is not None and b not in hit and area.intersects(t.aabb):
+                hit.append(b)
+        broken = 0
+        for b in hit:
+            changed, n = b.hit(area, amount)
+            if changed:
+                self._place_breakable(b)
+            broken += n
+        return broken
+
+    def _add_entity(self, e: Dict[str, Any]):
+        ent = LevelFactory.create_entity(e["type"], float(e.get("x",0)), float(e.get("y",0)), e.get("args",{}))
+        if ent:
+            self.entity_records.setdefault(entity_key(e), []).append(ent)
+            self.entities.append(ent)
+            self.dynamic.update(ent)
+            if isinstance(ent, Player):
+                self.player = ent
+            if isinstance(ent, Boss):
+                self.boss = ent
+            if isinstance(ent, Door):
+                self.doors.append(ent)
+        return ent
 
     def build_spatial(self):
         self.spatial.clear()
+        self.grid = OccupancyGrid(self.world_w, self.world_h)
         for t in self.tiles:
             self.spatial.insert(t.aabb, t)
+            self.grid.add(t)
+        self._los.clear()
+
+    def raycast(self, x: float, y: float, dx: float, dy: float, max_dist: float,
+                mask: int = RAY_SOLID) -> Optional[Tuple[Tile, float, Tuple[int, int]]]:
+        """从 (x, y) 沿 (dx, dy) 方向在占用格上做 DDA 遍历，返回第一个类别在 mask 中的 tile 的
+        (tile, 距离, 表面法线)，max_dist 内没有命中返回 None。
+
+        只有占用位命中的格子才到空间哈希里取 tile 做精确的射线-AABB 相交。
+        """
+        length = math.hypot(dx, dy)
+        if length == 0.0 or max_dist <= 0.0:
+            return None
+        dx /= length
+        dy /= length
+        grid = self.grid
+        cell = grid.cell
+        cx, cy = int(x // cell), int(y // cell)
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # 沿射线走到下一条竖/横格线的距离，以及每跨一格增加的距离
+        t_max_x = (((cx + 1) * cell - x) / dx if dx > 0 else (x - cx * cell) / -dx) if dx else math.inf
+        t_max_y = (((cy + 1) * cell - y) / dy if dy > 0 else (y - cy * cell) / -dy) if dy else math.inf
+        t_delta_x = cell / abs(dx) if dx else math.inf
+        t_delta_y = cell / abs(dy) if dy else math.inf
+        t = 0.0
+        while t <= max_dist:
+            inside = 0 <= cx < grid.cols and 0 <= cy < grid.rows
+            if inside and grid.get(cx, cy) & mask:
+                t_exit = min(t_max_x, t_max_y, max_dist)
+                best = None
+                for tile in self.spatial.query(AABB(cx * cell, cy * cell, cell, cell)):
+                    if not isinstance(tile, Tile) or not TILE_RAY_CLASS.get(tile.kind, 0) & mask:
+                        continue
+                    hit = ray_aabb(x, y, dx, dy, tile.aabb)
+                    if hit and hit[0] <= t_exit + 1e-6 and (best is None or hit[0] < best[1]):
+                        best = (tile, hit[0], hit[1])
+                if best:
+                    return best
+            elif not inside and ((cx < 0 and step_x < 0) or (cx >= grid.cols and step_x > 0) or
+                                 (cy < 0 and step_y < 0) or (cy >= grid.rows and step_y > 0)):
+                return None  # 已离开网格且越走越远
+            if t_max_x < t_max_y:
+                t = t_max_x
+                t_max_x += t_delta_x
+                cx += step_x
+            else:
+                t = t_max_y
+                t_max_y += t_delta_y
+                cy += step_y
+        return None
+
+    def line_of_sight(self, a: "Entity", b: "Entity", frame: int) -> bool:
+        """a 与 b 中心之间是否没有实心 tile 遮挡；结果缓存 LOS_REFRESH_FRAMES 帧"""
+        key = (id(a), id(b))
+        entry = self._los.get(key)
+        if entry is not None and entry[0] > frame:
+            return entry[1]
+        ax, ay = a.aabb.centerx, a.aabb.centery
+        dx, dy = b.aabb.centerx - ax, b.aabb.centery - ay
+        visible = self.raycast(ax, ay, dx, dy, math.hypot(dx, dy), RAY_SOLID) is None
+        if len(self._los) > 4096:
+            self._los.clear()
+        self._los[key] = (frame + LOS_REFRESH_FRAMES, visible)
+        return visible
+
+    def apply_diff(self, data: Dict[str, Any]) -> Tuple[int, int]:
+        """热更新：与新的关卡数据比较，只增删有变化的 tile 与实体。
+
+        tile 的增删只修改其覆盖的空间哈希格子；玩家不会被替换，保留当前位置与状态。
+        返回 (新增数量, 删除数量)。
+        """
+        added = removed = 0
+        self.name = data.get("name", self.name)
+        resized = (int(data.get("width", self.world_w)), int(data.get("height", self.world_h))) != (self.world_w, self.world_h)
+        self.world_w = int(data.get("width", self.world_w))
+        self.world_h = int(data.get("height", self.world_h))
+        if data.get("background") != self.bg_data:
+            self.bg_data = data.get("background")
+            self.background = Background.from_data(self.bg_data)
+
+        new_tiles: Dict[Tuple, Dict[str, Any]] = {}
+        for t in data.get("tiles", []):
+            new_tiles.setdefault(tile_key(t), t)
+        gone = [k for k in self.tile_records if k not in new_tiles]
+        for key in gone:
+            tile = self.tile_records.pop(key)
+            box = tile.copy()
+            self.spatial.remove(box, tile)
+            self.tiles.remove(tile)
+            self.grid.refresh(box, self.spatial)
+            removed += 1
+        for key in [k for k in self.breakables if k not in new_tiles]:
+            b = self.breakables.pop(key)
+            self._unplace_breakable(b)
+            self.grid.refresh(b.aabb, self.spatial)
+            removed += 1
+        for key, t in new_tiles.items():
+            if key in self.tile_records or key in self.breakables:
+                continue
+            if t.get("type") == "breakable":
+                self.breakables[key] = Breakable(t)
+                self._place_breakable(self.breakables[key])
+            else:
+                tile = self._make_tile(t)
+                self.tile_records[key] = tile
+                self.spatial.insert(tile.aabb, tile)
+                self.grid.add(tile)
+            added += 1
+        if resized:
+            self.grid = OccupancyGrid(self.world_w, self.world_h)
+            for tile in self.tiles:
+                self.grid.add(tile)
+        if gone or added:
+            self._los.clear()
+
+        # 实体按记录计数比较：同一记录出现几次就对应几个实体
+        wanted: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for e in data.get("entities", []):
+            if e.get("type") == "player":
+                continue
+            wanted.setdefault(entity_key(e), []).append(e)
+        for key in list(self.entity_records):
+            if key[0] == "player":
+                continue
+            ents = self.entity_records[key]
+            keep = len(wanted.get(key, ()))
+            while len(ents) > keep:
+                self._remove_entity(ents.pop())
+                removed += 1
+            if not ents:
+                del self.entity_records[key]
+        for key, records in wanted.items():
+            have = len(self.entity_records.get(key, ()))
+            for e in records[have:]:
+                if self._add_entity(e):
+                    added += 1
+        return added, removed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """动态状态的快照：在场实体的位置与 SNAPSHOT_FIELDS、可破坏 tile 的耐久，不含其他 tile 与投射物"""
+        ents = []
+        for e in self.entities:
+            if isinstance(e, Projectile) or e.remove_requested:
+                continue
+            fields = {}
+            for f in e.SNAPSHOT_FIELDS:
+                v = getattr(e, f)
+                fields[f] = v.copy() if isinstance(v, (dict, list)) else v
+            ents.append((e, (e.aabb.x, e.aabb.y, e.aabb.w, e.aabb.h), fields))
+        return {"entities": ents, "boss": self.boss,
+                "breakables": {key: list(b.hp) for key, b in self.breakables.items()}}
+
+    def restore(self, snap: Dict[str, Any]):
+        """原地恢复快照：实体都回到检查点时的状态。快照前拾取的道具不会回来；快照后拾取的道具会重新出现，
+        玩家从中得到的效果也一并撤销。快照后被击杀的敌人复活、打碎的 tile 复原，投射物清空"""
+        registered = {id(e) for ents in self.entity_records.values() for e in ents}
+        restored = []
+        for e, box, fields in snap["entities"]:
+            if e is not self.player and id(e) not in registered:
+                continue  # 热更新时已从关卡中删除
+            e.aabb.x, e.aabb.y, e.aabb.w, e.aabb.h = box
+            for f, v in fields.items():
+                setattr(e, f, v.copy() if isinstance(v, (dict, list)) else v)
+            restored.append(e)
+        seen = {id(e) for e in restored}
+        # 快照之后热更新新加入的实体保持现状
+        restored += [e for e in self.entities if id(e) in registered and id(e) not in seen and not e.remove_requested]
+        self.entities = restored
+        self.boss = snap["boss"] if snap["boss"] in restored else None
+        self.dynamic.clear()
+        for e in self.entities:
+            self.dynamic.update(e)
+        self._los.clear()  # 以 id() 为键，快照后销毁的对象的 id 可能已被新对象复用
+        for key, hp in snap.get("breakables", {}).items():
+            b = self.breakables.get(key)
+            if b is not None and b.hp != hp:
+                b.hp = list(hp)
+                self._place_breakable(b)
+
+    def _remove_entity(self, ent: "Entity"):
+        self.dynamic.discard(ent)
+        if ent in self.entities:
+            self.entities.remove(ent)
+        if ent in self.doors:
+            self.doors.remove(ent)
+        if ent is self.boss:
+            self.boss = None
 
 
 # 实体与组件
 # ------------------------------------------------------------
 class Entity:
+    # 实例只存会变化的状态（__slots__，没有 __dict__）；同类共用的常量放在类属性上
+    __slots__ = ("aabb", "vx", "vy", "on_ground", "in_water", "remove_requested", "health", "max_health",
+                 "facing", "sprite", "clips", "hurt_until", "skipped_dt")
+    layer = 1  # 渲染层：0 场景物件，1 生物，2 玩家，3 投射物；同层按底边 y 排序
+    shadow: Optional[pygame.Surface] = None
+    # 检查点快照保存的动态字段（位置另存）；子类在此基础上追加
+    SNAPSHOT_FIELDS: Tuple[str, ...] = ("vx", "vy", "on_ground", "in_water", "remove_requested",
+                                        "health", "max_health", "facing", "skipped_dt")
+
+    @staticmethod
+    def sprite_spec(args: Dict[str, Any]) -> Tuple[Optional[str], Tuple[int, int]]:
+        """由关卡参数得出的 (贴图路径, 尺寸)，构造函数与预加载共用"""
+        return None, (ENTITY_SIZE, ENTITY_SIZE)
+
     def __init__(self, x: float, y: float, w: int=ENTITY_SIZE, h: int=ENTITY_SIZE, sprite_path: Optional[str]=None, color=WHITE):
         self.aabb = AABB(x, y, w, h)
         self.vx = 0.0
@@ -341,24 +1474,40 @@ class Entity:
         self.max_health = 1
         self.facing = 1
         self.sprite = AssetLoader.load_image(sprite_path, (w, h), color=color)
-        self.shadow = None
+        self.clips = AssetLoader.load_clips(sprite_path, (w, h))  # 有帧动画表时按状态取帧
+        self.hurt_until = 0.0
+        self.skipped_dt = 0.0  # 远处降频更新时累计的未结算时间
 
     def update(self, dt: float, game: "Game"):
         pass
 
-    def draw(self, surf: pygame.Surface, camera: "Camera"):
-        x = int(self.aabb.x - camera.x)
-        y = int(self.aabb.y - camera.y)
-
-        img = self.sprite
+    def anim_state(self) -> str:
+        """当前应播放的动画段：hurt / jump / walk / idle"""
+        if ANIM_CLOCK.time < self.hurt_until:
+            return "hurt"
+        if not self.on_ground and not self.in_water and abs(self.vy) > 1:
+            return "jump"
+        if abs(self.vx) > 20:
+            return "walk"
+        return "idle"
+
+    def current_sprite(self) -> pygame.Surface:
+        if not self.clips:
+            return self.sprite
+        anim = self.clips.get(self.anim_state()) or self.clips.get("idle") or next(iter(self.clips.values()))
+        return anim.image
+
+    def render(self, camera: "Camera") -> Tuple[pygame.Surface, Tuple[int, int]]:
+        """返回 (图像, 屏幕坐标)；实体统一由 Game.draw_world 的渲染队列排序后批量绘制"""
+        pos = (int(self.aabb.x - camera.x), int(self.aabb.y - camera.y))
         # 根据方向翻转图像
+        img = self.current_sprite()
         if self.facing == -1:
-            img = pygame.transform.flip(self.sprite, True, False)
-        if self.shadow:
-            surf.blit(self.shadow, (x, y))
-        surf.blit(img, (x, y))
-        
+            img = AssetLoader.flipped(img)
+        return img, pos
+
     def hurt(self, dmg: int, knockback: Tuple[float,float]=(0,0)):
+        self.hurt_until = ANIM_CLOCK.time + HURT_ANIM_TIME
         self.health = max(0, self.health - dmg)
         self.vx += knockback[0]
         self.vy += knockback[1]
@@ -368,6 +1517,8 @@ class Entity:
 class Projectile(Entity):
     #dmg为火球伤害
     #处理火球逻辑
+    __slots__ = ("owner", "damage", "ttl", "color", "emitter")
+    layer = 3
     def __init__(self, x, y, dir, speed=500, dmg=40, owner: Optional[Entity]=None, sprite_path=None, color=ORANGE):
         super().__init__(x, y, PROJECTILE_SIZE, PROJECTILE_SIZE, sprite_path, color)
         self.vx = speed * dir
@@ -375,19 +1526,42 @@ class Projectile(Entity):
         self.owner = owner
         self.damage = dmg
         self.ttl = 3.0
+        self.color = color
+        self.emitter = -1  # 尾迹发射源，第一次更新时创建
+
+    def finish(self, game: "Game", burst: int = 0):
+        """销毁火球：收回尾迹，并在当前位置迸出 burst 个火花"""
+        self.remove_requested = True
+        game.particles.remove_emitter(self.emitter)
+        self.emitter = -1
+        if burst:
+            game.particles.emit(self.aabb.centerx, self.aabb.centery, burst, self.color, angle=math.pi if self.vx > 0 else 0.0, spread=1.2)
+
     def update(self, dt, game: "Game"):
         self.ttl -= dt
         if self.ttl <= 0:
-            self.remove_requested = True
+            self.finish(game)
+            return
+        # 移动：沿本帧位移打一条射线，命中墙面就停在命中点，快速火球也不会穿墙
+        speed = math.hypot(self.vx, self.vy)
+        hit = game.level.raycast(self.aabb.centerx, self.aabb.centery, self.vx, self.vy, speed*dt + self.aabb.w/2, PROJECTILE_MASK)
+        if hit:
+            tile, dist, _ = hit
+            if tile.kind == "breakable":
+                # 命中点沿飞行方向再进 1 像素，落在被击中的格子里
+                ix = self.aabb.centerx + self.vx / speed * (dist + 1)
+                iy = self.aabb.centery + self.vy / speed * (dist + 1)
+                if game.level.damage_tiles(AABB(ix - 0.5, iy - 0.5, 1, 1), self.damage):
+                    game.particles.emit(ix, iy, 16, GRAY, speed=(60, 260))
+            travel = max(0.0, dist - self.aabb.w/2)
+            self.aabb.move(self.vx / speed * travel, self.vy / speed * travel)
+            self.finish(game, burst=10)
             return
-        # 移动
         self.aabb.move(self.vx*dt, self.vy*dt)
-        # 撞到固体tile就销毁
-        for t in game.level.spatial.query(self.aabb):
-            if isinstance(t, Tile) and t.kind in ("solid","oneway","ice","image","conveyor_left","conveyor_right"):
-                if self.aabb.intersects(t.aabb):
-                    self.remove_requested = True
-                    return
+        if self.emitter < 0:
+            self.emitter = game.particles.add_emitter(self.aabb.centerx, self.aabb.centery, 40, self.color)
+        else:
+            game.particles.move_emitter(self.emitter, self.aabb.centerx, self.aabb.centery)
         # 碰撞生物
         targets = []
         if isinstance(self.owner, Player):
@@ -397,17 +1571,23 @@ class Projectile(Entity):
         for e in targets:
             if e is not self.owner and self.aabb.intersects(e.aabb):
                 e.hurt(self.damage, (self.vx*0.02, -150))
-                self.remove_requested = True
+                self.finish(game, burst=8)
+                game.particles.emit(e.aabb.centerx, e.aabb.centery, 12, RED, speed=(80, 240))
                 break
 
 class Creature(Entity):
     #物理引擎
+    __slots__ = ("acc", "max_speed", "can_double_jump", "has_key", "fire_cooldown", "move_intent",
+                 "want_jump", "want_shoot", "crouching", "last_damage_time")
+    jump_power = JUMP_VELOCITY
+    double_jump_power = DOUBLE_JUMP_VELOCITY
+    damage_cooldown = 1.0  # 伤害冷却时间（秒），防止连续扣血
+    SNAPSHOT_FIELDS = Entity.SNAPSHOT_FIELDS + ("acc", "max_speed", "can_double_jump", "has_key", "fire_cooldown",
+                                                "move_intent", "want_jump", "want_shoot", "crouching", "last_damage_time")
     def __init__(self, x, y, w, h, sprite_path=None, color=WHITE):
         super().__init__(x, y, w, h, sprite_path, color)
         self.acc = 2000.0
         self.max_speed = 220.0
-        self.jump_power = JUMP_VELOCITY
-        self.double_jump_power = DOUBLE_JUMP_VELOCITY
         self.can_double_jump = False
         self.has_key = False
         self.fire_cooldown = 0.0
@@ -415,8 +1595,7 @@ class Creature(Entity):
         self.want_jump = False
         self.want_shoot = False
         self.crouching = False
-        self.last_damage_time = 0  # 上次受到伤害的时间
-        self.damage_cooldown = 1.0  # 伤害冷却时间（秒），防止连续扣血
+        self.last_damage_time = -math.inf  # 上次受到伤害的时间（Game.time）
 
     def physics(self, dt: float, game: "Game"):
         # 水/空气阻力
@@ -453,7 +1632,8 @@ class Creature(Entity):
         for t in game.level.spatial.query(self.aabb):
             if not isinstance(t, Tile):
                 continue
-            if t.kind in ("solid","ice","collide_image","conveyor_left","conveyor_right") and self.aabb.intersects(t.aabb):
+            kind = t.kind
+            if kind in ("solid","ice","collide_image","breakable","conveyor_left","conveyor_right") and self.aabb.intersects(t.aabb):
                 sx, sy = self.aabb.intersection(t.aabb)
                 if sx != 0:
                     self.aabb.move(sx, 0)
@@ -461,14 +1641,16 @@ class Creature(Entity):
                     collided_x = True
         # Y轴
         self.aabb.move(0, self.vy*dt)
+        was_in_water = self.in_water
         self.on_ground = False
         self.in_water = False
         for t in game.level.spatial.query(self.aabb):
             if not isinstance(t, Tile):
                 continue
-            if t.kind == "water" and self.aabb.intersects(t.aabb):
+            kind = t.kind
+            if kind == "water" and self.aabb.intersects(t.aabb):
                 self.in_water = True
-            if t.kind in ("solid","ice","collide_image") and self.aabb.intersects(t.aabb):
+            if kind in ("solid","ice","collide_image","breakable") and self.aabb.intersects(t.aabb):
                 sx, sy = self.aabb.intersection(t.aabb)
                 if sy != 0:
                     self.aabb.move(0, sy)
@@ -476,7 +1658,7 @@ class Creature(Entity):
                         self.on_ground = True
                         self.can_double_jump = True  # 落地重置二段跳
                     self.vy = 0
-            if t.kind == "oneway":
+            if kind == "oneway":
                 # 仅从上方站立
                 if self.vy >= 0 and self.aabb.bottom > t.aabb.top and self.aabb.top < t.aabb.top and abs(self.aabb.right - t.aabb.left) > 1 and abs(self.aabb.left - t.aabb.right) > 1:
                     if self.aabb.bottom > t.aabb.top and self.aabb.intersects(t.aabb):
@@ -484,27 +1666,38 @@ class Creature(Entity):
                         self.on_ground = True
                         self.can_double_jump = True
                         self.vy = 0
-            if t.kind == "hazard" and self.aabb.intersects(t.aabb):
+            if kind == "hazard" and self.aabb.intersects(t.aabb):
                 self.hurt(10, (0, -200))
-            if t.kind == "conveyor_left" and self.on_ground:
+            if kind == "conveyor_left" and self.on_ground:
                 self.aabb.move(-40*dt, 0)
-            if t.kind == "conveyor_right" and self.on_ground:
+            if kind == "conveyor_right" and self.on_ground:
                 self.aabb.move(40*dt, 0)
+        if self.in_water and not was_in_water and self.vy > 120:
+            # 入水水花
+            game.particles.emit(self.aabb.centerx, self.aabb.bottom, 16, CYAN, speed=(120, 260), angle=-math.pi/2, spread=0.7)
 
 
 # ------------------------------------------------------------
 class Player(Creature):
+    __slots__ = ("unlocked_fireball", "inventory", "iframes", "want_interact")
+    layer = 2
+    SNAPSHOT_FIELDS = Creature.SNAPSHOT_FIELDS + ("unlocked_fireball", "inventory", "iframes")
+
+    @staticmethod
+    def sprite_spec(args):
+        return PLAYER_IMAGE_PATH, (ENTITY_SIZE, ENTITY_SIZE)
+
     def __init__(self, x, y, args: Dict[str, Any]):
-        super().__init__(x, y, ENTITY_SIZE, ENTITY_SIZE, PLAYER_IMAGE_PATH, color=BLUE)
+        path, (w, h) = Player.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=BLUE)
         self.max_health = int(args.get("health", 100))
         self.health = self.max_health
         self.max_speed = float(args.get("speed", 220))
         self.acc = 2200.0
-        self.jump_power = JUMP_VELOCITY
-        self.double_jump_power = DOUBLE_JUMP_VELOCITY
         self.unlocked_fireball = True  # 可以通过道具锁/解
         self.inventory: Dict[str, int] = {}
         self.iframes = 0.0
+        self.want_interact = False
 
     def handle_input(self, keys: pygame.key.ScancodeWrapper):
         self.move_intent = 0.0
@@ -523,7 +1716,7 @@ class Player(Creature):
         #     print(f"[DEBUG] move_intent={self.move_intent} vx={self.vx}")
 
     def update(self, dt: float, game: "Game"):
-        keys = pygame.key.get_pressed()
+        keys = game.pressed_keys()
         self.handle_input(keys)
         # 跳跃按键沿用事件触发（防止长按多次）
         # 发射
@@ -539,11 +1732,13 @@ class Player(Creature):
             if isinstance(e, Item) and self.aabb.intersects(e.aabb):
                 e.apply(self)
                 e.remove_requested = True
-        # 门 & 告示牌交互
-        if keys[pygame.K_e]:
+        # 门 & 告示牌交互：只在按下 E 的那一帧触发
+        if self.want_interact:
+            self.want_interact = False
             for d in game.level.doors:
                 if self.aabb.intersects(d.aabb):
-                    game.load_level(d.target)
+                    game.request_level(d.target)
+                    break
             for e in game.level.entities:
                 if isinstance(e, Sign) and self.aabb.intersects(e.aabb):
                     game.hud.set_message(e.text)
@@ -551,6 +1746,9 @@ class Player(Creature):
     def on_jump_pressed(self):
         self.want_jump = True
 
+    def on_interact_pressed(self):
+        self.want_interact = True
+
     def on_shoot_pressed(self):
         if self.unlocked_fireball and self.fire_cooldown <= 0.0:
             p = Projectile(self.aabb.x + self.aabb.w/2, self.aabb.y + self.aabb.h/2, self.facing, speed=560, dmg=12, owner=self)
@@ -566,7 +1764,7 @@ class Player(Creature):
 
     def take_damage(self, amount, knockback: tuple[float, float], game: "Game"):
         """玩家受到伤害的处理方法"""
-        current_time = pygame.time.get_ticks() / 1000.0  # 获取当前时间（秒）
+        current_time = game.time  # 游戏内时间（秒）
         
         # 检查是否在冷却时间内
         if current_time - self.last_damage_time < self.damage_cooldown:
@@ -575,6 +1773,8 @@ class Player(Creature):
         # 扣血
         self.health -= amount
         self.last_damage_time = current_time
+        self.hurt_until = ANIM_CLOCK.time + HURT_ANIM_TIME
+        game.particles.emit(self.aabb.centerx, self.aabb.centery, 12, RED, speed=(80, 240))
         
         # 应用击退效果
         self.vx, self.vy = knockback
@@ -584,14 +1784,23 @@ class Player(Creature):
             self.remove_requested = True
 
 class Enemy(Creature):
+    __slots__ = ("variant", "jump_timer", "wander_phase")
+    SNAPSHOT_FIELDS = Creature.SNAPSHOT_FIELDS + ("jump_timer",)
+
+    @staticmethod
+    def sprite_spec(args):
+        return MONSTER_1_IMAGE_PATH, (35, 40)
+
     def __init__(self, x, y, args: Dict[str, Any]):
         color = RED
-        super().__init__(x, y, 35, 40, MONSTER_1_IMAGE_PATH, color=color)
+        path, (w, h) = Enemy.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=color)
         self.variant = args.get("variant", "patroller")
         self.max_health = int(args.get("health", 40))
         self.health = self.max_health
         self.max_speed = float(args.get("speed", 180))
         self.jump_timer = random.uniform(1.0, 2.5)
+        self.wander_phase = (int(x) * 31 + int(y)) % 10  # 由出生位置决定，回放时与录制一致（不能用 id）
 
     def ai(self, dt: float, game: "Game"):
         # 简化AI：根据variant调整行为
@@ -615,7 +1824,7 @@ class Enemy(Creature):
                 self.facing = 1 if self.move_intent > 0 else -1
         elif self.variant == "wanderer":
             # 随机游走
-            self.move_intent = math.sin(pygame.time.get_ticks()*0.001 + id(self)%10)
+            self.move_intent = math.sin(game.time + self.wander_phase)
             self.facing = 1 if self.move_intent >= 0 else -1
 
 
@@ -627,7 +1836,7 @@ class Enemy(Creature):
         foot_aabb = AABB(foot_x, foot_y, check_distance, 4)
         has_ground = False
         for t in game.level.spatial.query(foot_aabb):
-            if isinstance(t, Tile) and t.kind in ("solid", "water", "ice", "collide_image"):
+            if isinstance(t, Tile) and t.kind in ("solid", "water", "ice", "collide_image", "breakable"):
                 if foot_aabb.intersects(t.aabb):
                     has_ground = True
                     break
@@ -638,7 +1847,8 @@ class Enemy(Creature):
 
         # 简单远程：偶尔射击
         if player and random.random() < 0.004:
-            if abs(player.aabb.x - self.aabb.x) < 400 and abs(player.aabb.y - self.aabb.y) < 100:
+            if abs(player.aabb.x - self.aabb.x) < 400 and abs(player.aabb.y - self.aabb.y) < 100 \
+                    and game.level.line_of_sight(self, player, game.frame):
                 dir = 1 if player.aabb.x > self.aabb.x else -1
                 return Projectile(self.aabb.x+self.aabb.w/2, self.aabb.y+self.aabb.h/2, dir, speed=420, dmg=8, owner=self, color=PURPLE)
         return None
@@ -663,14 +1873,24 @@ class Enemy(Creature):
             game.level.player.take_damage(10, knockback, game)
 
 class Boss(Creature):
+    __slots__ = ("pattern_t", "phase", "fire_cd", "fire_interval")
+    SNAPSHOT_FIELDS = Creature.SNAPSHOT_FIELDS + ("phase", "fire_cd", "pattern_t")
+
+    @staticmethod
+    def sprite_spec(args):
+        return args.get("sprite"), (ENTITY_SIZE*2, ENTITY_SIZE*2)
+
     def __init__(self, x, y, args: Dict[str, Any]):
-        super().__init__(x, y, ENTITY_SIZE*2, ENTITY_SIZE*2, args.get("sprite"), color=YELLOW)
+        path, (w, h) = Boss.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=YELLOW)
         self.max_health = int(args.get("health", 300))
         self.health = self.max_health
         self.max_speed = float(args.get("speed", 180))
         self.pattern_t = 0.0
         self.phase = 1
         self.fire_cd = 0.0
+        # 一阶段的射击间隔（秒），二阶段为它的 2/3
+        self.fire_interval = float(args.get("fire_interval", 1.2))
 
     def update(self, dt: float, game: "Game"):
         player = game.level.player
@@ -680,7 +1900,7 @@ class Boss(Creature):
         # 阶段与射击模式
         self.pattern_t += dt
         self.fire_cd = max(0.0, self.fire_cd - dt)
-        if self.fire_cd == 0.0 and player:
+        if self.fire_cd == 0.0 and player and game.level.line_of_sight(self, player, game.frame):
             # 发射扇形火球
             for ang in (-0.3, -0.15, 0, 0.15, 0.3):
                 dir = 1 if player.aabb.x > self.aabb.x else -1
@@ -688,14 +1908,23 @@ class Boss(Creature):
                 # 在水平速度基础上加一点角速度
                 p.vy = math.tan(ang) * abs(p.vx)
                 game.spawn(p)
-            self.fire_cd = 1.2 if self.phase==1 else 0.8
+            self.fire_cd = self.fire_interval if self.phase==1 else self.fire_interval * 2 / 3
         # 血量驱动阶段
         hp_ratio = self.health / self.max_health
-        self.phase = 2 if hp_ratio < 0.5 else 1
+        phase = 2 if hp_ratio < 0.5 else 1
+        if phase != self.phase:
+            # 阶段切换：向四周爆出一圈火花
+            game.particles.emit(self.aabb.centerx, self.aabb.centery, 80, YELLOW, speed=(150, 420), life=(0.5, 1.0), gravity=0.0)
+        self.phase = phase
         if self.phase == 2:
             self.max_speed = 240
             self.acc = 2600
         self.physics(dt, game)
+        # 顶着可破坏 tile 时把它撞碎
+        if game.level.breakables:
+            front = AABB(self.aabb.right if self.facing > 0 else self.aabb.left - 2, self.aabb.top, 2, self.aabb.h - 1)
+            if game.level.damage_tiles(front, BOSS_SMASH_DPS * dt):
+                game.particles.emit(front.centerx, self.aabb.centery, 24, GRAY, speed=(80, 320))
 
         # 检测与玩家的碰撞
         self.check_player_collision(game)
@@ -711,10 +1940,17 @@ class Boss(Creature):
             game.level.player.take_damage(20, knockback, game)
 
 class Item(Entity):
+    __slots__ = ("kind", "amount")
+    layer = 0
+    @staticmethod
+    def sprite_spec(args):
+        return FOOD_IMAGE_PATH, (TILE_SIZE, TILE_SIZE)
+
     def __init__(self, x, y, args: Dict[str, Any]):
         kind = args.get("kind", "health")
         color = CYAN if kind != "health" else GREEN
-        super().__init__(x, y, TILE_SIZE, TILE_SIZE, FOOD_IMAGE_PATH, color=color)
+        path, (w, h) = Item.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=color)
         self.kind = kind
         self.amount = int(args.get("amount", 25))
     def apply(self, player: Player):
@@ -730,55 +1966,408 @@ class Item(Entity):
             player.has_key = True
 
 class Door(Entity):
+    __slots__ = ("target",)
+    layer = 0
+    @staticmethod
+    def sprite_spec(args):
+        return DOOR_IMAGE_PATH, (50, TILE_SIZE*3)
+
     def __init__(self, x, y, args: Dict[str, Any]):
-        super().__init__(x, y, 50, TILE_SIZE*3, DOOR_IMAGE_PATH, color=GRAY)
+        path, (w, h) = Door.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=GRAY)
         self.target = args.get("target", None)
-        self.is_enter = False
-
 
-    def handle_output():
-        pass
-
-    def update(self, dt, game):
-        if self.aabb.intersects(game.level.player.aabb):
-            self.is_enter = True
-        return super().update(dt, game)           #返回到父类的update()
-        
 class Sign(Entity):
+    __slots__ = ("text",)
+    layer = 0
+    @staticmethod
+    def sprite_spec(args):
+        return ATTENTION_IMAGE_PATH, (TILE_SIZE, TILE_SIZE)
+
     def __init__(self, x, y, args: Dict[str, Any]):
-        super().__init__(x, y, TILE_SIZE, TILE_SIZE, ATTENTION_IMAGE_PATH, color=WHITE)
+        path, (w, h) = Sign.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=WHITE)
         self.text = args.get("text", "")
 
+class Checkpoint(Entity):
+    """检查点：玩家第一次碰到时记录快照，死亡后从这里恢复"""
+    __slots__ = ("activated",)
+    layer = 0
+    SNAPSHOT_FIELDS = Entity.SNAPSHOT_FIELDS + ("activated",)
+
+    @staticmethod
+    def sprite_spec(args):
+        return args.get("sprite"), (TILE_SIZE, TILE_SIZE*2)
+
+    def __init__(self, x, y, args: Dict[str, Any]):
+        path, (w, h) = Checkpoint.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=GREEN)
+        self.activated = False
+
+    def update(self, dt, game):
+        p = game.level.player
+        if not self.activated and p and not p.remove_requested and self.aabb.intersects(p.aabb):
+            self.activated = True
+            game.save_checkpoint()
+            game.hud.set_message("已到达检查点")
+
 class Block(Entity):
+    __slots__ = ()
+    layer = 0
+    @staticmethod
+    def sprite_spec(args):
+        return SPIKES_IMAGE_PATH, (int(args.get("w", TILE_SIZE)), int(args.get("h", TILE_SIZE)))
+
     def __init__(self, x, y, args: Dict[str, Any]):
-        super().__init__(x, y, int(args.get("w", TILE_SIZE)), int(args.get("h", TILE_SIZE)), SPIKES_IMAGE_PATH, color=GRAY)
+        path, (w, h) = Block.sprite_spec(args)
+        super().__init__(x, y, w, h, path, color=GRAY)
 
 
 # 工厂
 # -----------------------------------------------------------
 class LevelFactory:
+    KINDS = {"player": Player, "enemy": Enemy, "boss": Boss, "item": Item, "door": Door, "sign": Sign, "block": Block,
+             "checkpoint": Checkpoint}
+
     @staticmethod
     def create_entity(kind: str, x: float, y: float, args: Dict[str, Any]) -> Optional[Entity]:
-        kind = (kind or "").lower()
-        if kind == "player":
-            return Player(x, y, args)
-        if kind == "enemy":
-            return Enemy(x, y, args)
-        if kind == "boss":
-            return Boss(x, y, args)
-        if kind == "item":
-            return Item(x, y, args)
-        if kind == "door":
-            return Door(x, y, args)
-        if kind == "sign":
-            return Sign(x, y, args)
-        if kind == "block":
-            return Block(x, y, args)
-        return None
+        cls = LevelFactory.KINDS.get((kind or "").lower())
+        return cls(x, y, args) if cls else None
+
+    @staticmethod
+    def sprite_spec(kind: str, args: Dict[str, Any]) -> Optional[Tuple[str, Tuple[int, int]]]:
+        """实体贴图的 (路径, 尺寸)，不创建实体；用于关卡载入前的批量预解码"""
+        cls = LevelFactory.KINDS.get((kind or "").lower())
+        if not cls:
+            return None
+        path, size = cls.sprite_spec(args)
+        return (path, size) if path else None
+
+
+
+# 粒子特效
+# ------------------------------------------------------------
+class ParticleSystem:
+    """粒子与发射源的状态都存放在 NumPy 数组里，整批积分、裁剪，不为每个粒子建 Python 对象。
+
+    粒子总数不超过 budget，超出时新的发射被丢弃；绘制时按颜色与剩余寿命
+    从一小组预渲染的方块里取图，一次 blits 提交。
+    """
+    COLORS = (ORANGE, PURPLE, RED, YELLOW, CYAN, WHITE)
+
+    def __init__(self, budget: int = PARTICLE_BUDGET):
+        self.capacity = budget
+        self.budget = budget
+        self.rng = np.random.default_rng()
+        self.count = 0  # 存活的粒子紧凑地排在数组前 count 位
+        self.pos = np.zeros((budget, 2), np.float32)
+        self.vel = np.zeros((budget, 2), np.float32)
+        self.life = np.zeros(budget, np.float32)
+        self.max_life = np.ones(budget, np.float32)
+        self.gravity = np.zeros(budget, np.float32)
+        self.color = np.zeros(budget, np.int16)
+        # 发射源：位置、每秒发射数、累计量、颜色
+        self.e_alive = np.zeros(PARTICLE_EMITTERS, bool)
+        self.e_pos = np.zeros((PARTICLE_EMITTERS, 2), np.float32)
+        self.e_rate = np.zeros(PARTICLE_EMITTERS, np.float32)
+        self.e_acc = np.zeros(PARTICLE_EMITTERS, np.float32)
+        self.e_color = np.zeros(PARTICLE_EMITTERS, np.int16)
+        self.sprites: List[pygame.Surface] = []
+        for c in self.COLORS:
+            for f in range(PARTICLE_FADES):
+                surf = pygame.Surface((PARTICLE_SIZE, PARTICLE_SIZE), flags=pygame.SRCALPHA)
+                surf.fill((*c, 255 * (f + 1) // PARTICLE_FADES))
+                self.sprites.append(surf)
+
+    def color_index(self, color) -> int:
+        return self.COLORS.index(color) if color in self.COLORS else self.COLORS.index(WHITE)
+
+    def clear(self):
+        self.count = 0
+        self.e_alive[:] = False
+
+    def emit(self, x: float, y: float, n: int, color=ORANGE, speed=(60.0, 200.0), life=(0.25, 0.6),
+             angle: float = 0.0, spread: float = math.pi, gravity: float = GRAVITY * 0.4):
+        """在 (x, y) 一次发射 n 个粒子，方向为 angle±spread（弧度，0 朝右、正值朝下）"""
+        n = min(int(n), self.budget - self.count)
+        if n <= 0:
+            return
+        a, b = self.count, self.count + n
+        rng = self.rng
+        theta = angle + rng.uniform(-spread, spread, n)
+        v = rng.uniform(speed[0], speed[1], n)
+        self.pos[a:b, 0] = x
+        self.pos[a:b, 1] = y
+        self.vel[a:b, 0] = np.cos(theta) * v
+        self.vel[a:b, 1] = np.sin(theta) * v
+        self.life[a:b] = self.max_life[a:b] = rng.uniform(life[0], life[1], n)
+        self.gravity[a:b] = gravity
+        self.color[a:b] = self.color_index(color)
+        self.count = b
+
+    def add_emitter(self, x: float, y: float, rate: float, color=ORANGE) -> int:
+        """持续发射源，返回编号（没有空位时返回 -1）"""
+        free = np.flatnonzero(~self.e_alive)
+        if not len(free):
+            return -1
+        i = int(free[0])
+        self.e_alive[i] = True
+        self.e_pos[i] = (x, y)
+        self.e_rate[i] = rate
+        self.e_acc[i] = 0.0
+        self.e_color[i] = self.color_index(color)
+        return i
+
+    def move_emitter(self, i: int, x: float, y: float):
+        if i >= 0:
+            self.e_pos[i] = (x, y)
+
+    def remove_emitter(self, i: int):
+        if i >= 0:
+            self.e_alive[i] = False
+
+    def update(self, dt: float):
+        # 发射源：按速率累计，整数部分化为新粒子
+        live = np.flatnonzero(self.e_alive)
+        if len(live):
+            self.e_acc[live] += self.e_rate[live] * dt
+            spawn = self.e_acc[live].astype(np.int32)
+            self.e_acc[live] -= spawn
+            total = min(int(spawn.sum()), self.budget - self.count)
+            if total > 0:
+                src = np.repeat(live, spawn)[:total]
+                a, b = self.count, self.count + total
+                rng = self.rng
+                self.pos[a:b] = self.e_pos[src] + rng.uniform(-2, 2, (total, 2))
+                self.vel[a:b] = rng.uniform(-30, 30, (total, 2))
+                self.life[a:b] = self.max_life[a:b] = rng.uniform(0.15, 0.35, total)
+                self.gravity[a:b] = -60.0  # 尾迹略微上飘
+                self.color[a:b] = self.e_color[src]
+                self.count = b
+        n = min(self.count, self.budget)
+        if n == 0:
+            self.count = 0
+            return
+        # 积分并剔除寿命耗尽的粒子，保持紧凑
+        self.life[:n] -= dt
+        self.vel[:n, 1] += self.gravity[:n] * dt
+        self.pos[:n] += self.vel[:n] * dt
+        keep = self.life[:n] > 0
+        k = int(keep.sum())
+        if k < n:
+            for arr in (self.pos, self.vel, self.life, self.max_life, self.gravity, self.color):
+                arr[:k] = arr[:n][keep]
+        self.count = k
+
+    def draw(self, surf: pygame.Surface, camera: Camera):
+        n = self.count
+        if n == 0:
+            return
+        pos = self.pos[:n] - (camera.x, camera.y)
+        vis = (pos[:, 0] > -PARTICLE_SIZE) & (pos[:, 0] < SCREEN_W) & (pos[:, 1] > -PARTICLE_SIZE) & (pos[:, 1] < SCREEN_H)
+        if not vis.any():
+            return
+        fade = np.minimum((self.life[:n][vis] / self.max_life[:n][vis] * PARTICLE_FADES).astype(np.int32), PARTICLE_FADES - 1)
+        idx = self.color[:n][vis].astype(np.int32) * PARTICLE_FADES + fade
+        sprites = self.sprites
+        surf.blits([(sprites[i], p) for i, p in zip(idx.tolist(), pos[vis].astype(np.int32).tolist())], doreturn=False)
+
 
+# 帧预算调节
+# ------------------------------------------------------------
+class FrameGovernor:
+    """根据帧耗时在画质档位间升降，带滞回，避免来回抖动。
+
+    每次调整都记录在 decisions 中，帧追踪开启时也写进 trace；只有设置环境变量 PIXEL_TRACE_GOVERNOR=1
+    （或 python main.py --trace-governor）时才打印到终端，便于调阈值。
+    """
+    def __init__(self, fps: int = FPS):
+        self.budget = 1.0 / fps
+        self.level = len(QUALITY_LEVELS) - 1
+        self.avg = self.budget * 0.5
+        self.over = 0
+        self.under = 0
+        self.frame = 0
+        self.decisions: List[Dict[str, Any]] = []
+        self.verbose = bool(os.environ.get("PIXEL_TRACE_GOVERNOR"))
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return QUALITY_LEVELS[self.level]
+
+    def sample(self, work: float) -> bool:
+        """记录一帧的耗时（秒），档位变化时返回 True"""
+        self.frame += 1
+        self.avg += (work - self.avg) * 0.1
+        if self.avg > self.budget * GOVERNOR_DOWN:
+            self.over += 1
+            self.under = 0
+        elif self.avg < self.budget * GOVERNOR_UP:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+        if self.over >= GOVERNOR_DOWN_FRAMES and self.level > 0:
+            return self._change(-1)
+        if self.under >= GOVERNOR_UP_FRAMES and self.level < len(QUALITY_LEVELS) - 1:
+            return self._change(+1)
+        return False
+
+    def _change(self, step: int) -> bool:
+        old = self.level
+        self.level += step
+        self.over = self.under = 0
+        d = {"frame": self.frame, "avg_ms": round(self.avg * 1000, 2), "budget_ms": round(self.budget * 1000, 2),
+             "from": old, "to": self.level, **self.settings}
+        self.decisions.append(d)
+        if TRACER.enabled:
+            now = time.perf_counter()
+            TRACER.add(f"governor {old} -> {self.level}", now, now)
+        if self.verbose:
+            print(f"[governor] 第 {d['frame']} 帧 平均 {d['avg_ms']}ms / 预算 {d['budget_ms']}ms: 档位 {old} -> {self.level} {self.settings}")
+        return True
+
+    def reset(self):
+        """回到最高画质档，清空统计"""
+        self.level = len(QUALITY_LEVELS) - 1
+        self.avg = self.budget * 0.5
+        self.over = self.under = 0
+
+    def apply(self, game: "Game"):
+        q = self.settings
+        game.particles.budget = max(1, int(game.particles.capacity * q["particles"]))
+        game.far_tick = q["far_tick"]
+        game.parallax_layers = q["parallax"]
 
 
 # 摄像机 & HUD & 菜单
+# ------------------------------------------------------------
+def resolve_level_path(target: Optional[str]) -> Optional[str]:
+    """门的 target 可以是 "level2.json"、"levels/level2.json" 或绝对路径，统一解析成文件路径"""
+    if not target:
+        return None
+    if os.path.isabs(target):
+        return os.path.normpath(target)
+    for base in (LEVEL_ROOT, os.path.dirname(LEVEL_ROOT)):
+        path = os.path.normpath(os.path.join(base, target))
+        if os.path.isfile(path):
+            return path
+    return os.path.normpath(os.path.join(LEVEL_ROOT, target))
+
+
+def level_files(root: str = LEVEL_ROOT) -> List[str]:
+    """root 下的关卡 JSON（按文件名排序）；编辑器自动保存等不含 tiles 的 JSON 不算关卡，跳过"""
+    files = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.normpath(os.path.join(root, name))
+        if not name.endswith(".json") or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and isinstance(data.get("tiles"), list):
+            files.append(path)
+    return files
+
+
+class LevelTransition:
+    """关卡切换状态机：active -> requested -> loading -> fading -> active
+
+    切换过程中重复的请求直接合并（忽略），每次切换只载入一次；
+    预读过的关卡 JSON（后台线程解析）在 loading 时直接使用。
+    """
+    FADE_TIME = 0.35
+
+    def __init__(self):
+        self.state = "active"
+        self.target: Optional[str] = None
+        self.fade = 0.0
+        self._preloaded: Dict[str, Tuple[threading.Event, List[Any]]] = {}
+        self._overlay: Optional[pygame.Surface] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.state != "active"
+
+    def preload(self, path: Optional[str]):
+        """后台读取并解析关卡 JSON；结果为 (数据, 读取时的 mtime)"""
+        if not path or path in self._preloaded:
+            return
+        done = threading.Event()
+        box: List[Any] = [None, None]
+
+        def work():
+            t = time.perf_counter()
+            try:
+                stamp = os.stat(path).st_mtime_ns
+                with open(path, "r", encoding="utf-8") as f:
+                    box[:] = [json.load(f), stamp]
+            except (OSError, ValueError):
+                pass  # 交给 _load_or_default 处理（默认关卡或报错）
+            StartupTrace.record("解析关卡 JSON", time.perf_counter() - t)
+            done.set()
+
+        self._preloaded[path] = (done, box)
+        threading.Thread(target=work, daemon=True).start()
+
+    def take(self, path: str, wait: bool = True) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """取出预读结果：(是否就绪, 数据)；没有预读或文件已修改时数据为 None"""
+        entry = self._preloaded.get(path)
+        if entry is None:
+            return True, None
+        done, box = entry
+        if not done.wait(None if wait else 0):
+            return False, None
+        del self._preloaded[path]
+        data, stamp = box
+        try:
+            if data is not None and os.stat(path).st_mtime_ns != stamp:
+                data = None
+        except OSError:
+            data = None
+        return True, data
+
+    def cancel(self):
+        """中止切换并丢弃所有预读（还没读完的线程结束后结果无人引用，随之回收）"""
+        self.state = "active"
+        self.target = None
+        self._preloaded.clear()
+
+    def request(self, path: Optional[str]) -> bool:
+        if not path or self.busy:
+            return False
+        self.target = path
+        self.state = "requested"
+        return True
+
+    def update(self, game: "Game", dt: float):
+        if self.state == "requested":
+            # 先画一帧黑幕再开始载入，避免载入卡顿时画面停在旧关卡上
+            self.state = "loading"
+        elif self.state == "loading":
+            _, data = self.take(self.target)
+            game.load_level(self.target, data)
+            self.target = None
+            self.state = "fading"
+            self.fade = self.FADE_TIME
+        elif self.state == "fading":
+            self.fade -= dt
+            if self.fade <= 0.0:
+                self.state = "active"
+
+    def draw(self, surf: pygame.Surface):
+        if self.state == "active":
+            return
+        alpha = 255 if self.state != "fading" else int(255 * max(0.0, self.fade) / self.FADE_TIME)
+        if self._overlay is None:
+            self._overlay = pygame.Surface((SCREEN_W, SCREEN_H))
+            self._overlay.fill((0, 0, 0))
+        self._overlay.set_alpha(alpha)
+        surf.blit(self._overlay, (0, 0))
+
+
 # ------------------------------------------------------------
 class Camera:
     def __init__(self):
@@ -797,8 +2386,6 @@ class Camera:
 class HUD:
     def __init__(self, game: "Game"):
         self.game = game
-        self.font = pygame.font.SysFont("SimHei", 18)
-        self.big = pygame.font.SysFont("SimHei", 32)
         self.message = ""
         self.msg_timer = 0.0
 
@@ -816,7 +2403,7 @@ class HUD:
             ratio = p.health / max(1, p.max_health)
             pygame.draw.rect(surf, BLACK, (20, 20, 220, 22), 0)
             pygame.draw.rect(surf, RED, (22, 22, int(216*ratio), 18), 0)
-            txt = self.font.render(f"HP {p.health}/{p.max_health}", True, WHITE)
+            txt = AssetLoader.font(18).render(f"HP {p.health}/{p.max_health}", True, WHITE)
             surf.blit(txt, (24, 22))
         # Boss 血条
         b = self.game.level.boss
@@ -826,14 +2413,12 @@ class HUD:
             pygame.draw.rect(surf, ORANGE, (SCREEN_W//2-198, 22, int(396*ratio), 12), 0)
         # 提示
         if self.msg_timer > 0 and self.message:
-            msg = self.big.render(self.message, True, YELLOW)
+            msg = AssetLoader.font(32).render(self.message, True, YELLOW)
             surf.blit(msg, (SCREEN_W//2 - msg.get_width()//2, 60))
 
 # 简单菜单
 class Menu:
     def __init__(self):
-        self.font = pygame.font.SysFont("SimHei", 28)
-        self.small = pygame.font.SysFont("SimHei", 18)
         #Menu状态
         self.active = True
         self.describle = False
@@ -842,38 +2427,130 @@ class Menu:
         self.sel = 0
 
     def draw_centered(self, surf: pygame.Surface, title: str):
-        font = pygame.font.SysFont("SimHei", 58)
-        title_s = font.render(title, True, WHITE)
+        title_s = AssetLoader.font(58).render(title, True, WHITE)
         surf.blit(title_s, (SCREEN_W//2 - title_s.get_width()//2, 110))
         for i, it in enumerate(self.items):
-            t = self.font.render((" >" if i==self.sel else "  ")+it, True, WHITE if i==self.sel else GRAY)
+            t = AssetLoader.font(28).render((" >" if i==self.sel else "  ")+it, True, WHITE if i==self.sel else GRAY)
             surf.blit(t, (SCREEN_W//2 - 100, 220 + i*40))
-        hint = self.small.render("Enter确认  ↑↓选择  Esc返回/暂停", True, GRAY)
+        hint = AssetLoader.font(18).render("Enter确认  ↑↓选择  Esc返回/暂停", True, GRAY)
         surf.blit(hint, (SCREEN_W//2 - hint.get_width()//2, SCREEN_H-80))
 
 
 
+# 输入录制与回放
+class ActionInput:
+    """由动作字节生成的按键表，注入 Game.input 替代键盘（回放、训练环境）"""
+    def __init__(self):
+        self.action = 0
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key: int) -> bool:
+        return bool(self.action & HELD_KEYS.get(key, 0))
+
+    @staticmethod
+    def held_from_keyboard() -> int:
+        keys = pygame.key.get_pressed()
+        return sum(bit for key, bit in HELD_KEYS.items() if keys[key])
+
+
+class InputRecorder:
+    """逐帧记录动作字节，连同关卡、随机种子和固定时间步长写成压缩文件。
+
+    文件格式：REPLAY_MAGIC、一行 JSON 头（level/seed/dt/frames/hash），其后是 zlib 压缩的每帧一个字节。
+    """
+    def __init__(self, path: str, level: str, seed: int, dt: float = 1.0 / FPS):
+        self.path = path
+        self.header = {"level": level, "seed": seed, "dt": dt}
+        self.actions = bytearray()
+
+    def frame(self, action: int):
+        self.actions.append(action)
+
+    def save(self, state_hash: str) -> str:
+        header = dict(self.header, frames=len(self.actions), hash=state_hash)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(REPLAY_MAGIC)
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.write(zlib.compress(bytes(self.actions), 9))
+        return self.path
+
+    @staticmethod
+    def load(path: str) -> Tuple[Dict[str, Any], bytes]:
+        with open(path, "rb") as f:
+            if f.readline() != REPLAY_MAGIC:
+                raise ValueError(f"{path} 不是录像文件")
+            header = json.loads(f.readline().decode("utf-8"))
+            actions = zlib.decompress(f.read())
+        if len(actions) != header["frames"]:
+            raise ValueError(f"{path} 帧数不符")
+        return header, actions
+
+
 # 游戏主类
 # ------------------------------------------------------------
 class Game:
     def __init__(self):
-        pygame.init()
+        StartupTrace.mark("import")
+        # 只初始化用到的模块（pygame.init() 还会初始化音频、手柄等）
+        pygame.display.init()
+        pygame.font.init()
         pygame.display.set_caption(CAPTION)
-        self.font = pygame.font.SysFont("SimHei",22)
         self.screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+        StartupTrace.mark("display")
         self.clock = pygame.time.Clock()
+        self.clock.tick()  # 顺带初始化 SDL 计时器，get_ticks 依赖它（原先由 pygame.init() 完成）
         self.camera = Camera()
         self.hud = HUD(self)
         self.menu = Menu()
         self.timer = Timer()
+        self.particles = ParticleSystem()
+        self.governor = FrameGovernor()
+        self.far_tick = 1
+        self.parallax_layers: Optional[int] = None
+        self.frame = 0
+        self.time = 0.0  # 游戏内时钟（秒），只随 update 推进；逻辑计时都用它而不是 get_ticks
+        self.input: Optional[Callable[[], Any]] = None  # 按键来源：None 时读键盘，环境/回放注入由动作生成的按键表
+        self.presses = 0  # 本帧处理过的按下类按键（ACTION_* 位）
+        # 录制/回放时固定时间步长，关闭帧预算调节与热更新，保证同样的输入得到同样的结果
+        self.deterministic = False
+        self.recorder: Optional[InputRecorder] = None
+        self.record_path = os.environ.get("PIXEL_RECORD")
+        self.checkpoint: Optional[Dict[str, Any]] = None
+        self.respawning = False
+        self.won = False
         self.running = True
-        self.current_level_path = os.path.join(LEVEL_ROOT, "level1.json")
-        self.level = self._load_or_default(self.current_level_path)
+        self.current_level_path = os.path.normpath(os.path.join(LEVEL_ROOT, "level1.json"))
+        self.level_mtime: Optional[int] = None
+        self.reload_check = 0.0
         self.projectiles: List[Projectile] = []
-
-    def _load_or_default(self, path: str) -> Level:
+        self.transition = LevelTransition()
+        # 第一个关卡在菜单显示期间准备：后台线程读取解析 JSON，主线程空闲时再构建
+        self.level: Optional[Level] = None
+        self.menu_shown = False
+        self.transition.preload(self.current_level_path)
+
+    def ensure_level(self, wait: bool = True) -> bool:
+        """构建预读的第一个关卡；wait=False 时若后台尚未读完则直接返回"""
+        if self.level is not None:
+            return True
+        ready, data = self.transition.take(self.current_level_path, wait)
+        if not ready:
+            return False
+        self.level = self._load_or_default(self.current_level_path, data)
+        self.enter_level()
+        StartupTrace.mark("构建关卡")
+        StartupTrace.report()
+        return True
+
+    def _load_or_default(self, path: str, data: Optional[Dict[str, Any]] = None) -> Level:
         self.current_level_path = path
-        if not os.path.isfile(path):
+        self.level_mtime = self._level_stamp()
+        if data is not None:
+            level = Level(data)
+        elif not os.path.isfile(path):
             # 构造一个默认关卡
             data = {
                 "name": "Default",
@@ -905,44 +2582,192 @@ class Game:
         if not level.player:
             p = Player(100, 100, {"health":100, "speed":240})
             level.entities.append(p)
+            level.dynamic.update(p)
             level.player = p
         return level
 
-    def load_level(self, path: Optional[str]):
+    def request_level(self, target: Optional[str]) -> bool:
+        """切换关卡的唯一入口（门等）：交给 LevelTransition，切换中的重复请求会被合并"""
+        return self.transition.request(resolve_level_path(target))
+
+    @traced("Game.load_level")
+    def load_level(self, path: Optional[str], data: Optional[Dict[str, Any]] = None):
         if not path:
             return
         try:
-            self.level = self._load_or_default(path)
+            self.level = self._load_or_default(path, data)
             self.projectiles.clear()
+            self.particles.clear()
+            self.enter_level()
             self.hud.set_message(f"进入 {self.level.name}")
         except Exception as e:
             self.hud.set_message(f"载入关卡失败: {e}")
 
+    def enter_level(self):
+        """进入关卡时的初始检查点，并预读各扇门通往的关卡（确定性运行时不预读）"""
+        self.respawning = False
+        self.won = False
+        self.level._los.clear()
+        self.save_checkpoint()
+        if self.deterministic:
+            return  # 无窗口批量运行会反复重置，不值得为每次重置起后台线程；切换时同步读取即可
+        for d in self.level.doors:
+            self.transition.preload(resolve_level_path(d.target))
+
+    def save_checkpoint(self):
+        self.checkpoint = self.level.snapshot()
+
+    def respawn(self):
+        """玩家死亡后从最近的检查点原地恢复，不重新读取关卡"""
+        self.respawning = False
+        if self.checkpoint is None:
+            self.load_level(self.current_level_path)
+            return
+        self.level.restore(self.checkpoint)
+        self.projectiles.clear()
+        self.particles.clear()
+        if self.level.player:
+            self.camera.update(self.level.player, self.level)
+
+    def _level_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.current_level_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check_hot_reload(self, dt: float):
+        """编辑器保存关卡后，把变化的 tile/实体增量应用到当前关卡，不重置玩家"""
+        if self.deterministic:
+            return
+        self.reload_check += dt
+        if self.reload_check < HOT_RELOAD_INTERVAL:
+            return
+        self.reload_check = 0.0
+        stamp = self._level_stamp()
+        if stamp is None or stamp == self.level_mtime:
+            return
+        try:
+            with open(self.current_level_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # 文件可能正在写入，下次再试
+        self.level_mtime = stamp
+        added, removed = self.level.apply_diff(data)
+        if added or removed:
+            self.hud.set_message(f"关卡已更新 +{added} -{removed}")
+
+    def reseed(self, seed: int):
+        """固定随机源、把游戏时钟归零并恢复最高画质档（在载入关卡之前调用：敌人构造时就会用到随机数；
+        确定性运行时不再调整画质，降档留下的 far_tick 等设置也会改变结果）"""
+        random.seed(seed)
+        self.particles.rng = np.random.default_rng(seed)
+        self.time = 0.0
+        self.frame = 0
+        self.governor.reset()
+        self.governor.apply(self)
+
+    def start_recording(self, path: str, seed: Optional[int] = None):
+        """从当前关卡重新开始并录制输入"""
+        if seed is None:
+            seed = int(time.time()) & 0x7fffffff
+        self.reseed(seed)
+        self.deterministic = True
+        self.load_level(self.current_level_path)
+        self.recorder = InputRecorder(path, os.path.basename(self.current_level_path), seed)
+        print(f"[record] 开始录制 {path}（种子 {seed}）")
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        path = self.recorder.save(self.state_hash())
+        print(f"[record] 已保存 {path}，{len(self.recorder.actions)} 帧")
+        self.recorder = None
+        self.deterministic = False
+
+    def apply_action(self, action: int):
+        """一帧的输入：按住类写进 ActionInput（键盘输入时由玩家自己读），按下类等同于处理 KEYDOWN 事件"""
+        if isinstance(self.input, ActionInput):
+            self.input.action = action
+        p = self.level.player if self.level else None
+        if not p:
+            return
+        if action & ACTION_JUMP:
+            p.on_jump_pressed()
+        if action & ACTION_SHOOT:
+            proj = p.on_shoot_pressed()
+            if proj:
+                self.spawn(proj)
+        if action & ACTION_INTERACT:
+            p.on_interact_pressed()
+
+    def state_hash(self) -> str:
+        """当前游戏状态的摘要：时钟、关卡、每个实体的类型/位置/快照字段、可破坏 tile 的耐久，用于核对回放结果"""
+        h = hashlib.sha1()
+        h.update(repr((self.frame, self.time, self.level.name if self.level else None)).encode())
+        for e in (self.level.entities if self.level else []):
+            fields = [getattr(e, f) for f in e.SNAPSHOT_FIELDS]
+            fields = [sorted(v.items()) if isinstance(v, dict) else v for v in fields]
+            h.update(repr((type(e).__name__, e.aabb.x, e.aabb.y, e.aabb.w, e.aabb.h, fields)).encode())
+        for b in (self.level.breakables.values() if self.level else []):
+            h.update(repr(b.hp).encode())
+        return h.hexdigest()[:16]
+
+    def pressed_keys(self):
+        """当前按住的键（支持 keys[pygame.K_a] 形式的查询）"""
+        return self.input() if self.input else pygame.key.get_pressed()
+
     def spawn(self, ent: Entity):
         self.level.entities.append(ent)
+        self.level.dynamic.update(ent)
 
     def run(self):
         while self.running:
             dt = self.clock.tick(FPS) / 1000.0
+            TRACER.begin_frame()
             self.handle_events()
             if self.menu.active:
+                self.stop_recording()  # 通关或手动回到菜单时结束录制
                 self.draw_menu()
+                # 菜单已经显示出来后，利用空闲帧把关卡准备好
+                self.ensure_level(wait=False)
                 continue
+            self.ensure_level()
+            if self.record_path:
+                self.start_recording(self.record_path)
+                self.record_path = None
             if self.menu.paused:
                 self.draw_pause()
                 continue
             if self.menu.describle:
                 self.draw_describle()
                 continue
+            if self.recorder:
+                dt = self.recorder.header["dt"]
+                self.recorder.frame(ActionInput.held_from_keyboard() | self.presses)
+            self.apply_action(self.presses)
+            self.presses = 0
+            work = time.perf_counter()
             self.update(dt)
             self.draw()
+            if self.governor.sample(time.perf_counter() - work) and not self.deterministic:
+                self.governor.apply(self)
+            dumped = TRACER.end_frame()
+            if dumped:
+                print(f"[trace] 帧耗时超过 {TRACE_SPIKE_MS:g}ms，已导出 {dumped}")
+        self.stop_recording()
         pygame.quit()
 
+    @traced("Game.handle_events")
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F9:
+                    dumped = TRACER.dump()
+                    self.hud.set_message(f"已导出 {os.path.basename(dumped)}" if dumped else "没有追踪数据（F10 开始记录）")
+                elif event.key == pygame.K_F10:
+                    self.hud.set_message("帧追踪：开" if TRACER.toggle() else "帧追踪：关")
                 if event.key == pygame.K_ESCAPE:
                     if self.menu.active:
                         self.running = False
@@ -956,6 +2781,7 @@ class Game:
                     elif event.key in (pygame.K_RETURN, pygame.K_SPACE):
                         if self.menu.sel == 0:
                             self.menu.active = False
+                            self.ensure_level()
 
                         elif self.menu.sel == 1:
                             import subprocess, sys
@@ -970,49 +2796,78 @@ class Game:
                         self.menu.describle = False
                 else:
                     # 游戏中：输入
-                    p = self.level.player
+                    p = self.level.player if self.level else None
                     if not p:
                         continue
-                    if event.key == pygame.K_SPACE:
-                        p.on_jump_pressed()
-                    if event.key == pygame.K_k:
-                        proj = p.on_shoot_pressed()
-                        if proj:
-                            self.spawn(proj)
+                    # 按下类按键在本帧 update 之前统一交给 apply_action（录制时一并记下）
+                    self.presses |= PRESS_KEYS.get(event.key, 0)
             elif event.type == pygame.VIDEORESIZE:
                 pass
 
+    @traced("Game.update")
     def update(self, dt: float):
+        if self.transition.busy:
+            # 切换关卡期间暂停世界
+            self.transition.update(self, dt)
+            self.hud.update(dt)
+            return
+        self.time += dt
         self.timer.update(dt)
-        self.level.build_spatial()  # 关卡静态物仍可动态重建以支撑可破坏地形（简单处理）
+        ANIM_CLOCK.tick(dt)
+        self.check_hot_reload(dt)
         # 更新实体
-        for e in list(self.level.entities):
-            e.update(dt, self)
+        dynamic = self.level.dynamic
+        self.frame += 1
+        near = None
+        if self.far_tick > 1:
+            cam = self.camera
+            near = AABB(cam.x - FAR_MARGIN, cam.y - FAR_MARGIN, SCREEN_W + FAR_MARGIN*2, SCREEN_H + FAR_MARGIN*2)
+        tracing = TRACER.enabled
+        for i, e in enumerate(list(self.level.entities)):
+            step = dt
+            if near is not None and not isinstance(e, (Player, Projectile)) and not e.aabb.intersects(near):
+                # 远处实体降频：跳过的帧把时间攒起来，轮到时一并结算
+                e.skipped_dt += dt
+                if (self.frame + i) % self.far_tick:
+                    continue
+                step = e.skipped_dt
+                e.skipped_dt = 0.0
+            elif e.skipped_dt:
+                step = dt + e.skipped_dt
+                e.skipped_dt = 0.0
+            # 攒下的时间拆成不超过 FAR_MAX_STEP 的等长小步，避免穿墙
+            substeps = math.ceil(step / FAR_MAX_STEP - 1e-9) if step > dt else 1
+            step /= substeps
+            if tracing:
+                start = time.perf_counter()
+            for _ in range(substeps):
+                e.update(step, self)
+                if e.remove_requested:
+                    break
+            if tracing:
+                TRACER.add(f"{type(e).__name__}.update", start)
             if e.remove_requested:
                 self.level.entities.remove(e)
+                dynamic.discard(e)
+            else:
+                dynamic.update(e)
         # 更新投射物
         for p in list(self.projectiles):
             p.update(dt, self)
             if p.remove_requested:
                 self.projectiles.remove(p)
+        self.particles.update(dt)
 
-        # 玩家是否进门
-        for d in self.level.doors:
-            if d.is_enter:
-                target = d.target
-                self.load_level(os.path.join(LEVEL_ROOT, target))
-            else:
-                target = "level1.json" #默认重新
-
-
-        # Boss死亡 -> 胜利
-        if self.level.boss and self.level.boss.remove_requested:
+        # Boss死亡 -> 胜利（只触发一次）
+        if self.level.boss and self.level.boss.remove_requested and not self.won:
+            self.won = True
             self.hud.set_message("胜利！")
             self.timer.add(2.0, lambda: self.menu.__setattr__("active", True))
-        # 玩家死亡 -> 失败/重来
-        if self.level.player and self.level.player.remove_requested:
+        # 玩家死亡 -> 失败/从检查点重来（只触发一次）
+        if self.level.player and self.level.player.remove_requested and not self.respawning:
+            self.respawning = True
             self.hud.set_message("你失败了")
-            self.timer.add(3.0, lambda: self.load_level(self.current_level_path))
+            self.timer.add(3.0, self.respawn)
 
 
         # 摄像机
@@ -1021,48 +2876,70 @@ class Game:
         # HUD
         self.hud.update(dt)
 
+    @traced("Game.draw_world")
     def draw_world(self, surf: pygame.Surface):
         # 先绘制背景(如果有)
         if self.level.background:
-            self.level.background.draw(surf, self.camera)
+            self.level.background.draw(surf, self.camera, self.parallax_layers)
         else:
             # 默认背景色
             surf.fill((20, 24, 28))
     
         cam = self.camera
-        # 绘制 tile
-        for t in self.level.tiles:
-            # 视野裁剪
-            if t.aabb.right < cam.x or t.aabb.left > cam.x+SCREEN_W or t.aabb.bottom < cam.y or t.aabb.top > cam.y+SCREEN_H:
+        # 绘制 tile：在紧凑存储上整体做视野裁剪，再批量提交
+        store = self.level.tiles
+        idx = store.visible(cam.x, cam.y, cam.x + SCREEN_W, cam.y + SCREEN_H)
+        if len(idx):
+            g = store.geom[idx]
+            xs = (g[:, 0] - cam.x).astype(int).tolist()
+            ys = (g[:, 1] - cam.y).astype(int).tolist()
+            images = store.images
+            batch = []
+            for iid, x, y in zip(store.image_ids[idx].tolist(), xs, ys):
+                img, anim = images[iid]
+                batch.append((anim.image if anim else img, (x, y)))
+            surf.blits(batch, doreturn=False)
+        # 实体：只取视野内的，按层和底边排序后批量提交
+        view = AABB(cam.x, cam.y, SCREEN_W, SCREEN_H)
+        visible = self.level.dynamic.query(view)
+        visible.extend(p for p in self.projectiles if p.aabb.intersects(view))
+        queue = []
+        for e in visible:
+            if e.remove_requested or not e.aabb.intersects(view):
                 continue
-            x = int(t.aabb.x - cam.x)
-            y = int(t.aabb.y - cam.y)
-            surf.blit(t.image, (x, y))
-            if t.kind == "water":
-                pygame.draw.rect(surf, BLUE, (x, y, t.aabb.w, 4))
-        # 绘制实体
-        for e in self.level.entities:
-            e.draw(surf, cam)
-        # 投射物
-        for p in self.projectiles:
-            p.draw(surf, cam)
+            img, pos = e.render(cam)
+            queue.append((e.layer, e.aabb.bottom, len(queue), e.shadow, img, pos))
+        queue.sort()
+        batch = []
+        for _, _, _, shadow, img, pos in queue:
+            if shadow:
+                batch.append((shadow, pos))
+            batch.append((img, pos))
+        surf.blits(batch, doreturn=False)
+        self.particles.draw(surf, cam)
 
     def draw(self):
         self.draw_world(self.screen)
         self.hud.draw(self.screen)
 
         # 文字
-        font = pygame.font.SysFont("SimHei", 15)
-        txt = font.render("A/D 移动,Space 跳跃,S 蹲下/潜行,k 发射火球,E 交互(告示牌/门),Esc 暂停菜单", True, WHITE)
+        txt = AssetLoader.font(15).render("A/D 移动,Space 跳跃,S 蹲下/潜行,k 发射火球,E 交互(告示牌/门),Esc 暂停菜单", True, WHITE)
         self.screen.blit(txt, (24,50))
+        self.transition.draw(self.screen)
 
+        start = time.perf_counter()
         pygame.display.flip()
+        if TRACER.enabled:
+            TRACER.add("display.flip", start)
 
 #GUI
     def draw_menu(self):
         self.screen.fill((30, 30, 40))
         self.menu.draw_centered(self.screen, "2D像素闯关游戏")
         pygame.display.flip()
+        if self.level is None and not self.menu_shown:
+            self.menu_shown = True
+            StartupTrace.mark("首帧菜单")
 
     def draw_pause(self):
         self.draw_world(self.screen)
@@ -1071,15 +2948,14 @@ class Game:
         overlay.fill((0, 0, 0, 140))
         self.screen.blit(overlay, (0, 0))
         # 文字
-        font = pygame.font.SysFont("SimHei", 36)
-        txt = font.render("暂停 - Esc返回", True, WHITE)
+        txt = AssetLoader.font(36).render("暂停 - Esc返回", True, WHITE)
         self.screen.blit(txt, (SCREEN_W//2 - txt.get_width()//2, SCREEN_H//2 - 20))
         pygame.display.flip()
 
     def draw_describle(self):
         self.screen.fill((0,0,0))
         #文字
-        font = pygame.font.SysFont("SimHei",30)
+        font = AssetLoader.font(30)
         lines = [
         '操作说明：',
         'A/D: 左右移动',
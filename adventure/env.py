@@ -0,0 +1,313 @@
+"""
+训练/评估机器人用的环境接口（gym 风格），无窗口运行，不受 60 FPS 限制。
+
+    from adventure.env import PlatformerEnv, VectorEnv, RIGHT, JUMP
+    env = PlatformerEnv("levels/level1.json")
+    obs, info = env.reset(seed=0)
+    obs, reward, terminated, truncated, info = env.step(RIGHT | JUMP)
+
+动作是按位组合的整数（0 ~ N_ACTIONS-1）：LEFT/RIGHT/CROUCH 表示这一步按住，
+JUMP/SHOOT/INTERACT 表示这一步按下一次（对应游戏里的按键事件）。
+
+观测是长度 OBS_SIZE 的 float32 向量：
+- 玩家 8 项：x/关卡宽、y/关卡高、vx、vy（/1000）、血量比例、是否着地、是否在水中、朝向；
+- 最近的 OBS_ENEMIES 个敌人各 5 项：相对位置 dx、dy、vx、vy（/1000）、血量比例，不足的补 0；
+- Boss 4 项：是否存在、dx、dy、血量比例；最近的门 3 项：是否存在、dx、dy。
+frame_size=(宽, 高) 时另外返回缩小后的画面 (高, 宽, 3) uint8（surfarray），放在 info["frame"]。
+
+奖励：向右前进每 100 像素 +1，掉血每点 -0.05；进门或击败 Boss +10 并结束，死亡 -10 并结束。
+
+VectorEnv 把 n 个环境分给若干工作进程同时步进，观测（和画面）直接写在共享内存里，
+结束的环境自动重置（结束时的观测放在 info["final_observation"]）。
+
+测吞吐（在项目根目录）: python -m adventure.env levels/level1.json --steps 5000 --envs 4
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from adventure import Adventure as A
+
+# 与录像文件相同的动作编码
+LEFT = A.ACTION_LEFT
+RIGHT = A.ACTION_RIGHT
+JUMP = A.ACTION_JUMP
+SHOOT = A.ACTION_SHOOT
+CROUCH = A.ACTION_CROUCH
+INTERACT = A.ACTION_INTERACT
+N_ACTIONS = 64
+
+OBS_ENEMIES = 8
+OBS_SIZE = 8 + OBS_ENEMIES * 5 + 4 + 3
+DT = 1.0 / A.FPS
+
+
+def observe(game: "A.Game", out: Optional[np.ndarray] = None) -> np.ndarray:
+    obs = np.zeros(OBS_SIZE, dtype=np.float32) if out is None else out
+    obs[:] = 0.0
+    level = game.level
+    p = level.player
+    if p is None:
+        return obs
+    px, py = p.aabb.centerx, p.aabb.centery
+    obs[0:8] = (p.aabb.x / max(1, level.world_w), p.aabb.y / max(1, level.world_h), p.vx / 1000, p.vy / 1000,
+                p.health / max(1, p.max_health), p.on_ground, p.in_water, p.facing)
+    enemies = [e for e in level.entities if isinstance(e, A.Enemy) and not e.remove_requested]
+    enemies.sort(key=lambda e: (e.aabb.centerx - px) ** 2 + (e.aabb.centery - py) ** 2)
+    for i, e in enumerate(enemies[:OBS_ENEMIES]):
+        o = 8 + i * 5
+        obs[o:o + 5] = ((e.aabb.centerx - px) / 1000, (e.aabb.centery - py) / 1000, e.vx / 1000, e.vy / 1000,
+                        e.health / max(1, e.max_health))
+    o = 8 + OBS_ENEMIES * 5
+    boss = level.boss
+    if boss and not boss.remove_requested:
+        obs[o:o + 4] = (1.0, (boss.aabb.centerx - px) / 1000, (boss.aabb.centery - py) / 1000, boss.health / max(1, boss.max_health))
+    if level.doors:
+        d = min(level.doors, key=lambda d: abs(d.aabb.centerx - px) + abs(d.aabb.centery - py))
+        obs[o + 4:o + 7] = (1.0, (d.aabb.centerx - px) / 1000, (d.aabb.centery - py) / 1000)
+    return obs
+
+
+class PlatformerEnv:
+    def __init__(self, level: str = "levels/level1.json", frame_size: Optional[Tuple[int, int]] = None,
+                 frame_skip: int = 1, max_steps: int = 3000):
+        self.level_path = A.resolve_level_path(level)
+        self.frame_size = frame_size
+        self.frame_in_info = True
+        self.frame_skip = max(1, frame_skip)
+        self.max_steps = max_steps
+        self.game: Optional[A.Game] = None
+        self.keys = A.ActionInput()
+        self.steps = 0
+        self.last_x = 0.0
+        self.last_health = 0
+
+    def reset(self, seed: Optional[int] = None, level: Optional[str] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        if self.game is None:
+            self.game = A.Game()
+            self.game.menu.active = False
+            self.game.input = self.keys
+        game = self.game
+        if level is not None:
+            self.level_path = A.resolve_level_path(level)
+        if seed is not None:
+            game.reseed(seed)
+        else:
+            game.time = 0.0
+            game.frame = 0
+        game.deterministic = True
+        game.transition.cancel()
+        game.timer.events.clear()
+        game.load_level(self.level_path)
+        self.keys.action = 0
+        self.steps = 0
+        p = game.level.player
+        self.last_x = p.aabb.x
+        self.last_health = p.health
+        return observe(game), self._info()
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
+        game = self.game
+        level = game.level
+        game.apply_action(int(action))
+        for _ in range(self.frame_skip):
+            game.update(DT)
+            if game.level is not level or game.transition.busy or game.won or game.respawning:
+                break
+        self.steps += 1
+        p = level.player
+        reward = (p.aabb.x - self.last_x) / 100 - max(0, self.last_health - p.health) * 0.05
+        self.last_x, self.last_health = p.aabb.x, p.health
+        terminated = False
+        if game.won or game.transition.busy or game.level is not level:
+            reward += 10.0
+            terminated = True
+        elif game.respawning or p.remove_requested:
+            reward -= 10.0
+            terminated = True
+        truncated = not terminated and self.steps >= self.max_steps
+        return observe(game), reward, terminated, truncated, self._info()
+
+    def render(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """当前画面缩小到 frame_size，(高, 宽, 3) uint8"""
+        game = self.game
+        game.draw_world(game.screen)
+        small = pygame.transform.smoothscale(game.screen, self.frame_size)
+        frame = pygame.surfarray.pixels3d(small).transpose(1, 0, 2)
+        if out is None:
+            return frame.copy()
+        out[...] = frame
+        return out
+
+    def _info(self) -> Dict[str, Any]:
+        info = {"steps": self.steps, "level": os.path.basename(self.game.current_level_path)}
+        if self.frame_size and self.frame_in_info:
+            info["frame"] = self.render()
+        return info
+
+
+# ------------------------------------------------------------
+# 多进程批量环境
+def _worker(conn, indices: List[int], obs_name: str, frame_name: Optional[str], n: int, config: Dict[str, Any]):
+    obs_shm = shared_memory.SharedMemory(name=obs_name)
+    obs = np.ndarray((n, OBS_SIZE), dtype=np.float32, buffer=obs_shm.buf)
+    frame_shm = frames = None
+    if frame_name:
+        w, h = config["frame_size"]
+        frame_shm = shared_memory.SharedMemory(name=frame_name)
+        frames = np.ndarray((n, h, w, 3), dtype=np.uint8, buffer=frame_shm.buf)
+    envs = [PlatformerEnv(config["level"], config["frame_size"], config["frame_skip"], config["max_steps"]) for _ in indices]
+    for env in envs:
+        env.frame_in_info = False  # 画面由共享内存返回
+
+    def write(env, i, o):
+        obs[i] = o
+        if frames is not None:
+            env.render(frames[i])
+
+    try:
+        while True:
+            cmd, payload = conn.recv()
+            if cmd == "reset":
+                for env, i in zip(envs, indices):
+                    o, _ = env.reset(seed=None if payload is None else payload + i)
+                    write(env, i, o)
+                conn.send(None)
+            elif cmd == "step":
+                results = []
+                for env, i in zip(envs, indices):
+                    o, r, term, trunc, info = env.step(int(payload[i]))
+                    info = {"steps": info["steps"], "level": info["level"]}
+                    if term or trunc:
+                        info["final_observation"] = o
+                        o, _ = env.reset()
+                    write(env, i, o)
+                    results.append((r, term, trunc, info))
+                conn.send(results)
+            elif cmd == "close":
+                break
+    finally:
+        del obs, frames
+        obs_shm.close()
+        if frame_shm:
+            frame_shm.close()
+        conn.close()
+
+
+class VectorEnv:
+    """n 个 PlatformerEnv 分给 workers 个进程同时步进；obs / frames 是共享内存上的数组，下一次 step 会覆盖"""
+
+    def __init__(self, n: int, level: str = "levels/level1.json", workers: Optional[int] = None,
+                 frame_size: Optional[Tuple[int, int]] = None, frame_skip: int = 1, max_steps: int = 3000,
+                 context: Optional[str] = None):
+        self.n = n
+        workers = max(1, min(n, workers or os.cpu_count() or 1))
+        self._obs_shm = shared_memory.SharedMemory(create=True, size=n * OBS_SIZE * 4)
+        self.obs = np.ndarray((n, OBS_SIZE), dtype=np.float32, buffer=self._obs_shm.buf)
+        self._frame_shm = None
+        self.frames = None
+        if frame_size:
+            w, h = frame_size
+            self._frame_shm = shared_memory.SharedMemory(create=True, size=n * h * w * 3)
+            self.frames = np.ndarray((n, h, w, 3), dtype=np.uint8, buffer=self._frame_shm.buf)
+        config = {"level": level, "frame_size": frame_size, "frame_skip": frame_skip, "max_steps": max_steps}
+        ctx = mp.get_context(context)
+        self._conns = []
+        self._procs = []
+        for chunk in np.array_split(np.arange(n), workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, daemon=True,
+                               args=(child, chunk.tolist(), self._obs_shm.name,
+                                     self._frame_shm.name if self._frame_shm else None, n, config))
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        """重置全部环境；seed 给定时第 i 个环境用 seed + i"""
+        for conn in self._conns:
+            conn.send(("reset", seed))
+        for conn in self._conns:
+            conn.recv()
+        return self.obs
+
+    def step(self, actions: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        actions = np.asarray(actions, dtype=np.int64)
+        for conn in self._conns:
+            conn.send(("step", actions))
+        results = []
+        for conn in self._conns:
+            results.extend(conn.recv())
+        rewards = np.array([r[0] for r in results], dtype=np.float32)
+        terminated = np.array([r[1] for r in results], dtype=bool)
+        truncated = np.array([r[2] for r in results], dtype=bool)
+        return self.obs, rewards, terminated, truncated, [r[3] for r in results]
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("close", None))
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._conns = []
+        self._procs = []
+        self.obs = self.frames = None
+        for shm in (self._obs_shm, self._frame_shm):
+            if shm:
+                shm.close()
+                shm.unlink()
+        self._obs_shm = self._frame_shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def bench(level: str, steps: int, envs: int, workers: Optional[int], frame_size: Optional[Tuple[int, int]]):
+    """随机动作跑 steps 步，报告每秒步数"""
+    rng = np.random.default_rng(0)
+    if envs <= 1:
+        env = PlatformerEnv(level, frame_size)
+        env.reset(seed=0)
+        t = time.perf_counter()
+        for _ in range(steps):
+            _, _, term, trunc, _ = env.step(int(rng.integers(N_ACTIONS)))
+            if term or trunc:
+                env.reset()
+        dt = time.perf_counter() - t
+    else:
+        with VectorEnv(envs, level, workers, frame_size) as venv:
+            venv.reset(seed=0)
+            t = time.perf_counter()
+            for _ in range(max(1, steps // envs)):
+                venv.step(rng.integers(N_ACTIONS, size=envs))
+            dt = time.perf_counter() - t
+            steps = max(1, steps // envs) * envs
+    print(f"{steps} 步, {envs} 个环境: {steps / dt:.0f} 步/秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="环境吞吐测试")
+    parser.add_argument("level", nargs="?", default="levels/level1.json")
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--envs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--frame", type=int, nargs=2, metavar=("W", "H"), default=None, help="同时输出缩小的画面")
+    args = parser.parse_args()
+    sys.path.insert(0, os.getcwd())
+    bench(args.level, args.steps, args.envs, args.workers, tuple(args.frame) if args.frame else None)
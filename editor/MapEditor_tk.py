@@ -1,4 +1,10 @@
 import json
+import os
+import struct
+import zlib
+import hashlib
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 from PIL import Image, ImageDraw,ImageTk, ImageOps
@@ -10,9 +16,550 @@ DEFAULT_MAP = {
     "tiles": []
 }
 
+IMAGE_TYPES = ("no_collide_image", "collide_image", "water", "breakable")
+VIEW_MARGIN = 256   #可视区域外额外保留的像素边距（滚动时减少创建/回收次数）
+GRID_COLOR = (51, 51, 51, 255)   #网格线颜色 '#333'
+TILE_TYPES = ("solid",) + IMAGE_TYPES
+
+#自动保存：定时把新操作追加到侧车日志，累积到一定数量后在后台压缩为快照
+AUTOSAVE_MS = 3000
+COMPACT_EVERY = 200
+UNTITLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "levels", "untitled.json")
+
+#图块面板：扫描 assets/ 下的 PNG，缩略图缓存在磁盘上(按路径、修改时间、文件大小、尺寸区分)
+PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+ASSET_ROOT = os.path.join(PROJECT_ROOT, "assets")
+THUMB_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".thumbcache")
+PALETTE_COLS = 4
+
 def snap(v, cell):
     return (v // cell) * cell
 
+def tile_bbox(t, cell):
+    """返回 tile/实体 在画布上的包围盒 (x1, y1, x2, y2)"""
+    if t['type'] in IMAGE_TYPES or t['type'] == 'solid':
+        return (t['x'], t['y'], t['x'] + t.get('w', cell), t['y'] + t.get('h', cell))
+    r = max(4, cell // 3)
+    return (t['x'] - r, t['y'] - r, t['x'] + r, t['y'] + r)
+
+def make_grid_pattern(w, h, cell):
+    """用单格图案平铺出网格图像，替代逐条创建的网格线"""
+    pattern = Image.new("RGBA", (cell, cell), (0, 0, 0, 0))
+    d = ImageDraw.Draw(pattern)
+    d.line([(0, 0), (cell - 1, 0)], fill=GRID_COLOR)
+    d.line([(0, 0), (0, cell - 1)], fill=GRID_COLOR)
+    img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    for x in range(0, w, cell):
+        for y in range(0, h, cell):
+            img.paste(pattern, (x, y))
+    return img
+
+
+
+def cell_key(t):
+    """占用表的键：同一类型的图像 tile 每个格子只允许一个"""
+    return (t['type'], t['x'], t['y'])
+
+def tile_identity(t):
+    """完全相同的图像 tile 的键：同一格子叠放的不同图像/尺寸是有意的分层，不算重复"""
+    return (t['type'], t['x'], t['y'], t.get('w'), t.get('h'), t.get('path'))
+
+def dedupe_tiles(tiles):
+    """去掉完全重复的图像 tile(类型、位置、尺寸、图像都相同)，保留最后放置的那个"""
+    last = {}
+    for i, t in enumerate(tiles):
+        if t['type'] in IMAGE_TYPES:
+            last[tile_identity(t)] = i
+    return [t for i, t in enumerate(tiles) if t['type'] not in IMAGE_TYPES or last[tile_identity(t)] == i]
+
+def expand_tiles(tiles):
+    """把压缩存储的矩形区域(带 cell 字段)展开为逐格 tile，便于逐格编辑"""
+    out = []
+    for t in tiles:
+        cell = t.get('cell')
+        if t['type'] not in IMAGE_TYPES or not cell:
+            out.append(t)
+            continue
+        for y in range(int(t['y']), int(t['y'] + t['h']), int(cell)):
+            for x in range(int(t['x']), int(t['x'] + t['w']), int(cell)):
+                one = {k: v for k, v in t.items() if k != 'cell'}
+                one.update(x=float(x), y=float(y), w=float(cell), h=float(cell))
+                out.append(one)
+    return out
+
+def compact_tiles(tiles):
+    """把相邻的同类型同图像方格合并为矩形区域 {…, "w": n*cell, "h": m*cell, "cell": cell}。
+
+    先按行取最长连续段，再向下合并宽度相同的段；各组按首次出现的顺序输出以保持绘制层次。
+    叠放了多个图像的格子不参与合并，按原顺序逐个输出，保持上下层关系。
+    """
+    stacked = Counter((t['x'], t['y']) for t in tiles if t['type'] in IMAGE_TYPES)
+    groups = {}
+    out = []
+    for t in tiles:
+        if t['type'] in IMAGE_TYPES and t.get('w') == t.get('h') and set(t) <= {'type', 'x', 'y', 'w', 'h', 'path'} \
+                and stacked[(t['x'], t['y'])] == 1:
+            key = (t['type'], t.get('path'), t['w'])
+            if key not in groups:
+                groups[key] = {}
+                out.append(key)
+            groups[key][(t['x'], t['y'])] = t
+        else:
+            out.append(t)
+    result = []
+    for item in out:
+        if not isinstance(item, tuple):
+            result.append(item)
+            continue
+        kind, path, cell = item
+        cells = groups[item]
+        used = set()
+        for (x, y) in sorted(cells, key=lambda p: (p[1], p[0])):
+            if (x, y) in used:
+                continue
+            n = 1
+            while (x + n * cell, y) in cells and (x + n * cell, y) not in used:
+                n += 1
+            m = 1
+            while all((x + i * cell, y + m * cell) in cells and (x + i * cell, y + m * cell) not in used for i in range(n)):
+                m += 1
+            for j in range(m):
+                for i in range(n):
+                    used.add((x + i * cell, y + j * cell))
+            rect = {"type": kind, "x": x, "y": y, "w": n * cell, "h": m * cell, "path": path}
+            if n > 1 or m > 1:
+                rect["cell"] = cell
+            result.append(rect)
+    return result
+
+def line_cells(x1, y1, x2, y2, cell):
+    """Bresenham 直线经过的格子(左上角坐标)"""
+    cx, cy = int(x1 // cell), int(y1 // cell)
+    ex, ey = int(x2 // cell), int(y2 // cell)
+    dx, dy = abs(ex - cx), -abs(ey - cy)
+    sx, sy = (1 if ex > cx else -1), (1 if ey > cy else -1)
+    err = dx + dy
+    cells = []
+    while True:
+        cells.append((float(cx * cell), float(cy * cell)))
+        if cx == ex and cy == ey:
+            return cells
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            cx += sx
+        if e2 <= dx:
+            err += dx
+            cy += sy
+
+def resolve_asset(path):
+    """关卡中的图像路径相对项目根目录；从其他目录启动编辑器时也能找到文件"""
+    if os.path.isabs(path) or os.path.exists(path):
+        return path
+    return os.path.join(PROJECT_ROOT, path)
+
+def scan_assets(root=ASSET_ROOT):
+    """返回 assets/ 下所有 PNG 的相对路径(与关卡 JSON 中的写法一致)"""
+    found = []
+    for dirpath, _, files in os.walk(root):
+        for f in files:
+            if f.lower().endswith(".png"):
+                found.append(os.path.relpath(os.path.join(dirpath, f), PROJECT_ROOT).replace(os.sep, "/"))
+    return sorted(found)
+
+def make_thumbnail(src, size, cache_file):
+    img = Image.open(src)
+    img = img.convert("RGBA")  # 确保是 RGBA 模式
+    img.thumbnail((size, size))  # 调整大小以适应网格
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    img.save(cache_file + ".tmp", format="PNG")
+    os.replace(cache_file + ".tmp", cache_file)
+    return img
+
+
+class ThumbnailCache:
+    """缩略图缓存：内存 -> 磁盘缓存 -> 线程池解码。
+
+    磁盘缓存的文件名由 (绝对路径, 修改时间, 文件大小, 尺寸) 哈希得到，源图像变化后自动失效。
+    未命中的图像提交到线程池解码，完成结果由 UI 线程通过 poll() 取回。
+    """
+    def __init__(self, cache_dir, workers=None):
+        self.cache_dir = cache_dir
+        self.memory: dict[tuple, Image.Image] = {}
+        self.pending: dict[tuple, object] = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 2))
+
+    def cache_file(self, path, size):
+        src = resolve_asset(path)
+        st = os.stat(src)
+        key = f"{os.path.abspath(src)}|{st.st_mtime_ns}|{st.st_size}|{size}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+    def lookup(self, path, size):
+        """命中内存或磁盘缓存时返回 PIL 图像，否则返回 None"""
+        img = self.memory.get((path, size))
+        if img is not None:
+            return img
+        try:
+            cache_file = self.cache_file(path, size)
+            if os.path.isfile(cache_file):
+                img = Image.open(cache_file)
+                img.load()
+                self.memory[(path, size)] = img
+                return img
+        except OSError:
+            pass
+        return None
+
+    def request(self, path, size):
+        key = (path, size)
+        if key in self.pending:
+            return
+        try:
+            cache_file = self.cache_file(path, size)
+        except OSError as e:
+            self.pending[key] = self.pool.submit(_raise, e)
+            return
+        self.pending[key] = self.pool.submit(make_thumbnail, resolve_asset(path), size, cache_file)
+
+    def poll(self):
+        """取回已完成的解码任务: [(path, size, 图像或异常)]"""
+        done = []
+        for key, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[key]
+                if future.exception():
+                    done.append((key[0], key[1], future.exception()))
+                else:
+                    self.memory[key] = future.result()
+                    done.append((key[0], key[1], future.result()))
+        return done
+
+def _raise(e):
+    raise e
+
+#PNG 流式导出：按水平条带在子进程中合成真实图块并压缩，主进程按顺序写盘
+EXPORT_BG = (34, 34, 34)
+EXPORT_SOLID = (119, 119, 119)
+EXPORT_ENTITY_COLORS = {'enemy': (217, 83, 79), 'item': (91, 192, 222), 'door': (240, 173, 78), 'boss': (92, 184, 92),
+                        'checkpoint': (155, 89, 182)}
+STRIP_PIXELS = 1 << 22   #每个条带约 4M 像素
+
+_strip_images: dict[tuple, object] = {}   #子进程内的缩放图块缓存
+
+def _strip_image(path, w, h):
+    key = (path, w, h)
+    if key not in _strip_images:
+        try:
+            _strip_images[key] = Image.open(resolve_asset(path)).convert("RGBA").resize((w, h), Image.LANCZOS)
+        except (OSError, ValueError):
+            _strip_images[key] = None
+    return _strip_images[key]
+
+def image_cells(t):
+    """图像 tile 逐格的 (x, y, w, h)：压缩存储的矩形按 cell 切开(与游戏一样逐格重复贴图，而不是整块拉伸)"""
+    cell = t.get('cell')
+    if not cell:
+        return [(t['x'], t['y'], t['w'], t['h'])]
+    return [(float(x), float(y), float(cell), float(cell))
+            for y in range(int(t['y']), int(t['y'] + t['h']), int(cell))
+            for x in range(int(t['x']), int(t['x'] + t['w']), int(cell))]
+
+def render_strip(job):
+    """在子进程中渲染一个条带，返回 (raw deflate 数据, adler32, 未压缩长度)。
+
+    每个条带单独以 Z_SYNC_FLUSH 结束压缩，主进程把各段直接拼接成同一个 zlib 流。
+    """
+    y0, y1, width, scale, cell, tiles = job
+    img = Image.new("RGB", (width, y1 - y0), EXPORT_BG)
+    draw = ImageDraw.Draw(img)
+    r = max(4, cell // 3) * scale
+    for t in tiles:
+        x1, ty1 = round(t['x'] * scale), round(t['y'] * scale) - y0
+        if t['type'] in IMAGE_TYPES:
+            for cx, cy, cw, ch in image_cells(t):
+                x1, ty1 = round(cx * scale), round(cy * scale) - y0
+                x2, ty2 = round((cx + cw) * scale), round((cy + ch) * scale) - y0
+                if ty2 <= 0 or ty1 >= y1 - y0:
+                    continue
+                tile_img = _strip_image(t.get('path'), max(1, x2 - x1), max(1, ty2 - ty1))
+                if tile_img is None:
+                    draw.rectangle([x1, ty1, x2 - 1, ty2 - 1], fill=EXPORT_SOLID)
+                else:
+                    img.paste(tile_img, (x1, ty1), tile_img)
+        elif t['type'] == "solid":
+            x2, ty2 = round((t['x'] + t['w']) * scale), round((t['y'] + t['h']) * scale) - y0
+            draw.rectangle([x1, ty1, x2, ty2], fill=EXPORT_SOLID)
+        else:
+            draw.ellipse([x1 - r, ty1 - r, x1 + r, ty1 + r], fill=EXPORT_ENTITY_COLORS.get(t['type'], (255, 255, 255)))
+    raw = img.tobytes()
+    stride = width * 3
+    #每行前加滤波类型字节 0(None)
+    rows = b"".join(b"\x00" + raw[i:i + stride] for i in range(0, len(raw), stride))
+    comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+    data = comp.compress(rows) + comp.flush(zlib.Z_SYNC_FLUSH)
+    return data, zlib.adler32(rows), len(rows)
+
+def adler32_combine(adler1, adler2, len2):
+    """合并两段数据的 adler32(与 zlib 的 adler32_combine 相同)"""
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % base
+    sum1 += (adler2 & 0xffff) + base - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - rem
+    if sum1 >= base:
+        sum1 -= base
+    if sum1 >= base:
+        sum1 -= base
+    if sum2 >= (base << 1):
+        sum2 -= (base << 1)
+    if sum2 >= base:
+        sum2 -= base
+    return sum1 | (sum2 << 16)
+
+class PNGStreamWriter:
+    """按顺序写入预先压缩好的条带，整张图像从不完整地驻留在内存中"""
+    def __init__(self, path, width, height):
+        self.fp = open(path, "wb")
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        self._chunk(b"IDAT", b"\x78\x9c")   #zlib 头
+        self.adler = 1
+
+    def _chunk(self, tag, data):
+        self.fp.write(struct.pack(">I", len(data)) + tag + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    def write_strip(self, data, adler, length):
+        self._chunk(b"IDAT", data)
+        self.adler = adler32_combine(self.adler, adler, length)
+
+    def close(self):
+        tail = zlib.compressobj(6, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)   #空的结束块
+        self._chunk(b"IDAT", tail + struct.pack(">I", self.adler))
+        self._chunk(b"IEND", b"")
+        self.fp.close()
+
+def export_png_stream(path, tiles, width, height, scale=1.0, cell=32, workers=None):
+    """按条带并行渲染地图并流式写入 PNG；同时在途的条带数量有上限，内存占用与地图大小无关"""
+    out_w, out_h = max(1, round(width * scale)), max(1, round(height * scale))
+    strip_h = max(16, STRIP_PIXELS // out_w)
+    r = max(4, cell // 3) * scale
+    strips = [(y, min(out_h, y + strip_h)) for y in range(0, out_h, strip_h)]
+    buckets = [[] for _ in strips]
+    for t in tiles:
+        if t['type'] in TILE_TYPES:
+            top, bottom = t['y'] * scale, (t['y'] + t['h']) * scale
+        else:
+            top, bottom = t['y'] * scale - r, t['y'] * scale + r
+        for i in range(max(0, int(top // strip_h)), min(len(strips) - 1, int(bottom // strip_h)) + 1):
+            buckets[i].append(t)
+    writer = PNGStreamWriter(path, out_w, out_h)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = 2 * (workers or os.cpu_count() or 2)
+            futures = deque()
+            for (y0, y1), bucket in zip(strips, buckets):
+                futures.append(pool.submit(render_strip, (y0, y1, out_w, scale, cell, bucket)))
+                if len(futures) >= window:
+                    writer.write_strip(*futures.popleft().result())
+            while futures:
+                writer.write_strip(*futures.popleft().result())
+    finally:
+        writer.close()
+    return out_w, out_h
+
+def clean_tile(t):
+    """去掉编辑器内部使用的 '_' 前缀字段，得到可序列化的 tile 副本"""
+    return {k: v for k, v in t.items() if not k.startswith('_')}
+
+def invert_op(op):
+    """返回撤销该操作所需执行的逆操作"""
+    kind = op['op']
+    if kind == 'add':
+        return {"op": "remove", "tiles": op['tiles']}
+    if kind == 'remove':
+        return {"op": "add", "tiles": op['tiles']}
+    if kind == 'edit':
+        return {"op": "edit", "tile": op.get('tile'), "before": op['after'], "after": op['before']}
+    if kind == 'settings':
+        return {"op": "settings", "before": op['after'], "after": op['before']}
+    return {"op": "batch", "ops": [invert_op(o) for o in reversed(op['ops'])]}
+
+def encode_op(op):
+    """把引用地图 tile 的操作转换为只含 tile 内容的可写入日志的形式"""
+    kind = op['op']
+    if kind in ('add', 'remove'):
+        return {"op": kind, "tiles": [clean_tile(t) for t in op['tiles']]}
+    if kind == 'edit':
+        return {"op": kind, "before": op['before'], "after": op['after']}
+    if kind == 'settings':
+        return dict(op)
+    return {"op": kind, "ops": [encode_op(o) for o in op['ops']]}
+
+def write_json_atomic(path, data, **kw):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False, **kw)
+    os.replace(tmp, path)
+
+def append_lines(path, lines):
+    with open(path, "a", encoding="utf-8") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+def remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def write_snapshot(snapshot_path, journal_path, data, seq, export_path=None):
+    """写入快照(可选同时导出地图文件)，快照已包含的日志随之丢弃"""
+    if export_path:
+        write_json_atomic(export_path, data, indent=2)
+    write_json_atomic(snapshot_path, {"seq": seq, "map": data}, separators=(",", ":"))
+    remove_files(journal_path)
+
+def read_autosave(snapshot_path, journal_path):
+    """读取快照与其之后的日志操作，返回 (快照地图或None, 操作列表, 最大序号)"""
+    snap_map, seq = None, 0
+    if os.path.isfile(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as fp:
+            snapshot = json.load(fp)
+        snap_map, seq = snapshot['map'], snapshot['seq']
+    ops = []
+    if os.path.isfile(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break   #崩溃时写了一半的最后一行
+                if rec['seq'] > seq:
+                    ops.append(rec)
+    last = max([seq] + [rec['seq'] for rec in ops])
+    return snap_map, ops, last
+
+
+class Journal:
+    """编辑操作日志。
+
+    维护无限撤销/重做栈；每次执行、撤销、重做都按执行顺序编号并编码为一行 JSON，
+    由自动保存定时追加到 <地图>.journal，并定期压缩为 <地图>.autosave 快照。
+    """
+    def __init__(self, base):
+        self.undo: list = []
+        self.redo: list = []
+        self.pending: list[str] = []
+        self.seq = 0
+        self.since_snapshot = 0
+        self.set_base(base)
+
+    def set_base(self, base):
+        self.base = base
+        self.journal_path = base + ".journal"
+        self.snapshot_path = base + ".autosave"  # 不以 .json 结尾，免得被当成关卡
+
+    def reset(self, seq=0):
+        self.undo.clear()
+        self.redo.clear()
+        self.pending.clear()
+        self.seq = seq
+        self.since_snapshot = 0
+
+    def _log(self, op):
+        self.seq += 1
+        self.since_snapshot += 1
+        rec = {"seq": self.seq}
+        rec.update(encode_op(op))
+        self.pending.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+
+    def push(self, op):
+        self.undo.append(op)
+        self.redo.clear()
+        self._log(op)
+
+    def pop_undo(self):
+        op = invert_op(self.undo.pop())
+        self.redo.append(op)
+        self._log(op)
+        return op
+
+    def pop_redo(self):
+        op = invert_op(self.redo.pop())
+        self.undo.append(op)
+        self._log(op)
+        return op
+
+    def take_pending(self):
+        lines, self.pending = self.pending, []
+        return lines
+
+
+class TileIndex:
+    """格子 -> tile 记录 的哈希索引。
+
+    放置/移动/删除时增量维护，点击命中、框选与可视区域查询都只访问相关格子，
+    无需逐个向画布查询坐标。
+    """
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.buckets: dict[tuple, list] = {}
+        self.records: dict[int, tuple] = {}   # id(tile) -> (bbox, 放置序号, tile)
+        self.counter = 0
+
+    def _cells(self, bbox):
+        c = self.cell
+        for gx in range(int(bbox[0] // c), int(bbox[2] // c) + 1):
+            for gy in range(int(bbox[1] // c), int(bbox[3] // c) + 1):
+                yield (gx, gy)
+
+    def insert(self, t, bbox):
+        self.counter += 1
+        self.records[id(t)] = (bbox, self.counter, t)
+        for key in self._cells(bbox):
+            self.buckets.setdefault(key, []).append(t)
+
+    def remove(self, t):
+        rec = self.records.pop(id(t), None)
+        if not rec:
+            return
+        for key in self._cells(rec[0]):
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket[:] = [o for o in bucket if o is not t]
+                if not bucket:
+                    del self.buckets[key]
+
+    def move(self, t, bbox):
+        self.remove(t)
+        self.insert(t, bbox)
+
+    def clear(self):
+        self.buckets.clear()
+        self.records.clear()
+
+    def hit(self, x, y):
+        """返回包含点 (x, y) 的最上层(最后放置的) tile"""
+        best = None
+        for t in self.buckets.get((int(x // self.cell), int(y // self.cell)), ()):
+            bbox, order, _ = self.records[id(t)]
+            if bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]:
+                if best is None or order > best[0]:
+                    best = (order, t)
+        return best[1] if best else None
+
+    def query(self, x1, y1, x2, y2):
+        """返回与矩形相交的所有 tile，按放置顺序排列"""
+        found = {}
+        for key in self._cells((x1, y1, x2, y2)):
+            for t in self.buckets.get(key, ()):
+                if id(t) in found:
+                    continue
+                bbox, order, _ = self.records[id(t)]
+                if not (bbox[2] < x1 or bbox[0] > x2 or bbox[3] < y1 or bbox[1] > y2):
+                    found[id(t)] = (order, t)
+        return [t for _, t in sorted(found.values(), key=lambda r: r[0])]
 
 
 class PropertyDialog(simpledialog.Dialog):
@@ -60,22 +607,152 @@ class LevelEditor(tk.Tk):
         self.is_drawing = False
         self.drag_start = None
         self.preview_rect = None
-        self.selected_item = None
+        self.selected: list[dict] = []   #当前选中的 tile(点击或框选)
+        self.select_start = None
+        self.select_rect = None
+        self.index = TileIndex()
+        self.occupancy: dict[tuple, dict] = {}   #(类型, x, y) -> 图像 tile，防止重叠放置
+        self.occupant_keys: dict[int, tuple] = {}
+        self.fill_mode = tk.StringVar(value="point")
         self.n = 0   #路径列表 图像选取计数
 
         self.selected_image = ""
         self.selected_image_preview_default_obj = ImageTk.PhotoImage(Image.new("RGB", (self.grid_cell, self.grid_cell), color=(100, 100, 100)))
         self.selected_image_preview_obj = self.selected_image_preview_default_obj
+
+        #画布虚拟化：只为可视区域(+边距)内的 tile 创建画布对象，滚动时回收复用
+        self.tile_items: dict[int, int] = {}     # id(tile) -> 画布对象id
+        self.item_pool: dict[str, list] = {"image": [], "rectangle": [], "oval": []}
+        self.view_region = None
+        self.grid_item = None
+        self.grid_photo = None
+        self.grid_size = None
+        self._refresh_pending = False
+
+        #撤销/重做与自动保存；文件写入都交给单线程后台执行，保证追加与压缩的先后顺序
+        self.journal = Journal(UNTITLED_PATH)
+        self.io = ThreadPoolExecutor(max_workers=1)
+        self.export_pool = ThreadPoolExecutor(max_workers=1)   #PNG 导出耗时较长，不占用自动保存的写入线程
+
+        #缩略图：磁盘缓存 + 后台解码，图块面板只为可见的格子请求缩略图
+        self.thumbs = ThumbnailCache(THUMB_CACHE_DIR)
+        self.thumb_errors: list[str] = []
+        self._thumb_polling = False
+        self.palette_paths = scan_assets()
+        self.palette_items: dict[str, int] = {}
     
         self.create_widgets()
+        self.draw_palette()
         self.draw_grid()
         self.bind_events()
+        self.recover_autosave(None)
+        self.after(AUTOSAVE_MS, self.autosave)
 
     def change_image_selected(self, event):
-        selected_image = self.image_combobox.get()
-        self.selected_image_preview_obj = self.images[selected_image]
+        self.select_image(self.image_combobox.get())
+
+    def select_image(self, path):
+        self.request_image(path)
+        self.selected_image_preview_obj = self.images[path]
         self.image_preview_lb.configure(image=self.selected_image_preview_obj)
-        self.selected_image = selected_image
+        self.selected_image = path
+        self.image_combobox['values'] = list(self.images.keys())
+        self.image_combobox.set(path)
+        self.update_palette_highlight()
+
+    #缩略图加载：缓存命中立即使用，未命中先放占位图，后台解码完成后替换
+    def request_image(self, path):
+        if path in self.images:
+            return
+        img = self.thumbs.lookup(path, self.grid_cell)
+        if img is not None:
+            self.images[path] = ImageTk.PhotoImage(img)
+            return
+        self.images[path] = self.selected_image_preview_default_obj
+        self.thumbs.request(path, self.grid_cell)
+        if not self._thumb_polling:
+            self._thumb_polling = True
+            self.after(30, self.poll_thumbnails)
+
+    def poll_thumbnails(self):
+        for path, _, result in self.thumbs.poll():
+            if isinstance(result, Exception):
+                self.thumb_errors.append(f"{path}\n{result}")
+                continue
+            img_tk = ImageTk.PhotoImage(result)
+            self.images[path] = img_tk
+            self.on_image_ready(path, img_tk)
+        if self.thumbs.pending:
+            self.after(30, self.poll_thumbnails)
+            return
+        self._thumb_polling = False
+        if self.thumb_errors:
+            errors, self.thumb_errors = self.thumb_errors, []
+            messagebox.showwarning("图片加载失败", "无法加载图片:\n" + "\n".join(errors[:10]))
+
+    def on_image_ready(self, path, img_tk):
+        #只需更新已在画布上的对象，其余 tile 进入可视区域时自然使用新图像
+        if self.view_region:
+            for t in self.index.query(*self.view_region):
+                cid = self.tile_items.get(id(t))
+                if cid and t.get('path') == path:
+                    self.canvas.itemconfig(cid, image=img_tk)
+        if path in self.palette_items:
+            self.palette.itemconfig(self.palette_items[path], image=img_tk)
+        if path == self.selected_image:
+            self.selected_image_preview_obj = img_tk
+            self.image_preview_lb.configure(image=img_tk)
+
+    #图块面板
+    def palette_cell(self):
+        return self.grid_cell + 8
+
+    def draw_palette(self):
+        self.palette.delete("all")
+        self.palette_items.clear()
+        c = self.palette_cell()
+        rows = -(-len(self.palette_paths) // PALETTE_COLS)
+        self.palette.config(scrollregion=(0, 0, PALETTE_COLS * c, rows * c))
+        self.palette_highlight = self.palette.create_rectangle(0, 0, 0, 0, outline="#ff0", width=2, state="hidden")
+        self.refresh_palette()
+
+    def refresh_palette(self):
+        """只为滚动到可见范围内的面板格子创建图像并请求缩略图"""
+        c = self.palette_cell()
+        top = self.palette.canvasy(0)
+        bottom = self.palette.canvasy(self.palette.winfo_height())
+        first = max(0, int(top // c) * PALETTE_COLS)
+        last = min(len(self.palette_paths), (int(bottom // c) + 1) * PALETTE_COLS)
+        for i in range(first, last):
+            path = self.palette_paths[i]
+            if path in self.palette_items:
+                continue
+            self.request_image(path)
+            x, y = (i % PALETTE_COLS) * c + 4, (i // PALETTE_COLS) * c + 4
+            self.palette_items[path] = self.palette.create_image(x, y, image=self.images[path], anchor='nw')
+        self.update_palette_highlight()
+
+    def update_palette_highlight(self):
+        if self.selected_image not in self.palette_paths:
+            self.palette.itemconfig(self.palette_highlight, state="hidden")
+            return
+        c = self.palette_cell()
+        i = self.palette_paths.index(self.selected_image)
+        x, y = (i % PALETTE_COLS) * c, (i // PALETTE_COLS) * c
+        self.palette.coords(self.palette_highlight, x + 2, y + 2, x + c - 2, y + c - 2)
+        self.palette.itemconfig(self.palette_highlight, state="normal")
+        self.palette.tag_raise(self.palette_highlight)
+
+    def on_palette_click(self, event):
+        c = self.palette_cell()
+        col = int(self.palette.canvasx(event.x) // c)
+        i = int(self.palette.canvasy(event.y) // c) * PALETTE_COLS + col
+        if 0 <= col < PALETTE_COLS and 0 <= i < len(self.palette_paths):
+            self.select_image(self.palette_paths[i])
+
+    def on_palette_scroll(self, *args):
+        self.palette.yview(*args)
+        self.refresh_palette()
 
     def create_widgets(self):           #创建窗口小组件
         ctrl = ttk.Frame(self)
@@ -95,6 +772,11 @@ class LevelEditor(tk.Tk):
         self.image_preview_lb = ttk.Label(tools, image=self.selected_image_preview_obj)
         self.image_preview_lb.pack(side="left", padx=10)
 
+        #图像工具的放置方式
+        fill_names = {"point": "单格", "rect": "矩形填充", "line": "直线", "flood": "油漆桶"}
+        for m in ["point", "rect", "line", "flood"]:
+            ttk.Radiobutton(tools, text=fill_names[m], value=m, variable=self.fill_mode).pack(side="left", padx=4)
+
         ttk.Label(ctrl, text="地图名称").pack(side="left", padx=4)
         self.name_var = tk.StringVar(value=self.map['name'])
         ttk.Entry(ctrl, textvariable=self.name_var, width=16).pack(side="left", padx=4)
@@ -119,25 +801,44 @@ class LevelEditor(tk.Tk):
             "no_collide_image":"非碰撞图像",
             "collide_image": "碰撞图像",
             "water": "水域",
+            "breakable": "可破坏",
             "solid": "地形块",
             "player": "玩家",
             "enemy": "敌人",
             "item": "物品",
             "door": "传送门",
             "boss": "Boss",
+            "checkpoint": "检查点",
             "select": "选择",
         }
-        for t in ["no_collide_image","collide_image", "water", "solid", "player", "enemy", "item", "door", "boss", "select"]:
+        for t in ["no_collide_image","collide_image", "water", "breakable", "solid", "player", "enemy", "item", "door", "boss", "checkpoint", "select"]:
             rb = ttk.Radiobutton(tools, text=tool_names[t], value=t, variable=self.current_tool)
             rb.pack(side="left", padx=6)
 
         ttk.Button(tools, text="加载 JSON", command=self.load_json).pack(side="right", padx=6)
+        ttk.Button(tools, text="重做", command=self.redo).pack(side="right", padx=6)
+        ttk.Button(tools, text="撤销", command=self.undo).pack(side="right", padx=6)
         ttk.Button(tools, text="导出 PNG 预览", command=self.export_png).pack(side="right", padx=6)
         ttk.Button(tools, text="导出 JSON", command=self.export_json).pack(side="right", padx=6)
 
         canvas_frame = ttk.Frame(self)
         canvas_frame.pack(side="top", fill="both", expand=True)
 
+        #左侧图块面板
+        palette_frame = ttk.Frame(canvas_frame)
+        palette_frame.pack(side="left", fill="y")
+        palette_bar = ttk.Scrollbar(palette_frame, orient="vertical")
+        palette_bar.pack(side="right", fill="y")
+        self.palette = tk.Canvas(palette_frame, bg="#2b2b2b", width=PALETTE_COLS * self.palette_cell(),
+                                 yscrollcommand=palette_bar.set)
+        self.palette.pack(side="left", fill="y")
+        palette_bar.config(command=self.on_palette_scroll)
+        self.palette.bind("<ButtonPress-1>", self.on_palette_click)
+        self.palette.bind("<Configure>", lambda e: self.refresh_palette())
+        self.palette.bind("<MouseWheel>", lambda e: self.on_palette_scroll("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.palette.bind("<Button-4>", lambda e: self.on_palette_scroll("scroll", -1, "units"))
+        self.palette.bind("<Button-5>", lambda e: self.on_palette_scroll("scroll", 1, "units"))
+
         self.hbar = ttk.Scrollbar(canvas_frame, orient="horizontal")          #设置滚动条
         self.hbar.pack(side="bottom", fill="x")
         self.vbar = ttk.Scrollbar(canvas_frame, orient="vertical")
@@ -147,8 +848,8 @@ class LevelEditor(tk.Tk):
         self.canvas = tk.Canvas(canvas_frame, bg="#222", xscrollcommand=self.hbar.set, yscrollcommand=self.vbar.set)
         self.canvas.pack(side="left", fill="both", expand=True)
 
-        self.hbar.config(command=self.canvas.xview)
-        self.vbar.config(command=self.canvas.yview)
+        self.hbar.config(command=self.on_xview)
+        self.vbar.config(command=self.on_yview)
 
         status = ttk.Frame(self)
         status.pack(side="bottom", fill="x")
@@ -160,21 +861,11 @@ class LevelEditor(tk.Tk):
         file_path = filedialog.askopenfilename(filetypes=[("PNG 文件", "*.png")])
         if not file_path:
             return
-        try:
-            if file_path not in self.images.keys():
-                self.n += 1
-                img = Image.open(file_path)
-                img = img.convert("RGBA")  # 确保是 RGBA 模式
-                img.thumbnail((self.grid_cell, self.grid_cell))  # 调整大小以适应网格
-                img_tk = ImageTk.PhotoImage(img)
-                self.images[file_path] = img_tk
-                self.selected_image = file_path
-                self.image_combobox['values'] = list(self.images.keys())
-                messagebox.showinfo("成功", f"已加载图像：{file_path}")
-            else:
-                messagebox.showwarning("提示", f"请无重复加载图像")
-        except Exception as e:
-            messagebox.showerror("错误", f"加载图像失败: {e}")
+        if file_path not in self.images.keys():
+            self.n += 1
+            self.select_image(file_path)
+        else:
+            messagebox.showwarning("提示", f"请无重复加载图像")
 
     def bind_events(self):
         self.canvas.bind("<ButtonPress-1>", self.on_left_down)
@@ -182,6 +873,15 @@ class LevelEditor(tk.Tk):
         self.canvas.bind("<ButtonRelease-1>", self.on_left_up)
         self.canvas.bind("<ButtonPress-3>", self.on_right_down)
         self.bind("<Delete>", self.on_delete)
+        self.bind("<Control-z>", lambda e: self.undo())
+        self.bind("<Control-y>", lambda e: self.redo())
+        self.bind("<Control-Z>", lambda e: self.redo())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_refresh())
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Shift-MouseWheel>", lambda e: self.on_wheel(e, horizontal=True))
+        self.canvas.bind("<Button-4>", lambda e: self.on_xview_or_yview(-1, e))
+        self.canvas.bind("<Button-5>", lambda e: self.on_xview_or_yview(1, e))
         self.current_tool.trace_add("write", lambda *a: self.update_status())
 
     def update_status(self):
@@ -189,11 +889,14 @@ class LevelEditor(tk.Tk):
             "no_collide_image": "非碰撞实体",
             "collide_image": "碰撞实体",
             "water":"水域",
+            "breakable": "可破坏",
             "solid": "地形块",
+            "player": "玩家",
             "enemy": "敌人",
             "item": "道具",
             "door": "传送门",
             "boss": "Boss",
+            "checkpoint": "检查点",
             "select": "选择"
         }
         self.status_label.config(text=f"工具: {tool_names[self.current_tool.get()]} | 格子: {self.grid_cell}px")
@@ -208,95 +911,336 @@ class LevelEditor(tk.Tk):
         except:
             messagebox.showerror("错误", "宽度、高度和格子大小必须为正整数。")
             return
-        self.map['width'] = w
-        self.map['height'] = h
-        self.grid_cell = g
+        before = {"width": self.map['width'], "height": self.map['height'], "grid": self.grid_cell}
+        after = {"width": w, "height": h, "grid": g}
+        if after != before:
+            self.commit_op({"op": "settings", "before": before, "after": after})
+
+    def set_map_settings(self, width, height, grid):
+        self.map['width'] = width
+        self.map['height'] = height
+        self.grid_cell = grid
+        self.width_var.set(width)
+        self.height_var.set(height)
+        self.grid_var.set(grid)
         self.draw_grid()
         self.update_status()
 
-    def draw_grid(self):            #绘制网格
-        self.canvas.delete("all")
-        w = self.map['width']
-        h = self.map['height']
+    #操作日志：所有修改地图的用户操作都经 commit_op 执行并记录
+    def apply_op(self, op):
+        kind = op['op']
+        if kind == 'add':
+            for t in op['tiles']:
+                self.add_tile(t)
+        elif kind == 'remove':
+            self.remove_tiles(op['tiles'])
+        elif kind == 'edit':
+            t = op['tile']
+            t.clear()
+            t.update(op['after'])
+            self.move_tile(t)
+        elif kind == 'settings':
+            self.set_map_settings(**op['after'])
+        elif kind == 'batch':
+            for sub in op['ops']:
+                self.apply_op(sub)
+
+    def commit_op(self, op):
+        self.apply_op(op)
+        self.journal.push(op)
+
+    def undo(self):
+        if self.journal.undo:
+            self.clear_selection()
+            self.apply_op(self.journal.pop_undo())
+
+    def redo(self):
+        if self.journal.redo:
+            self.clear_selection()
+            self.apply_op(self.journal.pop_redo())
+
+    def find_tile(self, content, exclude=()):
+        """按内容在当前地图中查找 tile(用于重放日志)"""
+        for t in self.index.query(*tile_bbox(content, self.grid_cell)):
+            if id(t) not in exclude and clean_tile(t) == content:
+                return t
+        return None
+
+    def replay_op(self, rec):
+        """重放一条日志记录：按内容定位 tile 后执行"""
+        kind = rec['op']
+        if kind == 'add':
+            self.apply_op({"op": "add", "tiles": [dict(t) for t in rec['tiles']]})
+        elif kind == 'remove':
+            found = {}
+            for c in rec['tiles']:
+                t = self.find_tile(c, found)
+                if t:
+                    found[id(t)] = t
+            self.apply_op({"op": "remove", "tiles": list(found.values())})
+        elif kind == 'edit':
+            t = self.find_tile(rec['before'])
+            if t:
+                self.apply_op({"op": "edit", "tile": t, "before": rec['before'], "after": dict(rec['after'])})
+        elif kind == 'settings':
+            self.apply_op(rec)
+        elif kind == 'batch':
+            for sub in rec['ops']:
+                self.replay_op(sub)
+
+    #自动保存
+    def map_data(self):
+        """当前地图的可序列化副本(tile 与实体分开)"""
+        tiles = []
+        entities = []
+        for t in self.map['tiles']:
+            (tiles if t['type'] in TILE_TYPES else entities).append(clean_tile(t))
+        return {"name": self.name_var.get(), "width": self.map['width'], "height": self.map['height'],
+                "tiles": compact_tiles(tiles), "entities": entities}
+
+    def flush_journal(self):
+        lines = self.journal.take_pending()
+        if lines:
+            self.io.submit(append_lines, self.journal.journal_path, lines)
+
+    def compact(self, export_path=None):
+        #先把待写日志排进队列，快照写入后这些日志即可丢弃
+        self.flush_journal()
+        self.journal.since_snapshot = 0
+        return self.io.submit(write_snapshot, self.journal.snapshot_path, self.journal.journal_path,
+                              self.map_data(), self.journal.seq, export_path)
+
+    def autosave(self):
+        self.flush_journal()
+        if self.journal.since_snapshot >= COMPACT_EVERY:
+            self.compact()
+        self.after(AUTOSAVE_MS, self.autosave)
+
+    def recover_autosave(self, path):
+        """检查 path 对应的自动保存数据；若与文件内容不同则询问是否恢复"""
+        self.journal.set_base(path or UNTITLED_PATH)
+        try:
+            snap_map, ops, seq = read_autosave(self.journal.snapshot_path, self.journal.journal_path)
+        except (OSError, ValueError, KeyError):
+            return
+        self.journal.reset(seq)
+        if snap_map is None and not ops:
+            return
+        saved = self.map_data()
+        if snap_map is not None:
+            self.load_map_data(snap_map)
+        for rec in ops:
+            self.replay_op(rec)
+        if self.map_data() == saved:
+            return
+        if messagebox.askyesno("自动保存", "发现未保存的编辑记录，是否恢复？"):
+            self.compact()
+        else:
+            self.load_map_data(saved)
+            self.compact()
+        self.journal.reset(self.journal.seq)
+
+    def on_close(self):
+        self.compact()
+        self.io.shutdown(wait=True)
+        self.destroy()
+
+    #滚动
+    def on_xview(self, *args):
+        self.canvas.xview(*args)
+        self.schedule_refresh()
+
+    def on_yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_refresh()
+
+    def on_wheel(self, event, horizontal=False):
+        step = -1 if event.delta > 0 else 1
+        if horizontal:
+            self.on_xview("scroll", step, "units")
+        else:
+            self.on_yview("scroll", step, "units")
+
+    def on_xview_or_yview(self, step, event):
+        #X11 下滚轮为 Button-4/5，按住 Shift 时横向滚动
+        if event.state & 0x1:
+            self.on_xview("scroll", step, "units")
+        else:
+            self.on_yview("scroll", step, "units")
+
+    def schedule_refresh(self):
+        #合并同一轮事件中的多次滚动，只刷新一次可视区域
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self.refresh_viewport)
+
+    def visible_region(self):
+        x0 = self.canvas.canvasx(0) - VIEW_MARGIN
+        y0 = self.canvas.canvasy(0) - VIEW_MARGIN
+        x1 = self.canvas.canvasx(self.canvas.winfo_width()) + VIEW_MARGIN
+        y1 = self.canvas.canvasy(self.canvas.winfo_height()) + VIEW_MARGIN
+        return (x0, y0, x1, y1)
+
+    def in_region(self, t, region):
+        x1, y1, x2, y2 = tile_bbox(t, self.grid_cell)
+        return not (x2 < region[0] or x1 > region[2] or y2 < region[1] or y1 > region[3])
+
+    def refresh_viewport(self):
+        """回收移出可视区域的画布对象，为新进入区域的 tile 创建/复用对象"""
+        self._refresh_pending = False
+        region = self.visible_region()
+        self.view_region = region
+        self.update_grid(region)
+        visible = self.index.query(*region)
+        keep = {id(t) for t in visible}
+        for key in [k for k in self.tile_items if k not in keep]:
+            self.release_item(key)
+        for t in visible:
+            if id(t) not in self.tile_items:
+                self.draw_tile_on_canvas(t)
+
+    def update_grid(self, region):
+        #网格图案只随窗口尺寸/格子大小重建，滚动时仅移动位置
         cell = self.grid_cell
-        self.canvas.config(scrollregion=(0, 0, w, h))
-        for x in range(0, w, cell):
-            self.canvas.create_line(x, 0, x, h, fill="#333")
-        for y in range(0, h, cell):
-            self.canvas.create_line(0, y, w, y, fill="#333")
+        w = min(int(region[2] - region[0]) + 2 * cell, self.map['width'])
+        h = min(int(region[3] - region[1]) + 2 * cell, self.map['height'])
+        w = max(cell, -(-w // cell) * cell)
+        h = max(cell, -(-h // cell) * cell)
+        if self.grid_size != (w, h, cell):
+            self.grid_size = (w, h, cell)
+            self.grid_photo = ImageTk.PhotoImage(make_grid_pattern(w, h, cell))
+            if self.grid_item:
+                self.canvas.itemconfig(self.grid_item, image=self.grid_photo)
+        gx = max(0, snap(int(region[0]), cell))
+        gy = max(0, snap(int(region[1]), cell))
+        if self.grid_item is None:
+            self.grid_item = self.canvas.create_image(gx, gy, image=self.grid_photo, anchor='nw')
+        else:
+            self.canvas.coords(self.grid_item, gx, gy)
+        self.canvas.tag_lower(self.grid_item)
+
+    def rebuild_index(self):
+        self.index.clear()
+        self.occupancy.clear()
+        self.occupant_keys.clear()
         for t in self.map['tiles']:
+            self.index.insert(t, tile_bbox(t, self.grid_cell))
+            self.occupy(t)
+
+    def draw_grid(self):            #绘制网格
+        self.canvas.delete("all")
+        self.select_rect = None
+        self.selected = []
+        self.rebuild_index()
+        self.tile_items.clear()
+        for pool in self.item_pool.values():
+            pool.clear()
+        self.grid_item = None
+        self.grid_size = None
+        self.canvas.config(scrollregion=(0, 0, self.map['width'], self.map['height']))
+        self.refresh_viewport()
+
+    def acquire_item(self, kind):
+        #优先复用对象池中隐藏的画布对象
+        pool = self.item_pool[kind]
+        if pool:
+            cid = pool.pop()
+            self.canvas.itemconfig(cid, state="normal")
+            return cid
+        if kind == "image":
+            return self.canvas.create_image(0, 0, anchor='nw')
+        if kind == "rectangle":
+            return self.canvas.create_rectangle(0, 0, 0, 0)
+        return self.canvas.create_oval(0, 0, 0, 0)
+
+    def release_item(self, key):
+        cid = self.tile_items.pop(key, None)
+        if cid:
+            self.canvas.itemconfig(cid, state="hidden")
+            self.item_pool[self.canvas.type(cid)].append(cid)
+
+    def add_tile(self, t):
+        self.map['tiles'].append(t)
+        self.index.insert(t, tile_bbox(t, self.grid_cell))
+        self.occupy(t)
+        if self.view_region and self.in_region(t, self.view_region):
             self.draw_tile_on_canvas(t)
 
-    def draw_tile_on_canvas(self, t):
-        if t['type'] == "no_collide_image":
-            # 绘制图像
-            img_path = t['path']
-            img_tk = self.images[img_path]
-            img_id = self.canvas.create_image(t['x'], t['y'], image=img_tk,anchor = 'nw')
-            t['_canvas_id'] = img_id
+    def remove_tiles(self, tiles):
+        #按对象身份删除，避免 list.remove 按值比较误删重叠的相同 tile
+        gone = {id(t) for t in tiles}
+        for t in tiles:
+            self.release_item(id(t))
+            self.index.remove(t)
+            self.vacate(t)
+        self.map['tiles'] = [o for o in self.map['tiles'] if id(o) not in gone]
 
-        elif t['type'] == "collide_image":
-            # 绘制图像
-            img_path = t['path']
-            img_tk = self.images[img_path]
-            img_id = self.canvas.create_image(t['x'], t['y'], image=img_tk,anchor = 'nw')
-            t['_canvas_id'] = img_id
-        
-        elif t['type'] == "water":
+    def occupy(self, t):
+        if t['type'] in IMAGE_TYPES:
+            key = cell_key(t)
+            self.occupancy[key] = t
+            self.occupant_keys[id(t)] = key
+
+    def vacate(self, t):
+        key = self.occupant_keys.pop(id(t), None)
+        if key and self.occupancy.get(key) is t:
+            del self.occupancy[key]
+
+    def move_tile(self, t):
+        """tile 的坐标/尺寸被修改后，同步索引、占用表与画布对象"""
+        self.index.move(t, tile_bbox(t, self.grid_cell))
+        self.vacate(t)
+        self.occupy(t)
+        self.release_item(id(t))
+        if self.view_region and self.in_region(t, self.view_region):
+            self.draw_tile_on_canvas(t)
+
+    def draw_tile_on_canvas(self, t):
+        if t['type'] in IMAGE_TYPES:
             # 绘制图像
-            img_path = t['path']
-            img_tk = self.images[img_path]
-            img_id = self.canvas.create_image(t['x'], t['y'], image=img_tk,anchor = 'nw')
-            t['_canvas_id'] = img_id
+            img_tk = self.images.get(t.get('path'), self.selected_image_preview_default_obj)
+            cid = self.acquire_item("image")
+            self.canvas.coords(cid, t['x'], t['y'])
+            self.canvas.itemconfig(cid, image=img_tk)
 
         elif t['type'] == 'solid':
-            cid = self.canvas.create_rectangle(t['x'], t['y'], t['x'] + t['w'], t['y'] + t['h'],
-                                               fill="#777", outline="#ccc")
-            t['_canvas_id'] = cid
+            cid = self.acquire_item("rectangle")
+            self.canvas.coords(cid, t['x'], t['y'], t['x'] + t['w'], t['y'] + t['h'])
+            self.canvas.itemconfig(cid, fill="#777", outline="#ccc")
 
         #entity绘制
         else:
-            r = max(4, self.grid_cell // 3)
-            color_map = {'enemy': "#d9534f", 'item': "#5bc0de", 'door': "#f0ad4e", 'boss': "#5cb85c"}
-            cid = self.canvas.create_oval(t['x'] - r, t['y'] - r, t['x'] + r, t['y'] + r,
-                                          fill=color_map.get(t['type'], "#fff"), outline="#000")
-            t['_canvas_id'] = cid
+            color_map = {'enemy': "#d9534f", 'item': "#5bc0de", 'door': "#f0ad4e", 'boss': "#5cb85c", 'checkpoint': "#9b59b6"}
+            cid = self.acquire_item("oval")
+            self.canvas.coords(cid, *tile_bbox(t, self.grid_cell))
+            self.canvas.itemconfig(cid, fill=color_map.get(t['type'], "#fff"), outline="#000")
+        self.canvas.tag_raise(cid)
+        self.tile_items[id(t)] = cid
 
     #鼠标操控
     def on_left_down(self, event):
         tool = self.current_tool.get()
-        if tool == "no_collide_image":
-            # 选中工具为“图像”，放置图像
-            x = snap(self.canvas.canvasx(event.x), self.grid_cell)
-            y = snap(self.canvas.canvasy(event.y), self.grid_cell)
-            if self.selected_image in self.images.keys():
-                tile = {"type": "no_collide_image", "x": x, "y": y,"w": 32.0, "h": 32.0, "path": self.selected_image}
-                self.map['tiles'].append(tile)
-                self.draw_tile_on_canvas(tile)
-            else:
+        if tool in IMAGE_TYPES:
+            # 选中工具为“图像”，按放置方式放置图像
+            if self.selected_image not in self.images.keys():
                 messagebox.showwarning("提示", "你还没有选择任何图像")
-
-        elif tool == "collide_image":
-            # 选中工具为“图像”，放置图像
+                return
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
-            if self.selected_image in self.images.keys():
-                tile = {"type": "collide_image", "x": x, "y": y,"w": 32.0, "h": 32.0, "path": self.selected_image}
-                self.map['tiles'].append(tile)
-                self.draw_tile_on_canvas(tile)
+            mode = self.fill_mode.get()
+            if mode == "point":
+                self.place_images([(x, y)], tool)
+            elif mode == "flood":
+                self.place_images(self.flood_cells(tool, x, y), tool)
             else:
-                messagebox.showwarning("提示", "你还没有选择任何图像")
-
-        elif tool == "water":
-            # 选中工具为“图像”，放置图像
-            x = snap(self.canvas.canvasx(event.x), self.grid_cell)
-            y = snap(self.canvas.canvasy(event.y), self.grid_cell)
-            if self.selected_image in self.images.keys():
-                tile = {"type": "water", "x": x, "y": y,"w": 32.0, "h": 32.0, "path": self.selected_image}
-                self.map['tiles'].append(tile)
-                self.draw_tile_on_canvas(tile)
-            else:
-                messagebox.showwarning('提示', "你还没有选择任何图像")
+                self.is_drawing = True
+                self.drag_start = (x, y)
+                if mode == "rect":
+                    self.preview_rect = self.canvas.create_rectangle(x, y, x + self.grid_cell, y + self.grid_cell,
+                                                                     outline="#ff0", dash=(2, 2))
+                else:
+                    h = self.grid_cell / 2
+                    self.preview_rect = self.canvas.create_line(x + h, y + h, x + h, y + h, fill="#ff0", dash=(2, 2))
 
         elif tool == "solid":
             self.is_drawing = True
@@ -308,194 +1252,261 @@ class LevelEditor(tk.Tk):
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
             tile = {"type": tool, "x": x, "y": y, "args":{"healthy":100, "speed":230}}
-            self.map['tiles'].append(tile)
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
 
         elif tool == "enemy":
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
             tile = {"type": tool, "x": x, "y": y, "args":{"healthy":5, "speed":130}}
-            self.map['tiles'].append(tile)
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
 
         elif tool == "boss":
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
             tile = {"type": tool, "x": x, "y": y, "args":{"healthy":500, "speed":230}}
-            self.map['tiles'].append(tile)
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
 
         elif tool == "door":
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
             tile = {"type": tool, "x": x, "y": y, "args":{"target":"level2.json"}}
-            self.map['tiles'].append(tile)
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
 
         elif tool == "item":
             x = snap(self.canvas.canvasx(event.x), self.grid_cell)
             y = snap(self.canvas.canvasy(event.y), self.grid_cell)
             tile = {"type": tool, "x": x, "y": y}
-            self.map['tiles'].append(tile)
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
+
+        elif tool == "checkpoint":
+            x = snap(self.canvas.canvasx(event.x), self.grid_cell)
+            y = snap(self.canvas.canvasy(event.y), self.grid_cell)
+            tile = {"type": tool, "x": x, "y": y, "args": {}}
+            self.commit_op({"op": "add", "tiles": [tile]})
 
         elif tool == "select":
-            self.select_at(event)
+            self.begin_select(event)
 
     def on_left_drag(self, event):
         if self.is_drawing and self.preview_rect:
             x1, y1 = self.drag_start
-            x2 = snap(self.canvas.canvasx(event.x), self.grid_cell) + self.grid_cell
-            y2 = snap(self.canvas.canvasy(event.y), self.grid_cell) + self.grid_cell
-            self.canvas.coords(self.preview_rect, x1, y1, x2, y2)
+            x2 = snap(self.canvas.canvasx(event.x), self.grid_cell)
+            y2 = snap(self.canvas.canvasy(event.y), self.grid_cell)
+            if self.current_tool.get() in IMAGE_TYPES and self.fill_mode.get() == "line":
+                h = self.grid_cell / 2
+                self.canvas.coords(self.preview_rect, x1 + h, y1 + h, x2 + h, y2 + h)
+            elif self.current_tool.get() in IMAGE_TYPES:
+                self.canvas.coords(self.preview_rect, min(x1, x2), min(y1, y2),
+                                   max(x1, x2) + self.grid_cell, max(y1, y2) + self.grid_cell)
+            else:
+                self.canvas.coords(self.preview_rect, x1, y1, x2 + self.grid_cell, y2 + self.grid_cell)
+        elif self.select_start and self.select_rect:
+            self.canvas.coords(self.select_rect, *self.select_start,
+                               self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
 
     def on_left_up(self, event):
-        if self.is_drawing and self.preview_rect:
+        tool = self.current_tool.get()
+        if self.is_drawing and self.preview_rect and tool in IMAGE_TYPES:
+            x1, y1 = self.drag_start
+            x2 = snap(self.canvas.canvasx(event.x), self.grid_cell)
+            y2 = snap(self.canvas.canvasy(event.y), self.grid_cell)
+            self.canvas.delete(self.preview_rect)
+            self.preview_rect = None
+            if self.fill_mode.get() == "line":
+                cells = line_cells(x1, y1, x2, y2, self.grid_cell)
+            else:
+                cells = [(float(x), float(y))
+                         for y in range(int(min(y1, y2)), int(max(y1, y2)) + 1, self.grid_cell)
+                         for x in range(int(min(x1, x2)), int(max(x1, x2)) + 1, self.grid_cell)]
+            self.place_images(cells, tool)
+        elif self.is_drawing and self.preview_rect:
             x1, y1 = self.drag_start
             x2 = snap(self.canvas.canvasx(event.x), self.grid_cell) + self.grid_cell
             y2 = snap(self.canvas.canvasy(event.y), self.grid_cell) + self.grid_cell
             tile = {"type": "solid", "x": x1, "y": y1, "w": x2 - x1, "h": y2 - y1}
-            self.map['tiles'].append(tile)
             self.canvas.delete(self.preview_rect)
             self.preview_rect = None
-            self.draw_tile_on_canvas(tile)
+            self.commit_op({"op": "add", "tiles": [tile]})
+        elif self.select_start:
+            self.finish_select(event)
         self.is_drawing = False
 
+    def place_images(self, cells, kind):
+        """在若干格子上放置当前图像，作为一次操作提交。
+
+        同类型 tile 已占用的格子会被替换，图像相同则跳过，避免产生重叠的重复 tile。
+        """
+        w, h = self.map['width'], self.map['height']
+        added, replaced = [], []
+        for x, y in cells:
+            if not (0 <= x < w and 0 <= y < h):
+                continue
+            old = self.occupancy.get((kind, x, y))
+            if old is not None:
+                if old.get('path') == self.selected_image:
+                    continue
+                replaced.append(old)
+            added.append({"type": kind, "x": x, "y": y, "w": float(self.grid_cell), "h": float(self.grid_cell),
+                          "path": self.selected_image})
+        if not added:
+            return
+        op = {"op": "add", "tiles": added}
+        if replaced:
+            op = {"op": "batch", "ops": [{"op": "remove", "tiles": replaced}, op]}
+        self.commit_op(op)
+
+    def flood_cells(self, kind, x, y):
+        """从 (x, y) 出发，4 邻接地收集与起点占用情况(同类型同图像或为空)相同的格子"""
+        cell = self.grid_cell
+        start = self.occupancy.get((kind, x, y))
+        target = start.get('path') if start else None
+        if target == self.selected_image:
+            return []
+        w, h = self.map['width'], self.map['height']
+        seen = {(x, y)}
+        stack = [(x, y)]
+        cells = []
+        while stack:
+            cx, cy = stack.pop()
+            occ = self.occupancy.get((kind, cx, cy))
+            if (occ.get('path') if occ else None) != target:
+                continue
+            cells.append((cx, cy))
+            for nx, ny in ((cx + cell, cy), (cx - cell, cy), (cx, cy + cell), (cx, cy - cell)):
+                if 0 <= nx < w and 0 <= ny < h and (nx, ny) not in seen:
+                    seen.add((nx, ny))
+                    stack.append((nx, ny))
+        return cells
+
     def on_right_down(self, event):
         #获取鼠标在画布上的位置
         x = self.canvas.canvasx(event.x)
         y = self.canvas.canvasy(event.y)
         self.n -= 1
 
-        for t in list(self.map['tiles']):
-            cid = t.get('_canvas_id')
-            if cid and self.canvas.type(cid) == "rectangle":
-                coords = self.canvas.coords(cid)
-                if coords[0] <= x <= coords[2] and coords[1] <= y <= coords[3]:
-                    self.canvas.delete(cid)
-                    self.map['tiles'].remove(t)
-                    break
-            elif cid and self.canvas.type(cid) == "oval":
-                coords = self.canvas.coords(cid)
-                if coords[0] <= x <= coords[2] and coords[1] <= y <= coords[3]:
-                    self.canvas.delete(cid)
-                    self.map['tiles'].remove(t)
-                    break
-
-            #右键去除图像
-            elif cid :   
-                    cx, cy = self.canvas.coords(cid)
-                    if cx <= x <= cx+self.grid_cell and cy <= y <= cy+self.grid_cell:
-                        self.canvas.delete(cid)
-                        self.map['tiles'].remove(t)
-                        break
+        #右键去除 tile/实体(最上层)
+        t = self.index.hit(x, y)
+        if t:
+            self.commit_op({"op": "remove", "tiles": [t]})
+            self.selected = [o for o in self.selected if o is not t]
+
+    #选择工具：单击编辑属性，拖拽框选
+    def begin_select(self, event):
+        self.clear_selection()
+        self.select_start = (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        self.select_rect = self.canvas.create_rectangle(*self.select_start, *self.select_start,
+                                                        outline="#0ff", dash=(4, 2))
+
+    def finish_select(self, event):
+        x1, y1 = self.select_start
+        x2, y2 = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        self.select_start = None
+        if abs(x2 - x1) < 4 and abs(y2 - y1) < 4:
+            self.canvas.delete(self.select_rect)
+            self.select_rect = None
+            self.select_at(event)
+            return
+        self.selected = self.index.query(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        self.status_label.config(text=f"已选择 {len(self.selected)} 个对象 | Delete 删除")
+
+    def clear_selection(self):
+        if self.select_rect:
+            self.canvas.delete(self.select_rect)
+            self.select_rect = None
+        self.selected = []
 
     def select_at(self, event):
         x = self.canvas.canvasx(event.x)
         y = self.canvas.canvasy(event.y)
-        for t in self.map['tiles']:
-            cid = t.get('_canvas_id')
-            if cid and self.canvas.type(cid) == "rectangle":
-                coords = self.canvas.coords(cid)
-                if coords[0] <= x <= coords[2] and coords[1] <= y <= coords[3]:
-                    dlg = PropertyDialog(self, "编辑属性", t)
-                    if dlg.result:
-                        for k, v in dlg.fields.items():
-                            t[k] = v
-                    break
-            elif cid and self.canvas.type(cid) == "oval":
-                coords = self.canvas.coords(cid)
-                if coords[0] <= x <= coords[2] and coords[1] <= y <= coords[3]:
-                    dlg = PropertyDialog(self, "编辑属性", t)
-                    if dlg.result:
-                        for k, v in dlg.fields.items():
-                            t[k] = v
-                    break
-            #右键去除图像
-            elif cid :
-                cx, cy = self.canvas.coords(cid)
-                if cx <= x <= cx+self.grid_cell and cy <= y <= cy+self.grid_cell:
-                    dlg = PropertyDialog(self, "编辑属性", t)
-                    if dlg.result:
-                        for k, v in dlg.fields.items():
-                            t[k] = v
-                    break
+        t = self.index.hit(x, y)
+        if not t:
+            return
+        self.selected = [t]
+        #在副本上编辑，确认后作为一次可撤销的属性修改提交
+        before = clean_tile(t)
+        dlg = PropertyDialog(self, "编辑属性", dict(before))
+        if dlg.fields != before:
+            self.commit_op({"op": "edit", "tile": t, "before": before, "after": dict(dlg.fields)})
 
     def on_delete(self, event):
-        if self.selected_item:
-            tile, cid = self.selected_item
-            if cid:
-                self.canvas.delete(cid)
-            if tile in self.map['tiles']:
-                self.map['tiles'].remove(tile)
-            self.selected_item = None
+        if self.selected:
+            self.commit_op({"op": "remove", "tiles": list(self.selected)})
+            self.clear_selection()
+            self.update_status()
 
     #json png操作
     def export_json(self):
-        self.map['name'] = self.name_var.get()
-        tiles = []
-        entities = []
-        for item in self.map['tiles']:
-            if item['type'] in ('solid', 'no_collide_image',"collide_image","water"):
-                tiles.append(item)
-        for item in self.map['entities']:
-                entities.append(item)
-
-        map_data = {}
-        map_data['name'] = self.map['name']
-        map_data['width'] = self.map['width']
-        map_data['height'] = self.map['height']
-        map_data['tiles'] = tiles
-        map_data['entities'] = entities
-
         f = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON 文件", "*.json")])
         if not f:
             return
-        with open(f, "w", encoding="utf-8") as fp:
-            json.dump(map_data, fp, ensure_ascii=False, indent=2)
-        messagebox.showinfo("成功", "地图已导出为 JSON。")
+        self.map['name'] = self.name_var.get()
+        #导出即一次压缩：后台写入地图文件与快照，之后的自动保存记录到该文件旁
+        self.flush_journal()
+        old = (self.journal.snapshot_path, self.journal.journal_path)
+        self.journal.set_base(f)
+        future = self.compact(export_path=f)
+        if old[0] != self.journal.snapshot_path:
+            self.io.submit(remove_files, *old)
+        self.when_done(future, self.on_exported)
+
+    def on_exported(self, future):
+        if future.exception():
+            messagebox.showerror("错误", f"导出失败: {future.exception()}")
+        else:
+            messagebox.showinfo("成功", "地图已导出为 JSON。")
+
+    def when_done(self, future, callback):
+        #Tk 只能在主线程操作，轮询后台任务完成后再回调
+        if future.done():
+            callback(future)
+        else:
+            self.after(50, lambda: self.when_done(future, callback))
 
     def export_png(self):
         f = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG 图片", "*.png")])
         if not f:
             return
-        img = Image.new("RGB", (self.map['width'], self.map['height']), (34, 34, 34))
-        draw = ImageDraw.Draw(img)
-        for t in self.map['tiles']:
-            if t['type'] == "solid":
-                draw.rectangle([t['x'], t['y'], t['x'] + t['w'], t['y'] + t['h']], fill=(119, 119, 119))
-            else:
-                r = max(4, self.grid_cell // 3)
-                color_map = {'enemy': (217, 83, 79), 'item': (91, 192, 222),
-                             'door': (240, 173, 78), 'boss': (92, 184, 92)}
-                color = color_map.get(t['type'], (255, 255, 255))
-                draw.ellipse([t['x'] - r, t['y'] - r, t['x'] + r, t['y'] + r], fill=color)
-        img.save(f)
-        messagebox.showinfo("成功", "地图预览已导出为 PNG。")
+        scale = simpledialog.askfloat("导出 PNG", "缩放倍数", initialvalue=1.0, minvalue=0.05, maxvalue=16.0, parent=self)
+        if not scale:
+            return
+        tiles = [clean_tile(t) for t in self.map['tiles']]
+        future = self.export_pool.submit(export_png_stream, f, tiles, self.map['width'], self.map['height'],
+                                scale, self.grid_cell)
+        self.status_label.config(text="正在导出 PNG ...")
+        self.when_done(future, self.on_png_exported)
+
+    def on_png_exported(self, future):
+        self.update_status()
+        if future.exception():
+            messagebox.showerror("错误", f"导出 PNG 失败: {future.exception()}")
+        else:
+            w, h = future.result()
+            messagebox.showinfo("成功", f"地图预览已导出为 PNG({w}x{h})。")
 
     def load_json(self):
         f = filedialog.askopenfilename(filetypes=[("JSON 文件", "*.json")]) 
         if not f:
             return
         with open(f, "r", encoding="utf-8") as fp:
-            self.map = json.load(fp)
+            data = json.load(fp)
+        self.flush_journal()
+        self.load_map_data(data)
+        self.recover_autosave(f)
+       
+        messagebox.showinfo("成功", "地图和实体已加载。")
+
+    def load_map_data(self, data):
+        self.map = data
+        self.map.setdefault('tiles', [])
         self.width_var.set(self.map['width'])
         self.height_var.set(self.map['height'])
         self.grid_var.set(self.grid_cell)
+        self.name_var.set(self.map.get('name', ''))
         
-        # 自动加载所有图片资源
+        # 自动加载所有图片资源(缓存未命中的在后台解码，先用占位图显示)
         for t in self.map['tiles']:
-            if t['type'] in ("no_collide_image", "collide_image", "water"):
-                img_path = t.get('path')
-                if img_path and img_path not in self.images:
-                    try:
-                        img = Image.open(img_path) 
-                        img = img.convert("RGBA")
-                        img.thumbnail((self.grid_cell, self.grid_cell))
-                        img_tk = ImageTk.PhotoImage(img)
-                        self.images[img_path] = img_tk
-                    except Exception as e:
-                        messagebox.showwarning("图片加载失败", f"无法加载图片: {img_path}\n{e}")
+            if t['type'] in IMAGE_TYPES and t.get('path'):
+                self.request_image(t['path'])
  
         # 同步图片路径到下拉框
         self.image_combobox['values'] = list(self.images.keys())
@@ -504,11 +1515,14 @@ class LevelEditor(tk.Tk):
             self.selected_image_preview_obj = self.images[self.selected_image]
             self.image_preview_lb.configure(image=self.selected_image_preview_obj)
 
-        self.map['tiles'].extend(self.map['entities']) #extend()给定列表元素加到列表
-        self.canvas.delete("all")  # 清空画布
+        #实体与 tile 在编辑器中放在同一列表里，导出时再分开
+        self.map['tiles'].extend(self.map.get('entities', [])) #extend()给定列表元素加到列表
+        self.map['entities'] = []
+        #压缩存储的矩形区域在编辑器中逐格展开，并去掉历史遗留的重叠 tile
+        self.map['tiles'] = dedupe_tiles(expand_tiles(self.map['tiles']))
+        for t in self.map['tiles']:
+            t.pop('_canvas_id', None)   #旧版本导出的画布对象id，已不再使用
         self.draw_grid()
-       
-        messagebox.showinfo("成功", "地图和实体已加载。")
 
 if __name__ == "__main__":
     app = LevelEditor()
@@ -1,3 +1,14 @@
+import os
+import sys
+
+if "--trace-startup" in sys.argv:
+    os.environ["PIXEL_TRACE_STARTUP"] = "1"  # 需在导入游戏模块前设置
+if "--trace-governor" in sys.argv:
+    os.environ["PIXEL_TRACE_GOVERNOR"] = "1"  # 打印每次画质档位调整
+if "--record" in sys.argv:
+    i = sys.argv.index("--record")
+    os.environ["PIXEL_RECORD"] = sys.argv[i + 1] if i + 1 < len(sys.argv) else "replay.rec"  # 录制输入，供 scripts.replay 回放
+
 from adventure.Adventure import Game
 
 if __name__ == "__main__":
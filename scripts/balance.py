@@ -0,0 +1,218 @@
+"""
+关卡平衡用的批量模拟：用进程池在所有核心上无窗口跑大量对局，汇总成 CSV（或 Parquet）。
+
+每个任务 = 关卡 × 种子 × 参数覆盖的一种组合，由脚本化或随机的操作者游玩，最多 --frames 帧
+（死亡后照常从检查点复活继续），记录：是否通关（从出口门离开）与用时、是否击败 Boss、死亡次数、
+受到的伤害、击杀数（敌人实际死亡的次数，复活后再被击杀也计入），以及每帧 update 的平均 / p95 / 最慢耗时。
+
+参数覆盖写成 实体类型[:变体].参数=值1,值2,...，会改写关卡 JSON 里所有匹配实体的 args，例如：
+
+    python -m scripts.balance levels/level1.json levels/level2.json --seeds 8 \\
+        --set enemy.health=20,40,60 --set enemy:jumper.speed=120,160 --set boss.fire_interval=0.8,1.2 \\
+        --agent random -o balance.csv
+
+不指定关卡时跑 levels/ 下全部关卡（编辑器的自动保存等不算）；输出文件以 .parquet 结尾时写 Parquet（需要 pandas 或 pyarrow）。
+--summary 按 关卡 + 参数覆盖 分组，打印通关率、平均用时、死亡、伤害。
+"""
+import os
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from adventure import Adventure as A
+from scripts.replay import bot_action
+
+FIELDS = ["level", "seed", "agent", "overrides", "completed", "time_s", "boss_killed", "frames", "deaths",
+          "damage_taken", "kills", "update_mean_ms", "update_p95_ms", "update_max_ms"]
+
+_game = None
+
+
+def game():
+    """每个工作进程只创建一次 Game，任务之间复用（图像缓存也随之复用）"""
+    global _game
+    if _game is None:
+        _game = A.Game()
+        _game.menu.active = False
+        _game.input = A.ActionInput()
+        _game.deterministic = True
+    return _game
+
+
+def parse_override(text):
+    """"enemy:jumper.speed=120,160" -> ("enemy", "jumper", "speed", [120, 160])"""
+    target, _, values = text.partition("=")
+    kind, _, arg = target.partition(".")
+    kind, _, variant = kind.partition(":")
+    if not kind or not arg or not values:
+        raise argparse.ArgumentTypeError(f"参数覆盖格式应为 类型[:变体].参数=值,...: {text}")
+    return kind, variant or None, arg, [_value(v) for v in values.split(",")]
+
+
+def _value(text):
+    """数字、true/false 等按 JSON 解析，其余当作字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def apply_overrides(data, overrides):
+    for (kind, variant, arg), value in overrides.items():
+        for ent in data.get("entities", []):
+            args = ent.setdefault("args", {})
+            if ent.get("type") == kind and (variant is None or args.get("variant", "patroller") == variant):
+                args[arg] = value
+    return data
+
+
+def override_label(overrides):
+    return " ".join(f"{k}{':' + v if v else ''}.{a}={val}" for (k, v, a), val in overrides.items())
+
+
+class RandomAgent:
+    """随机操作者：每 12 帧重新选一次按住的方向（偏向右），跳、射击、交互按概率按下"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)  # 独立的随机数，不影响游戏本身的随机序列
+        self.held = A.ACTION_RIGHT
+
+    def __call__(self, i):
+        rng = self.rng
+        if i % 12 == 0:
+            self.held = rng.choice((A.ACTION_RIGHT, A.ACTION_RIGHT, A.ACTION_RIGHT, A.ACTION_LEFT, 0, A.ACTION_CROUCH))
+        action = self.held
+        if rng.random() < 0.08:
+            action |= A.ACTION_JUMP
+        if rng.random() < 0.05:
+            action |= A.ACTION_SHOOT
+        if rng.random() < 0.03:
+            action |= A.ACTION_INTERACT
+        return action
+
+
+def simulate(job):
+    """跑一个任务，返回一行结果"""
+    path, seed, agent_name, overrides, frames, dt = job
+    g = game()
+    with open(path, "r", encoding="utf-8") as f:
+        data = apply_overrides(json.load(f), overrides)
+    g.reseed(seed)
+    g.transition.cancel()
+    g.timer.events.clear()
+    g.load_level(path, data)
+    level = g.level
+    agent = bot_action if agent_name == "scripted" else RandomAgent(seed)
+
+    deaths = damage = kills = 0
+    completed = boss_killed = False
+    health = level.player.health if level.player else 0
+    dying = False
+    times = []
+    clock = time.perf_counter
+    i = 0
+    for i in range(frames):
+        g.apply_action(agent(i))
+        alive = [e for e in level.entities if isinstance(e, A.Enemy)]
+        t = clock()
+        g.update(dt)
+        times.append(clock() - t)
+        kills += sum(e.remove_requested for e in alive)
+        # 只有从本关的门离开才算通关（门是切换关卡的唯一入口，死亡后重新载入不算）
+        if g.transition.busy and g.transition.target in {A.resolve_level_path(d.target) for d in level.doors}:
+            completed = True
+            break
+        if g.won:
+            boss_killed = True
+            break
+        if g.level is not level:
+            # 没有检查点时死亡会重新载入本关，接着在新的关卡对象上统计
+            level = g.level
+            health = level.player.health if level.player else 0
+        p = level.player
+        if p:
+            if p.health < health:
+                damage += health - p.health
+            health = p.health
+        if g.respawning and not dying:
+            deaths += 1
+        dying = g.respawning
+
+    ms = sorted(t * 1000 for t in times)
+    n = len(ms)
+    return {"level": os.path.basename(path), "seed": seed, "agent": agent_name,
+            "overrides": override_label(overrides), "completed": completed,
+            "time_s": round((i + 1) * dt, 3) if completed else None, "boss_killed": boss_killed, "frames": n,
+            "deaths": deaths, "damage_taken": damage, "kills": kills,
+            "update_mean_ms": round(sum(ms) / max(n, 1), 4), "update_p95_ms": round(ms[int(n * 0.95)], 4) if n else 0.0,
+            "update_max_ms": round(ms[-1], 4) if n else 0.0}
+
+
+def make_jobs(levels, seeds, agent, sets, frames):
+    names = [(kind, variant, arg) for kind, variant, arg, _ in sets]
+    combos = list(itertools.product(*(values for *_, values in sets)))
+    dt = 1.0 / A.FPS
+    return [(A.resolve_level_path(path), seed, agent, dict(zip(names, combo)), frames, dt)
+            for path in levels for combo in combos for seed in range(seeds)]
+
+
+def write_rows(out, rows):
+    if out.endswith(".parquet"):
+        try:
+            import pandas
+            pandas.DataFrame(rows, columns=FIELDS).to_parquet(out, index=False)
+        except ImportError:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit("写 Parquet 需要安装 pandas 或 pyarrow，或者改用 .csv 输出")
+            pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), out)
+        return
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def summary(rows):
+    groups = defaultdict(list)
+    for r in rows:
+        groups[(r["level"], r["overrides"])].append(r)
+    print(f"{'关卡':<16}{'通关率':>8}{'平均用时':>10}{'死亡':>7}{'伤害':>8}  参数覆盖")
+    for (level, label), rs in sorted(groups.items()):
+        done = [r["time_s"] for r in rs if r["completed"]]
+        print(f"{level:<16}{len(done) / len(rs):>8.0%}{(sum(done) / len(done)) if done else float('nan'):>10.1f}"
+              f"{sum(r['deaths'] for r in rs) / len(rs):>7.2f}{sum(r['damage_taken'] for r in rs) / len(rs):>8.1f}  {label}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量无窗口模拟，用于调整关卡平衡")
+    parser.add_argument("levels", nargs="*", help="关卡 JSON，默认 levels/ 下全部关卡")
+    parser.add_argument("--seeds", type=int, default=4, help="每种组合跑的种子数（0 ~ N-1）")
+    parser.add_argument("--agent", choices=("scripted", "random"), default="scripted")
+    parser.add_argument("--set", dest="sets", action="append", type=parse_override, default=[],
+                        metavar="TYPE[:VARIANT].ARG=V1,V2", help="参数覆盖，可多次给出，各项取笛卡尔积")
+    parser.add_argument("--frames", type=int, default=3600, help="每局最多帧数（60 帧 = 1 秒）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("-o", "--out", default="balance.csv", help="输出文件（.csv 或 .parquet）")
+    parser.add_argument("--summary", action="store_true", help="打印分组汇总")
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.levels or A.level_files(),
+                     args.seeds, args.agent, args.sets, args.frames)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        rows = list(pool.map(simulate, jobs, chunksize=max(1, len(jobs) // (4 * (args.workers or os.cpu_count() or 1)))))
+    write_rows(args.out, rows)
+    print(f"{len(rows)} 局，用时 {time.perf_counter() - start:.1f} 秒 -> {args.out}")
+    if args.summary:
+        summary(rows)
@@ -0,0 +1,98 @@
+"""
+预处理游戏图像：把关卡和实体实际用到的每个 (图片, 尺寸) 预先解码、缩放好，
+以原始 RGBA 像素写入 assets/.cache/sprites.bin，索引写入 sprites.json。
+游戏启动时 AssetLoader 直接内存映射该文件，不再重复解码 PNG 和 smoothscale。
+
+源图片修改后（mtime/大小变化）对应条目自动失效，重新运行本脚本即可。
+
+用法（在项目根目录）: python -m scripts.build_assets [levels/level1.json ...] [--bench]
+不指定关卡时处理 levels/ 下全部关卡（编辑器的自动保存等不算）；--bench 对比使用缓存前后的冷启动耗时。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from adventure import Adventure as A
+
+# 冷启动测试：新进程中载入全部关卡所花的时间（argv[1] 为 "0" 时禁用缓存）
+BENCH_CODE = """
+import os, sys, json, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+from adventure import Adventure as A
+pygame.display.init()
+pygame.display.set_mode((1, 1))
+if sys.argv[1] == "0":
+    A.AssetLoader._baked = {}
+t = time.perf_counter()
+for path in sys.argv[2:]:
+    with open(path, "r", encoding="utf-8") as f:
+        A.Level(json.load(f))
+print(time.perf_counter() - t)
+"""
+
+
+def collect(levels):
+    """构造每个关卡（以及默认玩家），记录实际从文件解码的 (path, size)"""
+    A.AssetLoader._baked = {}
+    A.AssetLoader.used.clear()
+    for path in levels:
+        with open(path, "r", encoding="utf-8") as f:
+            A.Level(json.load(f))
+    A.Player(0, 0, {})
+    return sorted(A.AssetLoader.used)
+
+
+def build(levels):
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    pairs = collect(levels)
+    os.makedirs(A.ASSET_CACHE_DIR, exist_ok=True)
+    bin_path = os.path.normpath(os.path.join(A.ASSET_CACHE_DIR, "sprites.bin"))
+    index = {}
+    offset = 0
+    with open(bin_path + ".tmp", "wb") as out:
+        for path, size in pairs:
+            st = os.stat(path)
+            img = pygame.image.load(path).convert_alpha()
+            pixels = pygame.image.tobytes(pygame.transform.smoothscale(img, size), "RGBA")
+            out.write(pixels)
+            index[A.AssetLoader.baked_key(path, size)] = {
+                "offset": offset, "mtime_ns": st.st_mtime_ns, "bytes": st.st_size,
+            }
+            offset += len(pixels)
+    os.replace(bin_path + ".tmp", bin_path)
+    with open(os.path.join(A.ASSET_CACHE_DIR, "sprites.json"), "w", encoding="utf-8") as f:
+        json.dump({"sprites": index}, f, ensure_ascii=False)
+    print(f"{len(pairs)} sprites, {offset / 1024:.0f} KB -> {bin_path}")
+
+
+def cold_start(levels, baked):
+    cmd = [sys.executable, "-c", BENCH_CODE, "1" if baked else "0"] + levels
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def bench(levels, runs=3):
+    before = min(cold_start(levels, False) for _ in range(runs))
+    after = min(cold_start(levels, True) for _ in range(runs))
+    print(f"载入 {len(levels)} 个关卡: 无缓存 {before*1000:.1f} ms, 使用缓存 {after*1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预处理游戏图像缓存")
+    parser.add_argument("levels", nargs="*", help="关卡 JSON，默认 levels/ 下全部关卡")
+    parser.add_argument("--bench", action="store_true", help="对比使用缓存前后的冷启动耗时")
+    args = parser.parse_args()
+    levels = args.levels or A.level_files()
+    build(levels)
+    if args.bench:
+        bench(levels)
@@ -0,0 +1,29 @@
+"""
+整理关卡 JSON（与地图编辑器导出的格式一致）：
+- 去掉旧版编辑器遗留的 _canvas_id 字段；
+- 去掉完全重复（类型、位置、尺寸、图像都相同）的 tile，同一格子叠放的不同图像保留；
+- 把相邻的同图像方格合并为矩形区域 {..., "w": n*cell, "h": m*cell, "cell": cell}。
+
+用法（在项目根目录）: python -m scripts.compact_levels levels/level1.json levels/level2.json ...
+"""
+import sys
+import json
+
+from editor.MapEditor_tk import clean_tile, compact_tiles, dedupe_tiles, expand_tiles
+
+
+def compact_level(path):
+    with open(path, "r", encoding="utf-8") as fp:
+        data = json.load(fp)
+    before = len(data.get("tiles", []))
+    tiles = [clean_tile(t) for t in data.get("tiles", [])]
+    data["tiles"] = compact_tiles(dedupe_tiles(expand_tiles(tiles)))
+    data["entities"] = [clean_tile(e) for e in data.get("entities", [])]
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False, indent=2)
+    print(f"{path}: {before} -> {len(data['tiles'])} tiles")
+
+
+if __name__ == "__main__":
+    for p in sys.argv[1:]:
+        compact_level(p)
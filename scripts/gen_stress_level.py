@@ -0,0 +1,169 @@
+"""
+生成用于压力测试的关卡 JSON（格式与地图编辑器导出的一致）。
+
+生成的关卡总是可以通关：
+- 底部是贯通全图的地面，水池铺在地面之上，可以游过去；
+- 尖刺放在 1 格深、最宽 3 格的坑底，可以跳过，掉进去也能跳出来（敌人会在坑边掉头）；
+- 浮空平台离地至少 3 格，不会挡路；
+- 玩家在最左侧，门（和可选的 Boss）在最右侧，敌人只放在安全的地面上。
+
+用法（在项目根目录）:
+    python -m scripts.gen_stress_level -o levels/stress.json --width 20000 --density 0.6 \\
+        --patrollers 200 --jumpers 100 --water 20 --hazard 30 --oneway 40 --boss --bench 600
+--bench N 会无窗口运行 N 帧，报告 update / draw_world 的平均耗时，看是否还能维持 60 FPS。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+CELL = 32
+GROUND = "assets/tile/02.png"
+PLATFORM = "assets/tile/01.png"
+ONEWAY = "assets/tile/bridge-2.png"
+WATER = "assets/tile/water-middle.png"
+HAZARD = "assets/tile/spikes.png"
+
+
+def rect(kind, x, y, w, h, path):
+    """按格子数给出的矩形区域记录（与编辑器合并后的格式相同）"""
+    t = {"type": kind, "x": float(x * CELL), "y": float(y * CELL), "w": float(w * CELL), "h": float(h * CELL), "path": path}
+    if kind != "hazard":
+        t["cell"] = float(CELL)
+    return t
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    cols = max(40, args.width // CELL)
+    rows = max(12, args.height // CELL)
+    floor = rows - 2  # 地面顶部所在行
+    tiles = [rect("collide_image", 0, floor + 1, cols, 1, GROUND)]
+
+    # 预留：起点 6 格与终点 10 格不放障碍
+    lo, hi = 6, cols - 10
+    busy = [False] * cols  # 地面上已被水池/尖刺占用的列
+
+    def claim(width):
+        for _ in range(50):
+            x = rng.randrange(lo, max(lo + 1, hi - width))
+            if not any(busy[max(0, x - 2):x + width + 2]):
+                for c in range(x, x + width):
+                    busy[c] = True
+                return x
+        return None
+
+    for _ in range(args.water):
+        w = rng.randint(3, 8)
+        x = claim(w)
+        if x is not None:
+            tiles.append(rect("water", x, floor - 2, w, 2, WATER))
+    pits = []
+    for _ in range(args.hazard):
+        w = rng.randint(1, 3)
+        x = claim(w)
+        if x is not None:
+            pits.append((x, w))
+            t = rect("hazard", x, floor + 1, w, 1, HAZARD)
+            t["y"] -= CELL / 2
+            t["h"] = CELL / 2
+            tiles.append(t)
+    # 地面最上一行在坑的位置断开
+    start = 0
+    for x, w in sorted(pits) + [(cols, 0)]:
+        if x > start:
+            tiles.append(rect("collide_image", start, floor, x - start, 1, GROUND))
+        start = x + w
+
+    # 浮空平台：density 为平均每 10 列的平台数
+    for _ in range(int(cols / 10 * args.density)):
+        w = rng.randint(2, 6)
+        x = rng.randrange(2, cols - w - 2)
+        y = floor - rng.randint(3, 6)
+        tiles.append(rect("collide_image", x, y, w, 1, PLATFORM))
+    for _ in range(args.oneway):
+        w = rng.randint(3, 6)
+        x = rng.randrange(2, cols - w - 2)
+        t = rect("oneway", x, floor - rng.randint(3, 5), w, 1, ONEWAY)
+        t["h"] = 12.0
+        tiles.append(t)
+
+    entities = [{"type": "player", "x": 2 * CELL, "y": (floor - 1) * CELL, "args": {"health": 100, "speed": 240}}]
+    safe = [c for c in range(lo, hi) if not any(busy[max(0, c - 1):c + 3])]
+    for variant, count in (("patroller", args.patrollers), ("jumper", args.jumpers), ("wanderer", args.wanderers)):
+        for _ in range(count):
+            if not safe:
+                break
+            c = rng.choice(safe)
+            entities.append({"type": "enemy", "x": c * CELL, "y": floor * CELL - 40,
+                             "args": {"variant": variant, "health": 40, "speed": 160}})
+    if args.boss:
+        entities.append({"type": "boss", "x": (cols - 8) * CELL, "y": (floor - 2) * CELL, "args": {"health": 300}})
+    entities.append({"type": "door", "x": (cols - 3) * CELL, "y": (floor - 3) * CELL, "args": {"target": args.door_target}})
+    return {"name": f"stress {cols}x{rows}", "width": cols * CELL, "height": rows * CELL,
+            "tiles": tiles, "entities": entities}
+
+
+def bench(path, frames):
+    """无窗口跑 frames 帧：玩家一路向右跑跳，分别统计更新和绘制的耗时"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from adventure import Adventure as A
+
+    class Keys(dict):
+        def __getitem__(self, k):
+            return self.get(k, False)
+
+    game = A.Game()
+    game.menu.active = False
+    game.load_level(path)
+    keys = Keys({pygame.K_d: True})
+    pygame.key.get_pressed = lambda: keys
+    upd = drw = 0.0
+    worst = 0.0
+    for i in range(frames):
+        if game.level.player and i % 30 == 0:
+            game.level.player.on_jump_pressed()
+        t0 = time.perf_counter()
+        game.update(1.0 / A.FPS)
+        t1 = time.perf_counter()
+        game.draw_world(game.screen)
+        t2 = time.perf_counter()
+        upd += t1 - t0
+        drw += t2 - t1
+        worst = max(worst, t2 - t0)
+    budget = 1000.0 / A.FPS
+    avg = (upd + drw) / frames * 1000
+    print(f"{len(game.level.tiles)} tiles, {len(game.level.entities)} entities, {frames} 帧: "
+          f"update {upd / frames * 1000:.2f} ms, draw_world {drw / frames * 1000:.2f} ms, "
+          f"最慢 {worst * 1000:.2f} ms, 预算 {budget:.1f} ms -> {'OK' if avg < budget else '超出'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成压力测试关卡")
+    parser.add_argument("-o", "--out", default="levels/stress.json")
+    parser.add_argument("--width", type=int, default=8000, help="关卡宽度（像素）")
+    parser.add_argument("--height", type=int, default=640, help="关卡高度（像素）")
+    parser.add_argument("--density", type=float, default=0.5, help="平均每 10 列的浮空平台数")
+    parser.add_argument("--water", type=int, default=5, help="水池数量")
+    parser.add_argument("--oneway", type=int, default=5, help="单向平台数量")
+    parser.add_argument("--hazard", type=int, default=5, help="尖刺数量")
+    parser.add_argument("--patrollers", type=int, default=10)
+    parser.add_argument("--jumpers", type=int, default=5)
+    parser.add_argument("--wanderers", type=int, default=5)
+    parser.add_argument("--boss", action="store_true", help="在终点前放置 Boss")
+    parser.add_argument("--door-target", default="level1.json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench", type=int, default=0, metavar="FRAMES", help="生成后无窗口运行若干帧并报告耗时")
+    args = parser.parse_args()
+
+    data = generate(args)
+    with open(args.out, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False, indent=2)
+    print(f"{args.out}: {len(data['tiles'])} tiles, {len(data['entities'])} entities")
+    if args.bench:
+        sys.path.insert(0, os.getcwd())
+        bench(args.out, args.bench)
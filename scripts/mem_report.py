@@ -0,0 +1,97 @@
+"""
+内存报告：逐个载入关卡，统计 tile 与各类实体占用的 Python 堆内存。
+
+- 每个关卡：构建关卡时 tracemalloc 记录的分配总量（图像先预热进缓存，贴图像素由 SDL 分配且各实例共享，不计入），
+  以及 tile、实体两部分各自的字节数；
+- 每种实体：实例数与平均每个实例的字节数（对象本身、__dict__、AABB 以及自有的浮点数/容器）。
+
+用法（在项目根目录）: python -m scripts.mem_report [levels/level1.json ...]
+不指定关卡时处理 levels/ 下全部关卡（编辑器的自动保存等不算）。
+"""
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+from collections import defaultdict
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from adventure import Adventure as A
+
+
+def _fields(obj):
+    d = getattr(obj, "__dict__", None)
+    if d is not None:
+        yield from d.values()
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "__dict__" and hasattr(obj, name):
+                yield getattr(obj, name)
+
+
+def instance_bytes(obj) -> int:
+    """对象自身占用：对象头与槽、__dict__、AABB、自有的 float 和 dict/list（不含共享的图像、字符串等）"""
+    size = sys.getsizeof(obj)
+    d = getattr(obj, "__dict__", None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    for v in _fields(obj):
+        if isinstance(v, A.AABB):
+            size += instance_bytes(v)
+        elif isinstance(v, float):
+            size += sys.getsizeof(v)
+        elif isinstance(v, (dict, list)):
+            size += sys.getsizeof(v)
+    return size
+
+
+def tile_bytes(tiles) -> int:
+    size = sys.getsizeof(tiles) + sum(instance_bytes(t) for t in tiles)
+    if hasattr(tiles, "nbytes"):
+        size += tiles.nbytes()  # 紧凑存储的数组与享元表
+    return size
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    A.Level(data)  # 预热图像缓存
+    tracemalloc.start()
+    level = A.Level(data)
+    level.build_spatial()
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return level, total
+
+
+def report(levels):
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    per_type = defaultdict(lambda: [0, 0])
+    print(f"{'关卡':<24}{'tiles':>7}{'tile 字节':>11}{'字节/tile':>10}{'实体':>6}{'实体字节':>10}{'构建分配':>11}")
+    for path in levels:
+        level, total = load(path)
+        tb = tile_bytes(level.tiles)
+        eb = 0
+        for e in level.entities:
+            b = instance_bytes(e)
+            eb += b
+            per_type[type(e).__name__][0] += 1
+            per_type[type(e).__name__][1] += b
+        n = len(level.tiles)
+        print(f"{os.path.basename(path):<24}{n:>7}{tb:>11}{tb / max(1, n):>10.0f}{len(level.entities):>6}{eb:>10}{total:>11}")
+    print()
+    print(f"{'实体类型':<14}{'数量':>6}{'字节/个':>9}")
+    for name, (count, size) in sorted(per_type.items()):
+        print(f"{name:<14}{count:>6}{size / count:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="关卡与实体的内存报告")
+    parser.add_argument("levels", nargs="*", help="关卡 JSON，默认 levels/ 下全部关卡")
+    args = parser.parse_args()
+    report(args.levels or A.level_files())
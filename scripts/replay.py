@@ -0,0 +1,122 @@
+"""
+无窗口、不限帧率地回放录像（python main.py --record 文件 录制），报告逐帧耗时和最终状态摘要。
+
+录像头里保存了录制结束时的状态摘要，--check 时不一致即返回非 0。replays/ 下 level1~4 的录像
+是固定的通关操作，可作为性能与正确性回归测试：
+
+    python -m scripts.replay replays/*.rec --check
+    python -m scripts.replay replays/level2.rec --draw --timings level2.csv
+
+--draw 把 draw_world 的耗时也计入每帧；--timings 把逐帧毫秒数写成 CSV。
+--record-bot 关卡 用固定的脚本化操作（一路向右跑跳、射击、进门）生成录像，用来重新生成 replays/ 下的基准。
+"""
+import os
+import sys
+import time
+import argparse
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from adventure import Adventure as A
+
+_game = None
+
+
+def game():
+    global _game
+    if _game is None:
+        _game = A.Game()
+        _game.menu.active = False
+        _game.input = A.ActionInput()
+    return _game
+
+
+def play(path, draw=False):
+    """回放一个录像，返回 (录像头, 逐帧秒数, 最终状态摘要)"""
+    header, actions = A.InputRecorder.load(path)
+    g = game()
+    g.reseed(header["seed"])
+    g.deterministic = True
+    g.transition.cancel()
+    g.timer.events.clear()
+    g.load_level(A.resolve_level_path(header["level"]))
+    dt = header["dt"]
+    times = []
+    clock = time.perf_counter
+    for action in actions:
+        t = clock()
+        g.apply_action(action)
+        g.update(dt)
+        if draw:
+            g.draw_world(g.screen)
+        times.append(clock() - t)
+    return header, times, g.state_hash()
+
+
+def bot_action(i):
+    """基准录像的固定操作：按住右，每 40 帧跳一次（隔 8 帧二段跳），每 25 帧射击，每 30 帧按一次交互"""
+    action = A.ACTION_RIGHT
+    if i % 40 in (0, 8):
+        action |= A.ACTION_JUMP
+    if i % 25 == 0:
+        action |= A.ACTION_SHOOT
+    if i % 30 == 15:
+        action |= A.ACTION_INTERACT
+    return action
+
+
+def record_bot(level, out, frames, seed):
+    g = game()
+    g.transition.cancel()
+    g.timer.events.clear()
+    g.current_level_path = A.resolve_level_path(level)
+    g.start_recording(out, seed)
+    dt = g.recorder.header["dt"]
+    for i in range(frames):
+        action = bot_action(i)
+        g.recorder.frame(action)
+        g.apply_action(action)
+        g.update(dt)
+    g.stop_recording()
+
+
+def report(path, header, times, state):
+    ms = sorted(t * 1000 for t in times)
+    n = len(ms)
+    total = sum(ms)
+    ok = state == header.get("hash")
+    print(f"{os.path.basename(path)}: {header['level']} {n} 帧, 共 {total:.0f} ms "
+          f"(实时的 {n * header['dt'] * 1000 / max(total, 1e-9):.0f} 倍), 每帧 平均 {total / max(n, 1):.3f} "
+          f"p50 {ms[n // 2] if n else 0:.3f} p95 {ms[int(n * 0.95)] if n else 0:.3f} 最慢 {ms[-1] if n else 0:.3f} ms, "
+          f"状态 {state} {'一致' if ok else '不一致（录制时 ' + str(header.get('hash')) + '）'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无窗口回放录像")
+    parser.add_argument("replays", nargs="*", help="录像文件")
+    parser.add_argument("--draw", action="store_true", help="同时绘制画面并计入耗时")
+    parser.add_argument("--timings", metavar="CSV", help="输出逐帧耗时（只在回放一个文件时使用）")
+    parser.add_argument("--check", action="store_true", help="最终状态与录制时不一致时返回非 0")
+    parser.add_argument("--record-bot", metavar="LEVEL", help="用固定操作录制该关卡，写到 -o 指定的文件")
+    parser.add_argument("-o", "--out", help="--record-bot 的输出文件，默认 replays/<关卡名>.rec")
+    parser.add_argument("--frames", type=int, default=1800, help="--record-bot 录制的帧数")
+    parser.add_argument("--seed", type=int, default=1, help="--record-bot 使用的随机种子")
+    args = parser.parse_args()
+
+    if args.record_bot:
+        name = os.path.splitext(os.path.basename(args.record_bot))[0]
+        record_bot(args.record_bot, args.out or os.path.join(os.path.normpath(A.REPLAY_DIR), name + ".rec"),
+                   args.frames, args.seed)
+    failed = 0
+    for path in args.replays:
+        header, times, state = play(path, args.draw)
+        if not report(path, header, times, state):
+            failed += 1
+        if args.timings:
+            with open(args.timings, "w", encoding="utf-8") as f:
+                f.write("frame,ms\n")
+                f.writelines(f"{i},{t * 1000:.4f}\n" for i, t in enumerate(times))
+    if args.check and failed:
+        sys.exit(1)
@@ -0,0 +1,36 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def game():
+    """无窗口、确定性运行的 Game，整个测试会话共用一个（图像缓存随之复用）"""
+    from adventure import Adventure as A
+    g = A.Game()
+    g.menu.active = False
+    g.input = A.ActionInput()
+    g.deterministic = True
+    return g
+
+
+@pytest.fixture
+def load(game):
+    """按给定种子载入关卡，返回载入后的 Level"""
+    from adventure import Adventure as A
+
+    def load(name, seed=1, data=None):
+        game.reseed(seed)
+        game.transition.cancel()
+        game.timer.events.clear()
+        game.load_level(A.resolve_level_path(name), data)
+        return game.level
+    return load
@@ -0,0 +1,53 @@
+"""检查点快照：restore 之后的关卡状态必须与 snapshot 时完全一致"""
+from adventure import Adventure as A
+from scripts.replay import bot_action
+
+
+def level_state(game):
+    """不含时钟的状态摘要（复活不回拨游戏时钟）"""
+    frame, t = game.frame, game.time
+    game.frame, game.time = 0, 0.0
+    try:
+        return game.state_hash()
+    finally:
+        game.frame, game.time = frame, t
+
+
+def pick_up(game, item):
+    p = game.level.player
+    p.aabb.x, p.aabb.y = item.aabb.x, item.aabb.y
+    p.vx = p.vy = 0.0
+    game.apply_action(0)
+    game.update(1.0 / A.FPS)
+    assert item not in game.level.entities
+
+
+def test_restore_round_trip_after_play(game, load):
+    load("level3.json")
+    game.save_checkpoint()
+    before = level_state(game)
+    ids = [id(e) for e in game.level.entities]
+    for i in range(600):
+        game.apply_action(bot_action(i))
+        game.update(1.0 / A.FPS)
+        if game.transition.busy or game.level.player is None:
+            break
+    assert level_state(game) != before
+    game.level.restore(game.checkpoint)
+    assert level_state(game) == before
+    assert [id(e) for e in game.level.entities] == ids
+    assert set(game.level.dynamic.query(A.AABB(0, 0, game.level.world_w, game.level.world_h))) >= \
+        {e for e in game.level.entities}
+
+
+def test_items_reset_to_checkpoint_state(game, load):
+    level = load("level1.json")
+    first, second = [e for e in level.entities if isinstance(e, A.Item)][:2]
+    pick_up(game, first)
+    game.save_checkpoint()  # 快照前拾取的道具
+    before = level_state(game)
+    pick_up(game, second)   # 快照后拾取的道具
+    game.level.restore(game.checkpoint)
+    assert first not in level.entities
+    assert second in level.entities
+    assert level_state(game) == before
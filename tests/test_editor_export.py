@@ -0,0 +1,39 @@
+"""PNG 导出：压缩存储的矩形区域与展开成逐格 tile 后导出的像素必须一致"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("tkinter")
+from PIL import Image, ImageChops
+
+from editor import MapEditor_tk as ed
+
+LEVEL = os.path.join(os.path.dirname(__file__), "..", "levels", "level1.json")
+
+
+def export(path, tiles, data, scale):
+    ed.export_png_stream(str(path), tiles, data['width'], data['height'], scale, workers=2)
+    with Image.open(path) as img:
+        return img.convert("RGB")
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.3])
+def test_compacted_export_matches_expanded(tmp_path, scale):
+    with open(LEVEL, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tiles = data['tiles']
+    assert any(t.get('cell') and t['w'] > t['cell'] for t in tiles), "关卡里应有压缩存储的矩形"
+    compact = export(tmp_path / "compact.png", tiles, data, scale)
+    expanded = export(tmp_path / "expanded.png", ed.expand_tiles(tiles), data, scale)
+    assert compact.size == expanded.size
+    assert ImageChops.difference(compact, expanded).getbbox() is None
+
+
+def test_image_cells_split_compacted_rect():
+    t = {"type": "image", "x": 64.0, "y": 32.0, "w": 96.0, "h": 64.0, "cell": 32, "path": "a.png"}
+    cells = ed.image_cells(t)
+    assert len(cells) == 6
+    assert cells[0] == (64.0, 32.0, 32.0, 32.0) and cells[-1] == (128.0, 64.0, 32.0, 32.0)
+    one = {"type": "image", "x": 0.0, "y": 0.0, "w": 32.0, "h": 32.0, "path": "a.png"}
+    assert ed.image_cells(one) == [(0.0, 0.0, 32.0, 32.0)]
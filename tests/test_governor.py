@@ -0,0 +1,17 @@
+"""帧预算调节：降档/升档只记录，不往终端打印（除非显式打开）"""
+from adventure import Adventure as A
+
+
+def test_quality_changes_are_quiet_by_default(capsys):
+    gov = A.FrameGovernor()
+    assert not gov.verbose
+    top = gov.level
+    for _ in range(A.GOVERNOR_DOWN_FRAMES * 4):
+        gov.sample(gov.budget * 3)
+    assert gov.level < top and gov.decisions
+    for _ in range(A.GOVERNOR_UP_FRAMES * 2):
+        gov.sample(0.0)
+    assert gov.decisions[-1]["to"] > gov.decisions[-1]["from"]
+    assert capsys.readouterr().out == ""
+    gov.reset()
+    assert gov.level == top
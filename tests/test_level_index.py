@@ -0,0 +1,197 @@
+"""关卡的碰撞索引：射线检测、视线缓存、可破坏 tile 与热更新的增量维护"""
+import copy
+import json
+import math
+import os
+import random
+
+import numpy as np
+import pytest
+
+from adventure import Adventure as A
+
+LEVELS = os.path.join(os.path.dirname(__file__), "..", "levels")
+
+
+def brute_raycast(level, x, y, dx, dy, max_dist, mask):
+    """逐个 tile 求交，取最近的命中距离"""
+    length = math.hypot(dx, dy)
+    dx, dy = dx / length, dy / length
+    best = None
+    for t in level.tiles:
+        if not A.TILE_RAY_CLASS.get(t.kind, 0) & mask:
+            continue
+        hit = A.ray_aabb(x, y, dx, dy, t.aabb)
+        if hit and hit[0] <= max_dist and (best is None or hit[0] < best):
+            best = hit[0]
+    return best
+
+
+def scattered_level(seed=45):
+    """位置、尺寸不对齐格子的随机 tile"""
+    rng = random.Random(seed)
+    kinds = ("solid", "oneway", "water", "hazard", "image", "collide_image")
+    tiles = [{"type": rng.choice(kinds), "x": rng.uniform(0, 1500), "y": rng.uniform(0, 600),
+              "w": rng.uniform(4, 120), "h": rng.uniform(4, 120), "path": "none"} for _ in range(150)]
+    return {"name": "scattered", "width": 1600, "height": 700, "tiles": tiles,
+            "entities": [{"type": "player", "x": 40, "y": 40}]}
+
+
+@pytest.mark.parametrize("name", ["level1.json", "level2.json", "level3.json", "scattered.json"])
+def test_raycast_matches_brute_force(load, name):
+    level = load(name, data=scattered_level() if name == "scattered.json" else None)
+    rng = random.Random(name)
+    masks = (A.RAY_SOLID, A.PROJECTILE_MASK, A.RAY_WATER | A.RAY_HAZARD)
+    for i in range(400):
+        x, y = rng.uniform(-50, level.world_w + 50), rng.uniform(-50, level.world_h + 50)
+        angle = rng.uniform(0, 2 * math.pi)
+        if i % 8 == 0:
+            angle = rng.choice((0, math.pi / 2, math.pi, 3 * math.pi / 2))  # 轴向射线
+        dx, dy = math.cos(angle), math.sin(angle)
+        max_dist = rng.uniform(10, 1500)
+        mask = masks[i % len(masks)]
+        hit = level.raycast(x, y, dx, dy, max_dist, mask)
+        want = brute_raycast(level, x, y, dx, dy, max_dist, mask)
+        if want is None:
+            assert hit is None, (x, y, angle, max_dist, mask)
+        else:
+            assert hit is not None, (x, y, angle, max_dist, mask)
+            assert hit[1] == pytest.approx(want, abs=1e-6)
+            assert A.TILE_RAY_CLASS[hit[0].kind] & mask
+
+
+def test_decorations_do_not_block_sight():
+    assert "image" not in A.TILE_RAY_CLASS
+
+
+def test_line_of_sight_cache_is_invalidated(game, load):
+    level = load("level1.json")
+    a, b = level.player, next(e for e in level.entities if isinstance(e, A.Enemy))
+    a.aabb.x, a.aabb.y = 100.0, 100.0
+    b.aabb.x, b.aabb.y = 400.0, 100.0
+    for t in [t for t in level.tiles if t.intersects(A.AABB(100, 100, 340, 40))]:
+        level.spatial.remove(t.copy(), t)
+        level.tiles.remove(t)
+    level.build_spatial()
+    assert level.line_of_sight(a, b, 0)
+    wall = level.tiles.add("solid", A.AABB(250.0, 0.0, 32.0, 400.0), A.AssetLoader.load_image(None, (32, 400)))
+    level.spatial.insert(wall.aabb, wall)
+    level.grid.add(wall)
+    assert level.line_of_sight(a, b, 1)  # 仍在缓存有效期内
+    assert not level.line_of_sight(a, b, A.LOS_REFRESH_FRAMES + 1)
+    level._los[(id(a), id(b))] = (10 ** 9, True)
+    game.save_checkpoint()
+    level.restore(game.checkpoint)
+    assert not level.line_of_sight(a, b, A.LOS_REFRESH_FRAMES + 2)
+
+
+def spatial_cells(spatial):
+    return {k: sorted(id(t) for t in v if isinstance(t, A.Tile)) for k, v in spatial.grid.items()
+            if any(isinstance(t, A.Tile) for t in v)}
+
+
+def assert_indexes_match_rebuild(level):
+    """增量维护的空间哈希、占用格和 TileStore 必须与从头构建的一致"""
+    store = level.tiles
+    views = list(store)
+    assert len(views) == len(store) == int(store.alive[:store.count].sum())
+    for t in views:
+        assert store.views[t.index] is t
+        assert tuple(store.geom[t.index]) == (t.x, t.y, t.w, t.h)
+    spatial = A.SpatialHash(level.spatial.cell)
+    grid = A.OccupancyGrid(level.world_w, level.world_h)
+    for t in views:
+        spatial.insert(t.aabb, t)
+        grid.add(t)
+    assert spatial_cells(level.spatial) == spatial_cells(spatial)
+    assert np.array_equal(level.grid.bits, grid.bits)
+
+
+def geometry(level):
+    return sorted((t.kind, t.x, t.y, t.w, t.h) for t in level.tiles)
+
+
+def breakable_level():
+    tiles = [{"type": "solid", "x": 0, "y": 576, "w": 2048, "h": 64, "path": "none"}]
+    tiles += [{"type": "breakable", "x": 256 + i * 448, "y": 320, "w": 320, "h": 256, "cell": 32} for i in range(4)]
+    tiles += [{"type": "breakable", "x": 96, "y": 96, "w": 64, "h": 64}]
+    tiles += [{"type": "collide_image", "x": 256, "y": 288, "w": 32, "h": 32, "path": "assets/tile/01.png"},
+              {"type": "water", "x": 600, "y": 544, "w": 128, "h": 32, "path": "none"}]
+    return {"name": "breakables", "width": 2048, "height": 640, "tiles": tiles,
+            "entities": [{"type": "player", "x": 40, "y": 500}]}
+
+
+def test_breakable_damage_matches_full_rebuild(load):
+    data = breakable_level()
+    level = load("breakables.json", data=data)
+    rng = random.Random(50)
+    for _ in range(300):
+        w, h = rng.choice((8, 16, 40, 96)), rng.choice((8, 16, 40, 96))
+        area = A.AABB(rng.uniform(200, 1900), rng.uniform(60, 600), w, h)
+        level.damage_tiles(area, rng.choice((5.0, 12.0, 30.0)))
+        assert_indexes_match_rebuild(level)
+    for b in level.breakables.values():
+        covered = np.zeros((b.rows, b.cols), dtype=int)
+        for t in b.tiles:
+            c0, r0 = round((t.x - b.x) / b.cw), round((t.y - b.y) / b.ch)
+            covered[r0:r0 + round(t.h / b.ch), c0:c0 + round(t.w / b.cw)] += 1
+        want = np.array([[b.state(c, r) > 0 for c in range(b.cols)] for r in range(b.rows)], dtype=int)
+        assert np.array_equal(covered, want)
+    # 与按相同耐久从头载入的关卡相比
+    hp = {k: list(b.hp) for k, b in level.breakables.items()}
+    fresh = load("breakables.json", data=copy.deepcopy(data))
+    for key, values in hp.items():
+        fresh.breakables[key].hp = values
+        fresh._place_breakable(fresh.breakables[key])
+    fresh.build_spatial()
+    assert geometry(fresh) == geometry(level)
+    assert np.array_equal(fresh.grid.bits, level.grid.bits)
+
+
+def level_data(name):
+    with open(os.path.join(LEVELS, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def edited(data, rng):
+    """模拟编辑器保存：删掉一些 tile、加几块新的（含可破坏 tile）、挪动一个敌人"""
+    data = copy.deepcopy(data)
+    tiles = data["tiles"]
+    for _ in range(len(tiles) // 5):
+        tiles.pop(rng.randrange(len(tiles)))
+    for _ in range(20):
+        kind = rng.choice(("solid", "oneway", "water", "hazard", "collide_image"))
+        tiles.append({"type": kind, "x": rng.randrange(0, data["width"] // 32) * 32,
+                      "y": rng.randrange(0, data["height"] // 32) * 32, "w": 32 * rng.randint(1, 4), "h": 32,
+                      "path": "none"})
+    tiles.append({"type": "breakable", "x": 320, "y": 96, "w": 96, "h": 64, "cell": 32})
+    enemies = [e for e in data["entities"] if e["type"] == "enemy"]
+    if enemies:
+        enemies[0]["x"] += 64
+    return data
+
+
+def entity_records(level):
+    return sorted((type(e).__name__, e.aabb.x, e.aabb.y) for e in level.entities if not isinstance(e, A.Player))
+
+
+@pytest.mark.parametrize("name", ["level1.json", "level3.json"])
+def test_apply_diff_matches_fresh_load(load, name):
+    original = level_data(name)
+    changed = edited(original, random.Random(name))
+    fresh = load(name, data=copy.deepcopy(changed))
+    want = (geometry(fresh), fresh.grid.bits.copy(), entity_records(fresh))
+
+    level = load(name, data=copy.deepcopy(original))
+    level.apply_diff(copy.deepcopy(changed))
+    assert_indexes_match_rebuild(level)
+    assert (geometry(level), entity_records(level)) == (want[0], want[2])
+    assert np.array_equal(level.grid.bits, want[1])
+
+    # 再改回去，应与直接载入原关卡一致
+    level.apply_diff(copy.deepcopy(original))
+    assert_indexes_match_rebuild(level)
+    back = load(name, data=copy.deepcopy(original))
+    assert geometry(level) == geometry(back)
+    assert np.array_equal(level.grid.bits, back.grid.bits)
+    assert entity_records(level) == entity_records(back)
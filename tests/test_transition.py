@@ -0,0 +1,29 @@
+"""关卡切换的后台预读：无窗口批量重置时不起线程，预读按路径去重，中止切换时丢弃"""
+import threading
+
+from adventure import Adventure as A
+
+
+def test_deterministic_resets_do_not_preload(game, load):
+    level = load("level1.json")
+    assert level.doors
+    before = threading.active_count()
+    for _ in range(50):
+        load("level1.json")
+        game.enter_level()
+    assert not game.transition._preloaded
+    assert threading.active_count() <= before
+
+
+def test_preloads_are_deduplicated_and_dropped_on_cancel(game, load):
+    load("level1.json")
+    game.deterministic = False
+    try:
+        for _ in range(20):
+            game.enter_level()
+        targets = {A.resolve_level_path(d.target) for d in game.level.doors}
+        assert set(game.transition._preloaded) == targets
+        game.transition.cancel()
+        assert not game.transition._preloaded
+    finally:
+        game.deterministic = True